@@ -0,0 +1,8 @@
+# __main__.py — `python -m race_control_app ...` (eller `python race_control_app ...`)
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # allow "core.*" imports
+
+from cli import main
+
+if __name__ == "__main__":  # arbejdsprocesser (core.importers) indlæser også dette modul
+    sys.exit(main())
@@ -8,7 +8,7 @@ from ui.user import user_team_pick, user_team_view
 from ui.spectate import spectate_view  
 
 # Core (ingen Streamlit-kald her)
-from core.db import ensure_schema
+from core.db import ensure_schema_once
 from core.auth import ADMIN_PASS
 
 
@@ -34,7 +34,7 @@ def main():
     setup_page()
 
     # 2) Sørg for DB-schema (ingen UI-sideeffekter)
-    ensure_schema()
+    ensure_schema_once()
 
     # 3) Routing state
     st.session_state.setdefault("view", "LANDING")
@@ -48,9 +48,11 @@ from ui.landing import landing
 from ui.admin import admin_panel
 from ui.user import user_team_pick, user_team_view  # kun disse to
 
-from core.db import ensure_schema
+from core.db import ensure_schema_once
 from core.auth import ADMIN_PASS
+from core import feed, integrity, mirror, snapshots, telemetry
 import streamlit as st
+import uuid
 
 def admin_login():
     st.header("Admin login")
@@ -65,7 +67,13 @@ def admin_login():
 
 def main():
     setup_page()
-    ensure_schema()
+    ensure_schema_once()         # én gang pr. proces, ikke ved hver rerun
+    mirror.enable_from_env()   # RACE_DB_MIRROR=1 → læsninger fra in-memory spejl
+    snapshots.start_scheduler()  # planlagte snapshots (kun ved ændringer)
+    feed.start_from_env()        # RACE_FEED=fil.jsonl|udp://host:port → automatiske kørerskift
+    integrity.start_checker()    # inkrementelt integritetstjek hvert par sekunder
+    telemetry.start_sampler()    # RSS, filhåndtag, forbindelser og sessioner i en ringbuffer
+    telemetry.touch_session(st.session_state.setdefault("session_uid", uuid.uuid4().hex))
 
     # init view state KUN én gang
     st.session_state.setdefault("view", "LANDING")
@@ -0,0 +1,236 @@
+# cli.py — kommandolinje til drift uden Streamlit (scripts, cron under eventet)
+"""
+Samme operationer som admin-panelet, men uden UI:
+
+    python -m race_control_app import hold.csv klasse2.csv --format long
+    python -m race_control_app import afdeling3.zip --dry-run
+    python -m race_control_app sheets <ID> --gid 0,123
+    python -m race_control_app laps resultater.csv
+    python -m race_control_app export -o stints.csv
+    python -m race_control_app snapshot --label "før start"
+    python -m race_control_app snapshots
+    python -m race_control_app restore <navn> --yes
+    python -m race_control_app check --full
+    python -m race_control_app repair-encoding
+    python -m race_control_app wipe --yes
+    python -m race_control_app bench integrity laps
+
+Modulerne i core importeres først når en kommando kører, så opstart og --help er hurtige.
+--db peger på en anden databasefil (ellers iracing.db ved siden af appen). Resultater
+skrives som JSON på stdout; check og fejl giver exit-kode 1 (import: hvis intet kunne læses).
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def _print(obj):
+    print(json.dumps(obj, ensure_ascii=False, indent=2, default=str))
+
+
+def _schema():
+    from core.db import ensure_schema_once
+
+    ensure_schema_once()
+
+
+# ---------- Kommandoer ----------
+def cmd_import(args) -> int:
+    from core.importers import import_staging, read_batch_sources, stage_batch
+
+    _schema()
+    columns = {"col_team": args.team_col, "col_class": args.class_col}
+    if args.driver_col:
+        if args.format == "wide":
+            columns["driver_cols"] = [c.strip() for c in args.driver_col.split(",")]
+        else:
+            columns["col_driver"] = args.driver_col
+    res = stage_batch(read_batch_sources(args.files), args.format, columns=columns, workers=args.workers)
+    staging = res.pop("staging")
+    out = {**res, "staged_rows": len(staging)}
+    if not args.dry_run and len(staging):
+        out["imported"] = import_staging(staging)
+    _print(out)
+    return 0 if len(staging) else 1
+
+
+def cmd_sheets(args) -> int:
+    from core.importers import fetch_sheets, guess_tab, import_tabs
+
+    _schema()
+    results = fetch_sheets([(args.sheet_id, g.strip()) for g in args.gid.split(",") if g.strip()])
+    summary = [{k: r[k] for k in ("gid", "status", "bytes", "ms")} | {"error": r["error"]} for r in results]
+    if not results or any(r["error"] is not None for r in results):
+        _print({"imported": 0, "tabs": summary})
+        return 1
+    n = import_tabs([guess_tab(r["df"], args.format) for r in results])
+    _print({"imported": n, "tabs": summary})
+    return 0
+
+
+def cmd_laps(args) -> int:
+    from core.laps import import_laps
+
+    _schema()
+    _print(import_laps(args.file))
+    return 0
+
+
+def cmd_export(args) -> int:
+    from core.laps import iter_stint_export
+
+    _schema()
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        for chunk in iter_stint_export():
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def cmd_snapshot(args) -> int:
+    from core.snapshots import take_snapshot
+
+    _schema()
+    _print(take_snapshot(label=args.label))
+    return 0
+
+
+def cmd_snapshots(args) -> int:
+    from core.snapshots import list_snapshots
+
+    print(list_snapshots().to_string(index=False))
+    return 0
+
+
+def cmd_restore(args) -> int:
+    from core.snapshots import restore_snapshot
+
+    if not args.yes:
+        print("Gendannelse overskriver den levende database – bekræft med --yes", file=sys.stderr)
+        return 1
+    _print(restore_snapshot(args.name))
+    return 0
+
+
+def cmd_check(args) -> int:
+    from core import integrity
+
+    _schema()
+    res = integrity.check(full=args.full)
+    found = integrity.issues()
+    _print({**res, "open_issues": found.drop(columns=["repairable"]).to_dict("records")})
+    return 1 if len(found) else 0
+
+
+def cmd_repair_encoding(args) -> int:
+    from core.repo import repair_encoding
+
+    _schema()
+    _print({"fixed": repair_encoding()})
+    return 0
+
+
+def cmd_wipe(args) -> int:
+    from core.db import reset_db
+    from core.snapshots import take_snapshot
+
+    if not args.yes:
+        print("Sletning kan ikke fortrydes (ud over snapshot) – bekræft med --yes", file=sys.stderr)
+        return 1
+    _schema()
+    snap = take_snapshot(label="før sletning")
+    reset_db()
+    _print({"wiped": True, "snapshot": snap["name"]})
+    return 0
+
+
+def cmd_bench(args) -> int:
+    from core import bench
+
+    unknown = [s for s in args.suites if s not in bench.SUITES]
+    if unknown:
+        print(f"Ukendte suites: {', '.join(unknown)} (findes: {', '.join(bench.SUITES)})", file=sys.stderr)
+        return 2
+    ok = True
+    for name in args.suites or bench.SUITES:
+        result = bench.SUITES[name]()
+        print(f"{name}: {json.dumps(result, ensure_ascii=False, default=str)}", flush=True)
+        ok = ok and result.get("ok", True)
+    return 0 if ok else 1
+
+
+# ---------- Parser ----------
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="race_control_app", description="Race control uden Streamlit.")
+    p.add_argument("--db", help="databasefil (standard: iracing.db ved siden af appen)")
+    sub = p.add_subparsers(dest="command", required=True, metavar="kommando")
+
+    s = sub.add_parser("import", help="importér CSV-filer (eller zip med CSV'er) i én transaktion")
+    s.add_argument("files", nargs="+")
+    s.add_argument("--format", choices=["wide", "long"], default="wide",
+                   help="wide: én række pr. team med driver-kolonner; long: én række pr. kører")
+    s.add_argument("--team-col")
+    s.add_argument("--class-col")
+    s.add_argument("--driver-col", help="long: kolonnen; wide: kommasepareret liste")
+    s.add_argument("--workers", type=int, help="processer til parsing (standard: én pr. CPU)")
+    s.add_argument("--dry-run", action="store_true", help="kun parsing og fejlrapport, intet skrives")
+    s.set_defaults(func=cmd_import)
+
+    s = sub.add_parser("sheets", help="hent og importér offentlige Google Sheets-faner")
+    s.add_argument("sheet_id")
+    s.add_argument("--gid", default="0", help="kommasepareret liste af gid'er")
+    s.add_argument("--format", choices=["wide", "long"], default="wide")
+    s.set_defaults(func=cmd_sheets)
+
+    s = sub.add_parser("laps", help="importér omgangstider (resultatfil) og fordel dem på stints")
+    s.add_argument("file")
+    s.set_defaults(func=cmd_laps)
+
+    s = sub.add_parser("export", help="alle stints med omgangstal som CSV")
+    s.add_argument("-o", "--output", default="-", help="fil (standard: stdout)")
+    s.set_defaults(func=cmd_export)
+
+    s = sub.add_parser("snapshot", help="tag en snapshot af databasen")
+    s.add_argument("--label", default="cli")
+    s.set_defaults(func=cmd_snapshot)
+
+    s = sub.add_parser("snapshots", help="vis snapshots")
+    s.set_defaults(func=cmd_snapshots)
+
+    s = sub.add_parser("restore", help="gendan fra en snapshot (tager først en sikkerheds-snapshot)")
+    s.add_argument("name")
+    s.add_argument("--yes", action="store_true")
+    s.set_defaults(func=cmd_restore)
+
+    s = sub.add_parser("check", help="integritetstjek (exit 1 hvis der er åbne problemer)")
+    s.add_argument("--full", action="store_true", help="tjek alt, ikke kun ændringer")
+    s.set_defaults(func=cmd_check)
+
+    s = sub.add_parser("repair-encoding", help="ret æ/ø/å-mojibake i team- og kørernavne")
+    s.set_defaults(func=cmd_repair_encoding)
+
+    s = sub.add_parser("wipe", help="slet og genskab databasen (snapshot først)")
+    s.add_argument("--yes", action="store_true")
+    s.set_defaults(func=cmd_wipe)
+
+    s = sub.add_parser("bench", help="kør benchmark-suites (alle hvis ingen angives)")
+    s.add_argument("suites", nargs="*")
+    s.set_defaults(func=cmd_bench)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.db:
+        from core import db
+
+        db.DB_PATH = os.path.abspath(args.db)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Fejl: {e}", file=sys.stderr)
+        return 1
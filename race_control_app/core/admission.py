@@ -0,0 +1,202 @@
+# core/admission.py
+"""
+Adgangskontrol til databasen når mange sessioner rammer den på én gang.
+
+Når storskærmen og 40 team-laptops genforbinder efter et Wi-Fi-hul, kører alle sessioner
+forfra samtidig; efter den næste skrivning misser de alle @cached-cachen i samme øjeblik.
+Porten her begrænser hvor mange DB-kald der kører ad gangen (SLOTS):
+
+  - skrivninger (db.write_conn, fx start_stint) går forrest: står en skriver i kø, lukkes
+    ingen nye læsninger ind, og læsninger må højst bruge SLOTS-1 pladser, så der altid er
+    én ledig til en skriver
+  - læsninger (cache-miss i core.coherence.cached) venter på en plads; er køen dybere end
+    SHED_DEPTH, eller har de ventet WAIT_SEC, får de i stedet det seneste gode resultat for
+    samme kald ("degraded mode") – det tæller som shed
+  - findes der intet tidligere resultat, venter læsningen bare videre
+
+Et kald der allerede holder en plads (fx stint_timeline → race_window) går direkte igennem,
+så indlejrede kald ikke kan låse porten. stats() giver kødybde, shed-tal og ventetider.
+RACE_ADMISSION_SLOTS=0 slår porten fra.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from core import db
+
+SLOTS = int(os.environ.get("RACE_ADMISSION_SLOTS", "4"))
+SHED_DEPTH = int(os.environ.get("RACE_ADMISSION_SHED_DEPTH", "8"))
+WAIT_SEC = float(os.environ.get("RACE_ADMISSION_WAIT_SEC", "1.0"))
+LAST_GOOD_MAX = 512        # seneste gode resultater der gemmes (ét pr. funktion+argumenter)
+DEGRADED_HOLD_SEC = 10.0   # så længe efter sidste shed regnes appen som belastet
+_WAIT_SAMPLES = 500
+
+
+class AdmissionGate:
+    def __init__(self, slots: int = SLOTS, shed_depth: int = SHED_DEPTH, wait_sec: float = WAIT_SEC):
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._last_good = OrderedDict()
+        self.configure(slots, shed_depth, wait_sec)
+
+    def configure(self, slots: int | None = None, shed_depth: int | None = None, wait_sec: float | None = None):
+        """Skift grænser (og nulstil tællerne); bruges af bench og miljøvariabler."""
+        with self._cond:
+            if slots is not None:
+                self.slots = max(int(slots), 0)
+            if shed_depth is not None:
+                self.shed_depth = max(int(shed_depth), 0)
+            if wait_sec is not None:
+                self.wait_sec = float(wait_sec)
+            self.running = {"read": 0, "write": 0}
+            self.queued = {"read": 0, "write": 0}
+            self.counts = {"read": 0, "write": 0, "shed": 0, "stale_timeouts": 0, "max_queue": 0}
+            self.waits = {"read": deque(maxlen=_WAIT_SAMPLES), "write": deque(maxlen=_WAIT_SAMPLES)}
+            self._last_shed = 0.0
+            self._last_good.clear()
+            self._cond.notify_all()
+
+    # ----- porten -----
+    def _can_enter(self, kind: str) -> bool:
+        busy = self.running["read"] + self.running["write"]
+        if kind == "write":
+            return busy < self.slots
+        return busy < self.slots and self.running["read"] < max(self.slots - 1, 1) and not self.queued["write"]
+
+    def _acquire(self, kind: str, timeout: float | None) -> bool:
+        t0 = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self.queued[kind] += 1
+            self.counts["max_queue"] = max(self.counts["max_queue"], self.queued["read"] + self.queued["write"])
+            try:
+                while not self._can_enter(kind):
+                    left = None if deadline is None else deadline - time.monotonic()
+                    if left is not None and left <= 0:
+                        return False
+                    self._cond.wait(left)
+            finally:
+                self.queued[kind] -= 1
+            self.running[kind] += 1
+            self.counts[kind] += 1
+            self.waits[kind].append(time.perf_counter() - t0)
+        return True
+
+    def _release(self, kind: str):
+        with self._cond:
+            self.running[kind] -= 1
+            self._cond.notify_all()
+
+    def _holding(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0
+
+    @contextmanager
+    def _slot(self):
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+    @contextmanager
+    def write(self):
+        """Plads til en skrivning (venter altid; går foran læsninger i køen)."""
+        if self.slots == 0 or self._holding():
+            yield
+            return
+        self._acquire("write", None)
+        try:
+            with self._slot():
+                yield
+        finally:
+            self._release("write")
+
+    def read(self, key, compute):
+        """
+        (resultat, frisk) for en læsning. compute() køres når der er plads; ellers serveres
+        seneste gode resultat for key (frisk=False), som kalderen ikke skal cache som nyt.
+        """
+        if self.slots == 0 or self._holding():
+            return compute(), True
+        with self._cond:
+            stale = self._last_good.get(key, _NONE)
+            deep = self.queued["read"] + self.queued["write"] >= self.shed_depth
+            if stale is not _NONE and deep and not self._can_enter("read"):
+                self._shed(False)
+                return stale, False
+        if not self._acquire("read", self.wait_sec if stale is not _NONE else None):
+            with self._cond:
+                self._shed(True)
+            return stale, False
+        try:
+            with self._slot():
+                value = compute()
+        finally:
+            self._release("read")
+        with self._cond:
+            self._last_good[key] = value
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > LAST_GOOD_MAX:
+                self._last_good.popitem(last=False)
+        return value, True
+
+    def _shed(self, timed_out: bool):
+        self.counts["shed"] += 1
+        if timed_out:
+            self.counts["stale_timeouts"] += 1
+        self._last_shed = time.monotonic()
+
+    # ----- målinger -----
+    def degraded(self) -> bool:
+        """True hvis der er serveret gamle resultater inden for DEGRADED_HOLD_SEC."""
+        with self._cond:
+            return self._last_shed > 0 and time.monotonic() - self._last_shed < DEGRADED_HOLD_SEC
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = {k: sorted(v) for k, v in self.waits.items()}
+            out = {
+                "slots": self.slots,
+                "running_reads": self.running["read"],
+                "running_writes": self.running["write"],
+                "queued_reads": self.queued["read"],
+                "queued_writes": self.queued["write"],
+                "max_queue": self.counts["max_queue"],
+                "reads": self.counts["read"],
+                "writes": self.counts["write"],
+                "shed": self.counts["shed"],
+                "stale_timeouts": self.counts["stale_timeouts"],
+            }
+        for kind, w in waits.items():
+            out[f"{kind}_wait_p95_ms"] = round(w[min(int(len(w) * 0.95), len(w) - 1)] * 1000, 1) if w else 0.0
+        out["degraded"] = self.degraded()
+        return out
+
+
+_NONE = object()
+
+GATE = AdmissionGate()
+db.set_write_gate(GATE.write)
+
+
+def run_read(key, compute):
+    return GATE.read(key, compute)
+
+
+def stats() -> dict:
+    return GATE.stats()
+
+
+def degraded() -> bool:
+    return GATE.degraded()
+
+
+def refresh_delay(base: float) -> float:
+    """
+    Pause før næste auto-opdatering (spectate-løkken). Under overlast strækkes den tilfældigt
+    op til 3×, så sessioner der genforbandt samtidig ikke bliver ved med at ramme samme sekund.
+    """
+    return base * random.uniform(1.0, 3.0) if GATE.degraded() else base
@@ -0,0 +1,207 @@
+# core/archive.py
+"""
+Events og arkivering af afsluttede løb.
+
+Den levende iracing.db indeholder kun det aktuelle event, så forespørgslerne i core.repo
+er lige hurtige uanset hvor mange løb der er kørt. Når et event afsluttes, kopieres
+databasen til archive/<UTC-tid>-<navn>.db (backup-API) og eventets tabeller tømmes i
+samme skrivetransaktion, hvorefter filen VACUUM'es. Arkiverne røres kun når nogen beder om historik; de hægtes
+på én ad gangen med ATTACH.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from core import db
+
+
+def archive_dir() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "archive")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _slug(name: str) -> str:
+    slug = re.sub(r"[^0-9a-zA-Z]+", "-", name.strip().lower()).strip("-")
+    return slug or "event"
+
+
+def current_event_name() -> str:
+    with db.read_conn() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key='event_name';").fetchone()
+    return row[0] if row and row[0] else "Unavngivet event"
+
+
+# ---------- Arkivering ----------
+def archive_current_event(name: str | None = None) -> dict:
+    """
+    Flyt det aktuelle event til en arkivfil og start et tomt event.
+    Returnerer info om arkivet (fil, navn og antal rækker).
+    """
+    name = name or current_event_name()
+    # UTC som stint-tidsstemplerne (datetime('now')), da den bruges til at lukke åbne stints;
+    # filnavnet bruger samme tidspunkt
+    now = datetime.now(timezone.utc)
+    archived_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    path = os.path.join(archive_dir(), f"{now:%Y%m%d-%H%M%S}-{_slug(name)}.db")
+
+    with db.write_conn() as conn:
+        # Kopi og sletning under samme skrivelås: ellers går en stint skrevet imellem tabt.
+        # Kopien læses over en anden forbindelse (backup-API'et kan ikke læse fra en forbindelse
+        # med åben skrivetransaktion; WAL lader den læse imens) og i ét hug, mens låsen holdes.
+        conn.execute("BEGIN IMMEDIATE;")
+        src = db.get_conn()
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+            counts = {t: dst.execute(f"SELECT COUNT(*) FROM {t};").fetchone()[0] for t in ("team", "driver", "stint")}
+            dst.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
+                [("event_name", name), ("archived_at", archived_at)]
+                + [(f"count_{t}", str(n)) for t, n in counts.items()],
+            )
+            # Arkiver er skrivebeskyttet historik → almindelig journal, ingen WAL-sidefiler
+            dst.execute("PRAGMA journal_mode=DELETE;")
+            dst.commit()
+        finally:
+            dst.close()
+            src.close()
+
+        # Alt slettes: triggers for integritetstjek og statistik springes over undervejs
+        conn.execute("INSERT OR REPLACE INTO integrity_state (key, value) VALUES ('suspended', '1');")
+        for table in db.EVENT_TABLES:
+            conn.execute(f"DELETE FROM {table};")
+        conn.execute("DELETE FROM integrity_state WHERE key IN ('suspended', 'hwm');")
+        conn.execute("DELETE FROM meta WHERE key='event_name';")
+
+    conn = db.get_conn()
+    try:
+        conn.execute("VACUUM;")
+    finally:
+        conn.close()
+    return {"file": os.path.basename(path), "event_name": name, "archived_at": archived_at, **counts}
+
+
+# Arkivfilens række i list_archives pr. sti, sammen med (mtime, størrelse) den blev læst ved
+_archive_rows: dict[str, tuple[tuple, dict]] = {}
+
+
+def _archive_row(path: str, stamp: tuple) -> dict:
+    cached = _archive_rows.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    fname = os.path.basename(path)
+    conn = sqlite3.connect(path)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta;").fetchall())
+    except sqlite3.Error:
+        meta = {}
+    finally:
+        conn.close()
+    row = {
+        "file": fname,
+        "event_name": meta.get("event_name", fname),
+        "archived_at": meta.get("archived_at"),
+        "teams": int(meta.get("count_team", 0)),
+        "drivers": int(meta.get("count_driver", 0)),
+        "stints": int(meta.get("count_stint", 0)),
+    }
+    _archive_rows[path] = (stamp, row)
+    return row
+
+
+def list_archives() -> pd.DataFrame:
+    """
+    Arkiverede events (nyeste først) med navn, tidspunkt og antal rækker.
+    Kun filer der er nye eller ændret siden sidst (mtime/størrelse) åbnes; admin-siden
+    kalder den ved hver genkørsel.
+    """
+    with os.scandir(archive_dir()) as it:
+        files = {e.path: (e.stat().st_mtime_ns, e.stat().st_size) for e in it if e.name.endswith(".db")}
+    for path in set(_archive_rows) - set(files):
+        del _archive_rows[path]
+    rows = [_archive_row(path, files[path]) for path in sorted(files, reverse=True)]
+    return pd.DataFrame(rows, columns=["file", "event_name", "archived_at", "teams", "drivers", "stints"])
+
+
+# ---------- Historik på tværs af events ----------
+def _driver_stats_sql(schema: str, pauses: bool = True) -> str:
+    """
+    Kørerstatistik for ét event; åbne stints lukkes ved parameteren :end_ts (eventets sluttid).
+    Rødt flag-pauser trækkes fra køretiden (arkiver fra før stint_pause: pauses=False).
+    """
+    paused = f"""
+    LEFT JOIN (
+      SELECT stint_id, SUM((julianday(COALESCE(end_ts, :end_ts)) - julianday(start_ts)) * 86400) AS sec
+      FROM {schema}.stint_pause GROUP BY stint_id
+    ) p ON p.stint_id = s.id""" if pauses else "LEFT JOIN (SELECT NULL AS stint_id, NULL AS sec) p ON 0"
+    return f"""
+    SELECT
+      COALESCE(NULLIF(TRIM(d.iracing_id), ''), LOWER(TRIM(d.name))) AS driver_key,
+      d.name                                       AS driver,
+      NULLIF(TRIM(d.iracing_id), '')               AS iracing_id,
+      COUNT(s.id)                                  AS stints,
+      COALESCE(SUM(
+        (julianday(COALESCE(s.end_ts, :end_ts)) - julianday(s.start_ts)) * 86400 - COALESCE(p.sec, 0)
+      ), 0)                                        AS drive_sec,
+      GROUP_CONCAT(DISTINCT t.name)                AS teams
+    FROM {schema}.driver d
+    LEFT JOIN {schema}.stint s ON s.driver_id = d.id
+    LEFT JOIN {schema}.team  t ON t.id = s.team_id{paused}
+    GROUP BY d.id
+    """
+
+
+def cross_event_driver_stats(include_current: bool = True) -> pd.DataFrame:
+    """
+    Samlet statistik pr. kører over alle arkiverede events (og evt. det aktuelle).
+    Kørere matches på iracing_id når det findes, ellers på navn uden store/små bogstaver.
+    """
+    frames = []
+    conn = db.get_conn()
+    try:
+        if include_current:
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            df = pd.read_sql_query(_driver_stats_sql("main"), conn, params={"end_ts": now})
+            frames.append(df.assign(event=current_event_name()))
+        for r in list_archives().itertuples():
+            conn.execute("ATTACH DATABASE ? AS arc;", (os.path.join(archive_dir(), r.file),))
+            try:
+                pauses = conn.execute(
+                    "SELECT EXISTS(SELECT 1 FROM arc.sqlite_master WHERE type='table' AND name='stint_pause');"
+                ).fetchone()[0]
+                df = pd.read_sql_query(_driver_stats_sql("arc", bool(pauses)), conn,
+                                       params={"end_ts": r.archived_at})
+                frames.append(df.assign(event=r.event_name))
+            finally:
+                conn.execute("DETACH DATABASE arc;")
+    finally:
+        conn.close()
+
+    cols = ["driver", "iracing_id", "events", "stints", "drive_hours", "event_names", "teams"]
+    if not frames:
+        return pd.DataFrame(columns=cols)
+    all_df = pd.concat(frames, ignore_index=True)
+    all_df = all_df[all_df["stints"] > 0]
+    if all_df.empty:
+        return pd.DataFrame(columns=cols)
+
+    out = (
+        all_df.groupby("driver_key", sort=False)
+        .agg(
+            driver=("driver", "last"),
+            iracing_id=("iracing_id", "first"),
+            events=("event", "nunique"),
+            stints=("stints", "sum"),
+            drive_sec=("drive_sec", "sum"),
+            event_names=("event", lambda s: ", ".join(dict.fromkeys(s))),
+            teams=("teams", lambda s: ", ".join(dict.fromkeys(x for v in s.dropna() for x in v.split(",")))),
+        )
+        .reset_index(drop=True)
+    )
+    out["drive_hours"] = (out.pop("drive_sec") / 3600).round(2)
+    return out.sort_values(["drive_hours", "driver"], ascending=[False, True])[cols].reset_index(drop=True)
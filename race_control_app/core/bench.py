@@ -0,0 +1,1374 @@
+# core/bench.py
+"""
+Benchmarks og selvtjek. Kører altid mod en midlertidig database, aldrig iracing.db.
+
+    python -m core.bench              # alle suites
+    python -m core.bench coherence    # én suite
+"""
+import contextlib
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from core import db
+
+
+# ---------- Hjælpere ----------
+@contextlib.contextmanager
+def temp_db(teams: int = 0, drivers_per_team: int = 0):
+    """Peg core.db på en frisk database i en temp-mappe så længe blokken kører."""
+    old = db.DB_PATH
+    tmp = tempfile.mkdtemp(prefix="race-bench-")
+    db.DB_PATH = os.path.join(tmp, "bench.db")
+    try:
+        db.ensure_schema()
+        if teams:
+            seed(teams, drivers_per_team)
+        yield db.DB_PATH
+    finally:
+        db.DB_PATH = old
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def seed(teams: int, drivers_per_team: int):
+    """Indsæt syntetiske teams og kørere (gennem hændelsesloggen som en import ville)."""
+    from core.eventlog import record_many
+
+    classes = ["GTP", "GT3 PRO", "GT3 AM", "GT3"]
+    with db.write_conn() as conn:
+        record_many(conn, "team_create", [
+            {"team_id": t, "name": f"Team {t:03d}", "car_class": classes[t % len(classes)],
+             "team_no": t, "team_pin": "1234"}
+            for t in range(1, teams + 1)
+        ])
+        record_many(conn, "driver_create", [
+            {"driver_id": d, "name": f"Driver {d:05d}"}
+            for d in range(1, teams * drivers_per_team + 1)
+        ])
+        record_many(conn, "team_driver_add", [
+            {"team_id": t, "driver_id": (t - 1) * drivers_per_team + k, "is_active": 1}
+            for t in range(1, teams + 1)
+            for k in range(1, drivers_per_team + 1)
+        ])
+
+
+def _timed_ms(fn, repeat: int) -> float:
+    """Gennemsnitlig tid pr. kald i millisekunder."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+# ---------- Suites ----------
+def _replica_probe(path, results, ready, stop):
+    """Kører i en separat proces: følger versionen som en replika ville gøre."""
+    db.DB_PATH = path
+    from core.coherence import get_watcher
+
+    watcher = get_watcher()
+    last = watcher.version()
+    seen = []
+    ready.set()
+    while not stop.is_set():
+        v = watcher.version()
+        if v != last:
+            seen.append((v, time.time()))
+            last = v
+        time.sleep(0.005)
+    results.put(seen)
+
+
+def bench_coherence(replicas: int = 4, writes: int = 40, interval: float = 0.05) -> dict:
+    """
+    Start flere lokale processer der hver følger DB-versionen, skriv fra denne proces
+    og mål hvor længe der går før hver replika ser skrivningen.
+    """
+    from core.coherence import MAX_STALENESS_SEC, change_version
+    from core.repo import set_team_pin
+
+    ctx = mp.get_context("spawn")
+    with temp_db(teams=1) as path:
+        results = ctx.Queue()
+        stop = ctx.Event()
+        procs, readies = [], []
+        for _ in range(replicas):
+            ready = ctx.Event()
+            p = ctx.Process(target=_replica_probe, args=(path, results, ready, stop))
+            p.start()
+            procs.append(p)
+            readies.append(ready)
+        for ready in readies:
+            ready.wait(30)
+
+        written = []
+        for i in range(writes):
+            t0 = time.time()
+            set_team_pin(1, f"{i:04d}")
+            written.append((change_version(), t0))
+            time.sleep(interval)
+        time.sleep(MAX_STALENESS_SEC * 2)
+        stop.set()
+        seen_per_replica = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join()
+
+    delays, missed = [], 0
+    for seen in seen_per_replica:
+        for version, t0 in written:
+            t_seen = next((t for v, t in seen if v >= version), None)
+            if t_seen is None:
+                missed += 1
+            else:
+                delays.append(max(0.0, t_seen - t0))
+
+    bound = MAX_STALENESS_SEC + 0.1
+    return {
+        "replicas": replicas,
+        "writes": writes,
+        "missed": missed,
+        "p50_ms": round(_percentile(delays, 50) * 1000, 1),
+        "max_ms": round(max(delays, default=0.0) * 1000, 1),
+        "bound_ms": round(bound * 1000, 1),
+        "ok": missed == 0 and max(delays, default=0.0) <= bound,
+    }
+
+
+def bench_mirror(teams: int = 60, drivers_per_team: int = 4, writers: int = 4, ops: int = 50,
+                 sessions: int = 8, write_every: float = 0.05) -> dict:
+    """
+    Skriv samtidigt fra flere tråde mens andre tråde læser gennem in-memory spejlet,
+    og bevis bagefter at spejlet er identisk med disken. Måler også læsetider, og læsninger
+    pr. sek. for `sessions` samtidige sessioner mod de samme læsninger bag én fælles lås.
+    """
+    from core import mirror, repo
+
+    grid_sql = (
+        "SELECT t.team_no, t.car_class, t.name, d.name FROM team t "
+        "LEFT JOIN stint s ON s.team_id = t.id AND s.end_ts IS NULL "
+        "LEFT JOIN driver d ON d.id = s.driver_id;"
+    )
+
+    def raw_grid():
+        with db.read_conn() as conn:
+            conn.execute(grid_sql).fetchall()
+
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        disk_raw_ms = _timed_ms(raw_grid, 200)
+        disk_grid_ms = _timed_ms(repo.spectate_grid.__wrapped__, 50)
+
+        mirror.enable()
+        try:
+            stop = threading.Event()
+
+            def writer(seed_):
+                rnd = random.Random(seed_)
+                for _ in range(ops):
+                    team_id = rnd.randint(1, teams)
+                    driver_id = (team_id - 1) * drivers_per_team + rnd.randint(1, drivers_per_team)
+                    if rnd.random() < 0.7:
+                        repo.start_stint(team_id, driver_id)
+                    else:
+                        repo.set_driver_active(team_id, driver_id, rnd.random() < 0.5)
+
+            def reader():
+                while not stop.is_set():
+                    repo.spectate_grid.__wrapped__()
+
+            readers = [threading.Thread(target=reader) for _ in range(2)]
+            workers = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            for t in readers + workers:
+                t.start()
+            for t in workers:
+                t.join()
+            stop.set()
+            for t in readers:
+                t.join()
+
+            m = mirror.get_mirror()
+            m.sync()
+            mirror_raw_ms = _timed_ms(raw_grid, 200)
+            mirror_grid_ms = _timed_ms(repo.spectate_grid.__wrapped__, 50)
+
+            # Samtidige sessioner mens løbsledelsen skriver (kørerskift hvert write_every sek.):
+            # egne forbindelser pr. tråd mod én fælles lås om hver læsning og dens sync
+            # (sådan som spejlet var med én :memory:-forbindelse)
+            def sessions_rps(serial=None, n=sessions, sec=1.0):
+                done, end = [0] * n, time.perf_counter() + sec
+
+                def run(i):
+                    while time.perf_counter() < end:
+                        with serial or contextlib.nullcontext():
+                            repo.spectate_grid.__wrapped__()
+                        done[i] += 1
+
+                def write():
+                    rnd = random.Random(7)
+                    while time.perf_counter() < end:
+                        team_id = rnd.randint(1, teams)
+                        repo.start_stint(team_id, (team_id - 1) * drivers_per_team + rnd.randint(1, drivers_per_team))
+                        time.sleep(write_every)
+
+                threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+                threads.append(threading.Thread(target=write))
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                return round(sum(done) / sec)
+
+            # Skiftevis (s, c, c, s), så opvarmning og skrivernes fremdrift rammer begge ens
+            serial_rps = sessions_rps(threading.Lock(), sec=1.0)
+            concurrent_rps = sessions_rps(sec=1.0) + sessions_rps(sec=1.0)
+            serial_rps += sessions_rps(threading.Lock(), sec=1.0)
+            serial_rps, concurrent_rps = round(serial_rps / 2), round(concurrent_rps / 2)
+
+            disk = db.get_conn()
+            mismatched = []
+            try:
+                with m.conn() as mem:
+                    for table in db.VERSIONED_TABLES:
+                        q = f"SELECT * FROM {table} ORDER BY 1, 2;"
+                        if disk.execute(q).fetchall() != mem.execute(q).fetchall():
+                            mismatched.append(table)
+            finally:
+                disk.close()
+            syncs = m.syncs
+        finally:
+            mirror.disable()
+
+    return {
+        "writes": writers * ops,
+        "mirror_syncs": syncs,
+        "mismatched_tables": mismatched,
+        "grid_sql_disk_ms": round(disk_raw_ms, 3),
+        "grid_sql_mirror_ms": round(mirror_raw_ms, 3),
+        "spectate_grid_disk_ms": round(disk_grid_ms, 3),
+        "spectate_grid_mirror_ms": round(mirror_grid_ms, 3),
+        "sessions": sessions,
+        "concurrent_reads_per_sec": concurrent_rps,
+        "serialized_reads_per_sec": serial_rps,
+        "ok": not mismatched and concurrent_rps > serial_rps,
+    }
+
+
+def _projection_dump(conn) -> dict:
+    from core.eventlog import PROJECTION_TABLES
+
+    return {t: conn.execute(f"SELECT * FROM {t} ORDER BY 1, 2;").fetchall() for t in PROJECTION_TABLES}
+
+
+def bench_event_rebuild(teams: int = 100, drivers_per_team: int = 4, events: int = 20000, tail: int = 300) -> dict:
+    """
+    Generér et helt løbs hændelser, komprimér, og mål genopbygning af projektionen
+    fra bunden (alle hændelser) mod fra seneste snapshot + den varme log.
+    """
+    from datetime import datetime, timedelta
+    from core import eventlog
+
+    rnd = random.Random(24)
+    start = datetime(2025, 6, 14, 14, 0, 0)
+
+    def generate(conn, n, offset):
+        for i in range(n):
+            ts = (start + timedelta(seconds=4 * (offset + i))).strftime("%Y-%m-%d %H:%M:%S")
+            team_id = rnd.randint(1, teams)
+            driver_id = (team_id - 1) * drivers_per_team + rnd.randint(1, drivers_per_team)
+            if rnd.random() < 0.8:
+                eventlog.record(conn, "stint_start", ts=ts, team_id=team_id, driver_id=driver_id)
+            else:
+                eventlog.record(conn, "driver_active", ts=ts, team_id=team_id,
+                                driver_id=driver_id, is_active=int(rnd.random() < 0.7))
+
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        with db.write_conn() as conn:
+            generate(conn, events, 0)
+        conn = db.get_conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            eventlog.compact(conn)           # som write-hooket gør når loggen er lang
+            conn.commit()
+        finally:
+            conn.close()
+        with db.write_conn() as conn:
+            generate(conn, tail, events)     # under SNAPSHOT_EVERY → bliver i den varme log
+
+        conn = db.get_conn()
+        try:
+            reference = _projection_dump(conn)
+            hot = conn.execute("SELECT COUNT(*) FROM race_event;").fetchone()[0]
+        finally:
+            conn.close()
+
+        t0 = time.perf_counter()
+        full = eventlog.rebuild(from_scratch=True)
+        full_ms = (time.perf_counter() - t0) * 1000
+        conn = db.get_conn()
+        try:
+            full_ok = _projection_dump(conn) == reference
+        finally:
+            conn.close()
+
+        t0 = time.perf_counter()
+        fast = eventlog.rebuild()
+        fast_ms = (time.perf_counter() - t0) * 1000
+        conn = db.get_conn()
+        try:
+            fast_ok = _projection_dump(conn) == reference
+        finally:
+            conn.close()
+
+    return {
+        "events": full["replayed"],
+        "hot_events": hot,
+        "rebuild_full_ms": round(full_ms, 1),
+        "rebuild_snapshot_ms": round(fast_ms, 1),
+        "snapshot_replayed": fast["replayed"],
+        "ok": full_ok and fast_ok,
+    }
+
+
+def bench_dedupe(drivers: int = 30000, dupes: int = 600) -> dict:
+    """
+    Syntetisk roster med kendte dubletter (store/små bogstaver, mellemrum, accenter,
+    tastefejl, samme iracing_id). Måler suggest_merges og tjekker at dubletterne findes
+    og at sammenlægningen flytter hold og stints.
+    """
+    import pandas as pd
+    from core import dedupe
+    from core.eventlog import record_many
+
+    rnd = random.Random(34)
+    first = ["Mads", "Søren", "Jens", "Anders", "Mikkel", "Rasmus", "Frederik", "Emil", "Jonas", "Lucas",
+             "Oliver", "Magnus", "Nikolaj", "Kasper", "Mathias", "Christian", "Martin", "Thomas", "Peter", "Jakob"]
+    syll = ["kjel", "ras", "niel", "jør", "ped", "han", "lar", "sø", "møl", "an", "ber", "vin", "tor", "ul", "fre", "ha"]
+    ends = ["sen", "gaard", "holm", "strup", "berg", "lund", "dal", "vig", "by", "toft"]
+    names, seen = [], set()
+    while len(names) < drivers - dupes:
+        surname = "".join(rnd.sample(syll, 2)) + rnd.choice(ends)
+        n = f"{rnd.choice(first)} {surname.capitalize()}"
+        if n not in seen:
+            seen.add(n)
+            names.append(n)
+
+    def variant(n: str) -> str:
+        k = rnd.randrange(4)
+        if k == 0:
+            return f"  {n.lower()} "
+        if k == 1:
+            return n.replace("ø", "o").replace("Ø", "O").upper()
+        if k == 2:
+            i = rnd.randrange(1, len(n) - 1)
+            return n[:i] + n[i + 1:]          # tastefejl: et tegn mangler
+        return n.replace(" ", "  ")
+
+    rows = [{"driver_id": i + 1, "name": n, "iracing_id": str(100000 + i)} for i, n in enumerate(names)]
+    originals = rnd.sample(range(len(names)), dupes)
+    expected = set()
+    for k, o in enumerate(originals):
+        d = len(rows) + 1
+        by_irid = k % 5 == 0
+        rows.append({"driver_id": d, "name": f"X{k} Ukendt" if by_irid else variant(names[o]),
+                     "iracing_id": rows[o]["iracing_id"] if by_irid else None})
+        expected.add((o + 1, d))
+
+    with temp_db():
+        with db.write_conn() as conn:
+            record_many(conn, "team_create", [{"team_id": 1, "name": "Team 001", "car_class": "GT3"}])
+            record_many(conn, "driver_create", rows)
+            record_many(conn, "team_driver_add", [{"team_id": 1, "driver_id": d, "is_active": 1}
+                                                  for _, d in sorted(expected)])
+            record_many(conn, "stint_start", [{"team_id": 1, "driver_id": d} for _, d in sorted(expected)[:50]])
+
+        t0 = time.perf_counter()
+        sugg = dedupe.suggest_merges()
+        suggest_ms = (time.perf_counter() - t0) * 1000
+        found = {tuple(sorted(p)) for p in zip(sugg["keep_id"], sugg["drop_id"])}
+        recall = len(expected & found) / len(expected)
+
+        # Kæde A(111) ~ B(uden id) ~ C(222): B må kun følge den ene, A og C aldrig sammen
+        chain = dedupe.suggest_merges(drivers=pd.DataFrame({
+            "id": [1, 2, 3], "name": ["Mads Kjeldsen", "Mads Kjeldsn", "Mads Kjeldsan"], "name_key": [None] * 3,
+            "iracing_id": ["111", None, "222"], "stints": [0] * 3, "teams": [0] * 3,
+        }))
+        chain_pairs = {tuple(sorted(p)) for p in zip(chain["keep_id"], chain["drop_id"])}
+        chain_ok = (1, 3) not in chain_pairs and len(chain_pairs) == 1
+
+        t0 = time.perf_counter()
+        merged = dedupe.apply_merges(sugg)
+        merge_ms = (time.perf_counter() - t0) * 1000
+        conn = db.get_conn()
+        try:
+            left = conn.execute("SELECT COUNT(*) FROM driver;").fetchone()[0]
+            orphans = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM stint WHERE driver_id NOT IN (SELECT id FROM driver))"
+                " + (SELECT COUNT(*) FROM team_driver WHERE driver_id NOT IN (SELECT id FROM driver));"
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    return {
+        "drivers": drivers,
+        "suggest_ms": round(suggest_ms, 1),
+        "suggestions": len(sugg),
+        "recall": round(recall, 3),
+        "false_pairs": len(found - expected),
+        "merge_ms": round(merge_ms, 1),
+        "irid_chain_ok": chain_ok,
+        "ok": suggest_ms < 1000 and recall >= 0.95 and orphans == 0 and left == drivers - merged and chain_ok,
+    }
+
+
+def bench_planner(teams: int = 400, repeat: int = 5) -> dict:
+    """
+    Rotationsplan for et helt felt midt i et 24t-løb (4-6 kørere pr. team, tilfældig
+    historik). Måler løseren alene og plan_field mod en temp-DB, og tjekker at køretiden
+    fordeles jævnt (forskel mellem mest og mindst kørende ≤ ét slot + skævheden ved start).
+    """
+    import numpy as np
+    import pandas as pd
+    from core import planner
+
+    rnd = random.Random(35)
+    cfg = dict(planner.DEFAULT_CONFIG)
+    race_start = 1_750_000_000.0
+    now = race_start + 9 * 3600
+    roster, drive, open_stints = [], [], []
+    driver_id = 0
+    for t in range(1, teams + 1):
+        ids = []
+        for _ in range(rnd.randint(4, 6)):
+            driver_id += 1
+            ids.append(driver_id)
+            roster.append((t, driver_id, f"Driver {driver_id:05d}"))
+            drive.append((t, driver_id, rnd.uniform(0.5, 2.5) * 3600))
+        open_stints.append((t, rnd.choice(ids), now - rnd.uniform(0, 50) * 60))
+    roster = pd.DataFrame(roster, columns=["team_id", "driver_id", "name"])
+    drive = pd.DataFrame(drive, columns=["team_id", "driver_id", "drive_sec"])
+    open_stints = pd.DataFrame(open_stints, columns=["team_id", "driver_id", "start"])
+
+    solve_ms = _timed_ms(lambda: planner.solve(roster, drive, open_stints, cfg, now, race_start), repeat)
+    plan = planner.solve(roster, drive, open_stints, cfg, now, race_start)
+    finals = plan.groupby(["team_id", "driver_id"])["planned_hours"].first()
+    spread = finals.groupby("team_id").agg(lambda s: s.max() - s.min())
+    start_skew = drive.groupby("team_id")["drive_sec"].agg(lambda s: s.max() - s.min()) / 3600
+    slot_h = cfg["stint_minutes"] / 60
+    balanced = bool(np.all(spread.to_numpy() <= np.maximum(slot_h, start_skew.loc[spread.index].to_numpy()) + 0.01))
+    no_repeats = not (plan.groupby("team_id")["driver_id"].diff() == 0).any()
+
+    with temp_db(teams=teams, drivers_per_team=5):
+        from core.eventlog import record_many
+        with db.write_conn() as conn:
+            record_many(conn, "stint_start", [{"team_id": t, "driver_id": (t - 1) * 5 + 1} for t in range(1, teams + 1)])
+        t0 = time.perf_counter()
+        field = planner.plan_field()
+        field_ms = (time.perf_counter() - t0) * 1000
+        first_next = planner.next_driver(1)
+
+    return {
+        "teams": teams,
+        "slots": len(plan),
+        "solve_ms": round(solve_ms, 1),
+        "plan_field_ms": round(field_ms, 1),
+        "field_teams": int(field["team_id"].nunique()),
+        "balanced": balanced,
+        "ok": solve_ms < 1000 and field_ms < 1500 and balanced and no_repeats
+              and first_next is not None and first_next["driver_id"] != 1,
+    }
+
+
+def bench_feed(teams: int = 200, drivers_per_team: int = 4, seconds: int = 120, hz: float = 20.0,
+               live_rate: int = 5000, live_sec: float = 3.0) -> dict:
+    """
+    Session-feed: (1) afspil en syntetisk JSONL-fil (teams × hz beskeder pr. sekund med
+    kørerskift og kortvarigt flimmer) så hurtigt som muligt og tjek at præcis de rigtige
+    skift bliver til stints; (2) send live over UDP med live_rate beskeder/sek. og mål lag.
+    """
+    import json
+    import socket
+    from core import feed
+    from core.eventlog import record_many
+
+    rnd = random.Random(36)
+    t0 = 1_750_000_000.0
+    n_drivers = teams * drivers_per_team
+    # Hvert team skifter kører 1-3 gange; nogle får et flimmer (ét sekund) der skal ignoreres
+    changes, flickers = {}, {}
+    for t in range(1, teams + 1):
+        # Skift mindst 10 s fra hinanden (kortere ville selv være flimmer)
+        times = sorted(rnd.sample(range(10, seconds - 10, 10), rnd.randint(1, 3)))
+        seq = [(0, (t - 1) * drivers_per_team + 1)]
+        for at in times:
+            prev = seq[-1][1]
+            nxt = prev
+            while nxt == prev:
+                nxt = (t - 1) * drivers_per_team + rnd.randint(1, drivers_per_team)
+            seq.append((at, nxt))
+        changes[t] = seq
+        if rnd.random() < 0.3:
+            flickers[t] = rnd.choice([at + 5 for at in [0, *times]])
+
+    def driver_at(t, sec):
+        d = changes[t][0][1]
+        for at, drv in changes[t]:
+            if sec >= at:
+                d = drv
+        if t in flickers and flickers[t] <= sec < flickers[t] + 1:
+            return (t - 1) * drivers_per_team + 1 + (d % drivers_per_team)
+        return d
+
+    tmp = tempfile.mkdtemp(prefix="race-feed-")
+    path = os.path.join(tmp, "feed.jsonl")
+    n = 0
+    with open(path, "w") as fh:
+        for step in range(int(seconds * hz)):
+            sec = step / hz
+            for t in range(1, teams + 1):
+                fh.write(json.dumps({"t": t0 + sec, "car": str(t), "driver": 500000 + driver_at(t, sec)}) + "\n")
+                n += 1
+
+    try:
+        with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+            with db.write_conn() as conn:
+                record_many(conn, "driver_set", [{"driver_id": d, "iracing_id": str(500000 + d)}
+                                                 for d in range(1, n_drivers + 1)])
+            ing = feed.FeedIngestor(debounce=3.0)
+            stop = threading.Event()
+            start = time.perf_counter()
+            for lines in feed.jsonl_source(path, stop, follow=False):
+                ing.feed_lines(lines, received=t0)
+            ing.flush()
+            replay_sec = time.perf_counter() - start
+            conn = db.get_conn()
+            try:
+                got = conn.execute("SELECT COUNT(*) FROM stint;").fetchone()[0]
+                final = dict(conn.execute("SELECT team_id, driver_id FROM stint WHERE end_ts IS NULL;").fetchall())
+            finally:
+                conn.close()
+            expected = sum(len(seq) for seq in changes.values())
+            replay_ok = got == expected and all(final[t] == changes[t][-1][1] for t in changes)
+            replay = ing.metrics()
+
+            # Live over UDP: skift alle teams til næste kører og send i live_rate beskeder/sek.
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+            sock.close()
+            live = feed.FeedIngestor(debounce=0.5)
+            runner = feed.FeedRunner(f"udp://127.0.0.1:{port}", live).start()
+            time.sleep(0.2)
+            out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            per_tick = max(1, int(live_rate / 100))
+            sent, tick, end = 0, 0, time.time() + live_sec
+            while time.time() < end:
+                now = time.time()
+                lines = []
+                for i in range(per_tick):
+                    t = (tick * per_tick + i) % teams + 1
+                    drv = (t - 1) * drivers_per_team + 1 + (changes[t][-1][1] % drivers_per_team)
+                    lines.append(json.dumps({"t": now, "car": t, "driver": 500000 + drv}))
+                for k in range(0, len(lines), 20):
+                    out.sendto("\n".join(lines[k:k + 20]).encode(), ("127.0.0.1", port))
+                sent += len(lines)
+                tick += 1
+                time.sleep(max(0.0, 0.01 - (time.time() - now)))
+            out.close()
+            time.sleep(1.0)   # debounce + sidste flush
+            # Kun én replika læser feedet: en anden proces får ikke rollen
+            probe = subprocess.run(
+                [sys.executable, "-c", "import sys; from core import db; db.DB_PATH = sys.argv[1]; "
+                                       "print(db.lead('feed'))", db.DB_PATH],
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(db.__file__))),
+                capture_output=True, text=True,
+            )
+            single_ok = runner.leading and probe.stdout.strip() == "False"
+            runner.stop()
+            lm = live.metrics()
+
+            # Et skift der ikke kunne skrives (her: DB'en er væk) skal med i næste flush
+            retry = feed.FeedIngestor(debounce=0.0, flush_every=3600)
+            in_car = 1 + (changes[1][-1][1] % drivers_per_team)   # team 1 efter live-delen
+            other = 1 + (in_car % drivers_per_team)
+            now = time.time()
+            retry.feed_lines([json.dumps({"t": now + k, "car": "1", "driver": 500000 + other})
+                              for k in (1, 2)])
+            real_path, db.DB_PATH = db.DB_PATH, tmp   # en mappe → forbindelsen fejler
+            try:
+                retry.flush()
+            except sqlite3.Error:
+                pass
+            finally:
+                db.DB_PATH = real_path
+            retry_ok = retry.flush() == 1
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "messages": n,
+        "replay_msgs_per_sec": round(n / replay_sec),
+        "stints": got,
+        "expected_stints": expected,
+        "flaps_ignored": replay["flaps"],
+        "live_sent": sent,
+        "live_received": lm["messages"],
+        "live_changes": lm["changes"],
+        "live_ingest_lag_p95_ms": lm["ingest_lag_p95_ms"],
+        "live_apply_lag_p95_ms": lm["apply_lag_p95_ms"],
+        "retry_ok": retry_ok,
+        "single_ingester_ok": single_ok,
+        "ok": replay_ok and retry_ok and single_ok and n / replay_sec > 5000 and lm["changes"] == teams and lm["ingest_lag_p95_ms"] < 250,
+    }
+
+
+def bench_sheets(tabs: int = 6, teams_per_tab: int = 40, latency: float = 0.2) -> dict:
+    """
+    Multi-fane Sheets-import mod en lokal HTTP stand-in (ETag, latens, én fane svarer 503
+    første gang). Måler sekventiel mod samtidig hentning, 304 fra disk-cachen, offline-
+    fallback, og at alle faner importeres i én transaktion.
+    """
+    import hashlib
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+    from core import importers
+
+    classes = ["GTP", "GT3 PRO", "GT3 AM", "GT3", "LMP2", "GT4"]
+    bodies = {}
+    for g in range(tabs):
+        rows = ["Team,Class,Car No,Driver name 1,Driver name 2,Driver name 3"]
+        for k in range(teams_per_tab):
+            n = g * teams_per_tab + k + 1
+            rows.append(f"Team {n:03d},{classes[g % len(classes)]},{n},Kører {n}a,Kører {n}b,Søren {n}")
+        bodies[str(g)] = ("\n".join(rows) + "\n").encode("utf-8")
+    hits = {"requests": 0, "flaky": 0}
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits["requests"] += 1
+            gid = parse_qs(urlparse(self.path).query).get("gid", [""])[0]
+            time.sleep(latency)
+            if gid == "1" and hits["flaky"] == 0:
+                hits["flaky"] += 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = bodies.get(gid)
+            if body is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    sources = [("bench-sheet", str(g)) for g in range(tabs)]
+    try:
+        with temp_db():
+            t0 = time.perf_counter()
+            seq = importers.fetch_sheets(sources, base_url=base, workers=1)
+            seq_ms = (time.perf_counter() - t0) * 1000
+            shutil.rmtree(importers.sheet_cache_dir())
+
+            t0 = time.perf_counter()
+            par = importers.fetch_sheets(sources, base_url=base)
+            par_ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            again = importers.fetch_sheets(sources, base_url=base)
+            cached_ms = (time.perf_counter() - t0) * 1000
+
+            n = importers.import_tabs([
+                dict(df=r["df"], mode="wide", col_team="Team", col_class="Class", col_team_no="Car No",
+                     driver_cols=["Driver name 1", "Driver name 2", "Driver name 3"])
+                for r in par
+            ])
+            conn = db.get_conn()
+            try:
+                teams = conn.execute("SELECT COUNT(*) FROM team;").fetchone()[0]
+                drivers = conn.execute("SELECT COUNT(*) FROM driver;").fetchone()[0]
+                imports = conn.execute(
+                    "SELECT (SELECT COUNT(*) FROM race_event WHERE kind='import')"
+                    " + (SELECT COUNT(*) FROM race_event_archive WHERE kind='import');"
+                ).fetchone()[0]
+            finally:
+                conn.close()
+
+            server.shutdown()
+            server.server_close()
+            offline = importers.fetch_sheets(sources[:2], base_url=base)
+    finally:
+        server.server_close()
+
+    all_ok = lambda rs: all(r["error"] is None for r in rs)
+    return {
+        "tabs": tabs,
+        "sequential_ms": round(seq_ms, 1),
+        "concurrent_ms": round(par_ms, 1),
+        "revalidate_ms": round(cached_ms, 1),
+        "revalidate_status": sorted({r["status"] for r in again}),
+        "offline_status": sorted({r["status"] for r in offline}),
+        "teams": teams,
+        "drivers": drivers,
+        "ok": all_ok(seq) and all_ok(par) and all_ok(again) and all_ok(offline)
+              and par_ms < seq_ms / 2 and n == tabs and teams == tabs * teams_per_tab
+              and drivers == 3 * tabs * teams_per_tab and imports == tabs
+              and {r["status"] for r in again} == {"uændret (304)"},
+    }
+
+
+def bench_timeline(teams: int = 120, drivers_per_team: int = 4, hours: float = 24.0, width_px: int = 760) -> dict:
+    """
+    Gantt-tidslinje for et helt 24t-felt hvor hvert skift har en byge af flimmer-stints
+    (2-8 stk. á 10-40 sek., som ved manuelle fejlskift i pitten) før den normale stint.
+    Måler hele løbet og et zoomet vindue (kold og fra cachen) og tjekker at binning bevarer
+    alle stints, begrænser antal barer i fuld visning og giver enkeltbarer ved zoom.
+    """
+    import pandas as pd
+    from core import timeline
+
+    rnd = random.Random(39)
+    race_start = 1_750_000_000
+    race_end = race_start + int(hours * 3600)
+    fmt = lambda e: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(e))
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        rows = []
+        for t in range(1, teams + 1):
+            at = race_start
+            while at < race_end:
+                lengths = [rnd.randint(10, 40) for _ in range(rnd.randint(2, 8))] + [rnd.randint(45, 60) * 60]
+                for length in lengths:
+                    end = min(at + length, race_end)
+                    if end > at:
+                        rows.append((t, (t - 1) * drivers_per_team + rnd.randint(1, drivers_per_team), fmt(at), fmt(end)))
+                    at = end
+        with db.write_conn() as conn:
+            conn.executemany("INSERT INTO stint (team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?);", rows)
+
+        t0 = time.perf_counter()
+        full = timeline.stint_timeline(width_px=width_px)
+        full_ms = (time.perf_counter() - t0) * 1000
+        cached_ms = _timed_ms(lambda: timeline.stint_timeline(width_px=width_px), 20)
+        lo, hi = race_start + 6 * 3600, race_start + 7 * 3600
+        t0 = time.perf_counter()
+        zoom = timeline.stint_timeline(lo, hi, width_px)
+        zoom_ms = (time.perf_counter() - t0) * 1000
+        in_zoom = sum(1 for r in rows if r[2] < fmt(hi) and r[3] > fmt(lo))
+
+        # En åben stint skal følge "nu" – også når vinduet allerede ligger i cachen
+        with db.write_conn() as conn:
+            conn.execute("INSERT INTO stint (team_id, driver_id, start_ts) VALUES (1, 1, ?);", (fmt(race_end),))
+        after = [timeline.stint_timeline(race_end, race_end + 3600, width_px, now_minute=race_end + m * 60)
+                 for m in (10, 20)]
+        open_moves = [(df["end"].max() - pd.Timestamp(race_end, unit="s")).total_seconds() for df in after]
+
+    return {
+        "stints": len(rows),
+        "full_bars": len(full),
+        "full_ms": round(full_ms, 1),
+        "cached_ms": round(cached_ms, 3),
+        "zoom_bars": len(zoom),
+        "zoom_ms": round(zoom_ms, 1),
+        "ok": int(full["stints"].sum()) == len(rows) and len(full) * 2 < len(rows)
+              and int(zoom["stints"].max()) == 1 and len(zoom) == in_zoom
+              and full["lane"].nunique() == teams and full_ms < 1500 and cached_ms < 5
+              and open_moves == [600.0, 1200.0],
+    }
+
+
+def bench_lifecycle(teams: int = 400, drivers_per_team: int = 4) -> dict:
+    """
+    Grønt flag, rødt flag (frys/genstart) og målflag for et helt felt. Hver operation skal
+    ramme alle teams i én transaktion på millisekunder, spectate_grid skal vise den samlet,
+    køretiden skal være uden pausen, og en afspilning af loggen skal give samme tabeller.
+    """
+    from core import planner, repo
+    from core.eventlog import rebuild
+
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        timings = {}
+
+        def timed(name, fn, *args):
+            t0 = time.perf_counter()
+            n = fn(*args)
+            timings[f"{name}_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            return n
+
+        started = timed("green", repo.race_green, None, "2025-06-15 12:00:00")
+        frozen = timed("freeze", repo.race_freeze, "2025-06-15 14:00:00")
+        grid_frozen = bool(repo.spectate_grid()["paused"].all())
+        resumed = timed("unfreeze", repo.race_unfreeze, "2025-06-15 14:30:00")
+        closed = timed("finish", repo.race_finish, "2025-06-15 16:00:00")
+        grid_done = bool((repo.spectate_grid()["driver_name"] == "-").all())
+        drive = planner._load_state(planner._epoch("2025-06-15 16:00:00"))[1]
+        with db.read_conn() as conn:
+            before = _projection_dump(conn)
+        rebuild(from_scratch=True)
+        with db.read_conn() as conn:
+            replay_ok = _projection_dump(conn) == before
+
+        # Omdøbt klasse: filtre og editor følger class_id, og afspilning giver samme klasser
+        catalog = repo.list_class_catalog()
+        members = len(repo.list_teams("GT3 AM"))
+        catalog.loc[catalog["name"] == "GT3 AM", ["name", "aliases"]] = ["GT3 AMATEUR", ""]
+        repo.save_class_catalog(catalog)
+        page = repo.teams_page(0, teams)
+        with db.read_conn() as conn:
+            before = _projection_dump(conn)
+        rebuild(from_scratch=True)
+        with db.read_conn() as conn:
+            rename_ok = bool(
+                members > 0
+                and len(repo.list_teams("GT3 AMATEUR")) == members
+                and len(repo.search("", limit=teams, car_class="GT3 AMATEUR")) == members
+                and not repo.team_edit_diff(page, page.copy())
+                and _projection_dump(conn) == before
+            )
+
+        # Et team uden klasse (class_id NULL, fx ældre data) skal stadig stå i griddet – sidst
+        with db.write_conn() as conn:
+            conn.execute("UPDATE team SET class_id = NULL WHERE id = 1;")
+        grid = repo.spectate_grid()
+        unclassified_ok = len(grid) == teams and grid.iloc[-1]["team_name"] == "Team 001" \
+            and grid.iloc[-1]["car_class"] == "-"
+
+    return {
+        "teams": teams,
+        **timings,
+        "grid_frozen": grid_frozen,
+        "grid_done": grid_done,
+        "replay_ok": replay_ok,
+        "rename_ok": rename_ok,
+        "unclassified_ok": unclassified_ok,
+        "ok": started == frozen == resumed == closed == teams and grid_frozen and grid_done and replay_ok
+              and rename_ok and unclassified_ok
+              and bool((drive["drive_sec"].round() == 3.5 * 3600).all()) and max(timings.values()) < 250,
+    }
+
+
+def bench_integrity(teams: int = 400, drivers_per_team: int = 4, stints_per_team: int = 50, changes: int = 40) -> dict:
+    """
+    Integritetstjek midt i et løb: fuldt tjek af hele feltet mod et inkrementelt tjek efter
+    et typisk sekunds ændringer (kørerskift), plus at indsatte fejl findes og kan rettes.
+    """
+    import sqlite3
+    from core import integrity
+    from core.eventlog import record_many
+
+    rnd = random.Random(41)
+    fmt = lambda e: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(e))
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        start = 1_750_000_000
+        rows = [
+            (t, (t - 1) * drivers_per_team + 1 + k % drivers_per_team, fmt(start + k * 3000), fmt(start + (k + 1) * 3000))
+            for t in range(1, teams + 1) for k in range(stints_per_team)
+        ]
+        with db.write_conn() as conn:
+            conn.executemany("INSERT INTO stint (team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?);", rows)
+        full = integrity.check(full=True)
+        full_ms = _timed_ms(lambda: integrity.check(full=True), 3)
+
+        picked = rnd.sample(range(1, teams + 1), changes)
+        with db.write_conn() as conn:
+            record_many(conn, "stint_start", [
+                {"team_id": t, "driver_id": (t - 1) * drivers_per_team + 2} for t in picked
+            ], ts=fmt(start + stints_per_team * 3000 + 60))
+        inc = integrity.check()
+
+        # Fejl som i en DB uden ux_stint_team_active
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("DROP INDEX ux_stint_team_active;")
+        conn.execute("INSERT INTO stint (team_id, driver_id, start_ts) VALUES (?, ?, ?);",
+                     (picked[0], (picked[0] - 1) * drivers_per_team + 3, fmt(start + stints_per_team * 3000 + 120)))
+        conn.commit()
+        conn.close()
+        broken = integrity.check()
+
+        # Et fundet problem der rettes i hånden før repair() må ikke "rettes" igen
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("UPDATE stint SET end_ts = '2000-01-01 00:00:00' WHERE id = 1;")
+        conn.commit()
+        stale = integrity.check()
+        conn.execute("UPDATE stint SET end_ts = ? WHERE id = 1;", (rows[0][3],))
+        conn.commit()
+        conn.close()
+        fixed = integrity.repair()
+        with db.read_conn() as conn:
+            kept = conn.execute("SELECT end_ts FROM stint WHERE id = 1;").fetchone()[0] == rows[0][3]
+
+        # Slået fra: triggerne noterer intet; slået til igen: næste tjek er fuldt
+        integrity.set_tracking(False)
+        with db.write_conn() as conn:
+            record_many(conn, "stint_start", [{"team_id": t, "driver_id": (t - 1) * drivers_per_team + 1}
+                                              for t in picked], ts=fmt(start + stints_per_team * 3000 + 600))
+        with db.read_conn() as conn:
+            untracked_dirty = conn.execute("SELECT COUNT(*) FROM integrity_dirty;").fetchone()[0]
+        integrity.set_tracking(True)
+        retracked = integrity.check()
+
+    return {
+        "stints": len(rows),
+        "full_ms": round(full_ms, 1),
+        "incremental_ms": inc["ms"],
+        "incremental_stints": inc["stints_checked"],
+        "found": broken["found"],
+        "repairs": fixed["repairs"],
+        "untracked_dirty": untracked_dirty,
+        "ok": full["issues"] == 0 and inc["teams_checked"] == changes and inc["issues"] == 0
+              and inc["ms"] * 5 < full_ms and broken["found"] == 1 and fixed["issues"] == 0
+              and fixed["unique_active_index"] and stale["issues"] == 2 and fixed["repairs"] == 1 and kept
+              and untracked_dirty == 0 and retracked["full"] and retracked["issues"] == 0,
+    }
+
+
+def _storm(sessions: int, writes: int, interval: float, drivers_per_team: int) -> dict:
+    """Kør `sessions` spectate-løkker (render, vent ~1 sek., forfra) mens der skrives kørerskift."""
+    from core import admission, repo, timeline
+
+    stop = threading.Event()
+    served = [0] * sessions
+
+    def session(i):
+        while not stop.is_set():
+            repo.spectate_grid()
+            repo.list_teams()
+            repo.race_status()
+            timeline.stint_timeline(width_px=760)
+            served[i] += 1
+            stop.wait(admission.refresh_delay(1.0))
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    teams = len(repo.list_teams())
+    latencies = []
+    for i in range(writes):
+        team = i % teams + 1
+        t0 = time.perf_counter()
+        repo.start_stint(team, (team - 1) * drivers_per_team + 1 + i % drivers_per_team)
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(interval)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        "write_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "write_p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "write_max_ms": round(max(latencies) * 1000, 1),
+        "renders": sum(served),
+    }
+
+
+def bench_admission(teams: int = 120, drivers_per_team: int = 4, sessions: int = 48, writes: int = 60,
+                    interval: float = 0.05) -> dict:
+    """
+    Reconnect-storm: `sessions` sessioner (storskærm + team-laptops) starter samtidig i
+    spectate-løkken, og hver skrivning får dem alle til at misse cachen på én gang. Måler
+    skrivelatensen (start_stint) uden og med adgangsporten; med porten skal p95 holde sig
+    under en fast grænse, og overskydende læsninger skal få seneste gode resultat (shed).
+    """
+    from core import admission
+
+    gate = admission.GATE
+    saved = (gate.slots, gate.shed_depth, gate.wait_sec)
+    bound_ms = 100.0
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        from core import repo
+
+        repo.race_green(None, "2025-06-15 12:00:00")
+        idle = _storm(0, writes // 2, interval, drivers_per_team)
+        try:
+            gate.configure(slots=0)
+            ungated = _storm(sessions, writes, interval, drivers_per_team)
+            gate.configure(*saved)
+            gated = _storm(sessions, writes, interval, drivers_per_team)
+            metrics = admission.stats()
+        finally:
+            gate.configure(*saved)
+
+    return {
+        "sessions": sessions,
+        "idle_write_p95_ms": idle["write_p95_ms"],
+        "ungated_write_p95_ms": ungated["write_p95_ms"],
+        "ungated_write_max_ms": ungated["write_max_ms"],
+        "gated_write_p95_ms": gated["write_p95_ms"],
+        "gated_write_max_ms": gated["write_max_ms"],
+        "bound_ms": bound_ms,
+        "renders_ungated": ungated["renders"],
+        "renders_gated": gated["renders"],
+        "max_queue": metrics["max_queue"],
+        "shed": metrics["shed"],
+        "ok": gated["write_p95_ms"] <= bound_ms and metrics["shed"] > 0 and gated["renders"] > 0,
+    }
+
+
+def bench_soak(hours: float = 6.0, step_sec: int = 120, teams: int = 60, drivers_per_team: int = 4,
+               sessions: int = 4, warmup: float = 0.25) -> dict:
+    """
+    Soak-test uden browser: kør det spectate- og team-visningerne kalder for `sessions`
+    sessioner pr. simuleret trin (step_sec løbstid, med kørerskift) gennem `hours` simulerede
+    timer, og mål med core.telemetry. Efter opvarmningen skal den sporede hukommelse
+    (tracemalloc), RSS, filhåndtag og SQLite-forbindelser ligge fladt – ellers vises de
+    linjer der voksede mest.
+    """
+    from core import integrity, repo, telemetry, timeline
+    from core.coherence import current_version
+    from core.eventlog import record_many
+
+    rnd = random.Random(43)
+    steps = int(hours * 3600 / step_sec)
+    fmt = lambda e: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(e))
+    sim_start = int(time.time()) - steps * step_sec
+    was_tracing = telemetry.tracing()
+    telemetry.clear()
+    telemetry.set_tracing(True)
+    t0 = time.perf_counter()
+    try:
+        with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+            repo.race_green(None, fmt(sim_start))
+            marks = []
+            for step in range(steps):
+                changes = rnd.sample(range(1, teams + 1), max(1, teams // 30))
+                with db.write_conn() as conn:
+                    record_many(conn, "stint_start", [
+                        {"team_id": t, "driver_id": (t - 1) * drivers_per_team + rnd.randint(1, drivers_per_team)}
+                        for t in changes
+                    ], ts=fmt(sim_start + (step + 1) * step_sec))
+                integrity.check()
+                for sess in range(sessions):
+                    # Spectate (grid, status, tidslinje) og team-visningen for ét team
+                    current_version()
+                    grid = repo.spectate_grid()
+                    grid.rename(columns={"team_no": "Car no."}).assign(x=grid["driver_name"] + " ⏸")
+                    repo.race_status()
+                    timeline.stint_timeline(width_px=760)
+                    team = (step * sessions + sess) % teams + 1
+                    repo.list_teams()
+                    repo.current_stint(team)
+                    repo.stint_history(team)
+                    repo.team_drivers(team)
+                # Allokeringerne sammenlignes kun ved opvarmningens slutning og til sidst
+                marks.append(telemetry.sample(allocations=step in (int(steps * warmup), steps - 1)))
+            integrity.check()
+        gc_final = telemetry.sample()
+    finally:
+        telemetry.set_tracing(was_tracing)
+
+    base = marks[int(len(marks) * warmup)]
+    end = marks[-1]
+    sim_hours_after = (len(marks) - 1 - int(len(marks) * warmup)) * step_sec / 3600
+    traced_growth = end["traced_mb"] - base["traced_mb"]
+    rss_growth = end["rss_mb"] - base["rss_mb"]
+    per_24h = traced_growth / sim_hours_after * 24 if sim_hours_after else 0.0
+    return {
+        "sim_hours": hours,
+        "renders": steps * sessions,
+        "wall_s": round(time.perf_counter() - t0, 1),
+        "traced_mb_base": base["traced_mb"],
+        "traced_mb_end": end["traced_mb"],
+        "traced_mb_per_24h": round(per_24h, 2),
+        "rss_growth_mb": round(rss_growth, 1),
+        "fds": (base["fds"], end["fds"]),
+        "sqlite_conns": (base["sqlite_conns"], end["sqlite_conns"]),
+        "sqlite_conns_after": gc_final["sqlite_conns"],
+        "top_growth": [g["where"] for g in end["top_growth"][:3]],
+        "ok": per_24h < 5.0 and rss_growth < 25.0 and end["fds"] == base["fds"]
+              and end["sqlite_conns"] == base["sqlite_conns"],
+    }
+
+
+def bench_laps(cars: int = 100, laps_per_car: int = 4000, drivers_per_team: int = 4, naive_sample: int = 2000) -> dict:
+    """
+    Import af en resultatfil med omgangstider: `cars` biler á `laps_per_car` omgange
+    (standard 400.000) over ~1 t lange stints. Måler indlæsning, interval-join og lagring,
+    tjekker fordelingen mod et opslag pr. omgang for en stikprøve og sammenligner med
+    hvad det opslag pr. række ville koste for hele filen.
+    """
+    import numpy as np
+    import pandas as pd
+    from core import dedupe, laps
+
+    rnd = np.random.default_rng(44)
+    race_start = 1_750_000_000
+    fmt = lambda e: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(e))
+    with temp_db(teams=cars, drivers_per_team=drivers_per_team):
+        lap_sec = rnd.normal(100.0, 1.5, (cars, laps_per_car)).clip(95)
+        lap_sec[rnd.random((cars, laps_per_car)) < 0.03] += 40      # pit/gul flag
+        ends = race_start + lap_sec.cumsum(axis=1)
+        stint_rows = []
+        for t in range(cars):
+            at, end = race_start, float(ends[t, -1])
+            while at < end:
+                nxt = min(at + int(rnd.integers(3000, 4200)), end + 1)
+                stint_rows.append((t + 1, t * drivers_per_team + 1 + len(stint_rows) % drivers_per_team,
+                                   fmt(at), fmt(nxt) if nxt <= end else None))
+                at = nxt
+        with db.write_conn() as conn:
+            conn.executemany("INSERT INTO stint (team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?);",
+                             stint_rows)
+        frame = pd.DataFrame({
+            "Car #": np.repeat(np.arange(1, cars + 1), laps_per_car),
+            "Lap": np.tile(np.arange(1, laps_per_car + 1), cars),
+            "Lap Time": lap_sec.ravel().round(3),
+            "Timestamp": pd.to_datetime(ends.ravel(), unit="s", utc=True).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        }).sample(frac=1.0, random_state=44)   # resultatfiler er sorteret pr. bil, ikke tid
+        path = os.path.join(os.path.dirname(db.DB_PATH), "laps.csv")
+        frame.to_csv(path, index=False)
+
+        t0 = time.perf_counter()
+        res = laps.import_laps(path)
+        total_ms = (time.perf_counter() - t0) * 1000
+
+        # Stikprøve: opslag pr. omgang (som den gamle metode) skal give samme stint
+        loaded = laps.load_laps(path)
+        pick = loaded.sample(n=min(naive_sample, len(loaded)), random_state=1)
+        with db.read_conn() as conn:
+            stints = laps._stint_frame(conn)
+            joined = laps.attribute_laps(pick, stints)
+            t1 = time.perf_counter()
+            naive = {}
+            for r in pick.itertuples():
+                row = conn.execute(
+                    "SELECT s.id FROM stint s JOIN team t ON t.id = s.team_id WHERE t.team_no = ? "
+                    "AND CAST(strftime('%s', s.start_ts) AS REAL) <= ? "
+                    "AND (s.end_ts IS NULL OR CAST(strftime('%s', s.end_ts) AS REAL) >= ?) "
+                    "ORDER BY s.start_ts DESC LIMIT 1;",
+                    (r.car_no, r.ts, r.ts),
+                ).fetchone()
+                naive[(r.car_no, r.lap)] = row[0] if row else None
+            naive_ms = (time.perf_counter() - t1) * 1000
+            stored = conn.execute("SELECT SUM(laps) FROM stint_lap_stats;").fetchone()[0]
+            keep_name, drop_name = (conn.execute("SELECT name FROM driver WHERE id = ?;", (i,)).fetchone()[0]
+                                    for i in (1, 2))
+
+        # Fletning af dublet-kørere efter importen: omgangene følger med til den bevarede kører
+        before = laps.driver_pace().set_index("driver")["laps"]
+        dedupe.apply_merges([(1, 2)])
+        after = laps.driver_pace().set_index("driver")["laps"]
+        merge_ok = bool(int(after.sum()) == stored and drop_name not in after.index
+                        and after[keep_name] == before[keep_name] + before[drop_name])
+        mismatches = sum(
+            1 for r in joined.itertuples()
+            if naive[(r.car_no, r.lap)] != (None if pd.isna(r.stint_id) else int(r.stint_id))
+        )
+
+    per_row_ms = naive_ms / len(pick)
+    return {
+        "laps": res["laps"],
+        "stints": res["stints"],
+        "matched": res["matched"],
+        "import_ms": round(total_ms, 1),
+        "load_ms": res["load_ms"],
+        "join_ms": res["join_ms"],
+        "store_ms": res["store_ms"],
+        "naive_full_est_ms": round(per_row_ms * res["laps"], 0),
+        "sample_mismatches": mismatches,
+        "merge_ok": merge_ok,
+        "ok": res["matched"] == res["laps"] == stored and mismatches == 0 and total_ms < 10_000 and merge_ok,
+    }
+
+
+def _stats_dump(conn) -> tuple:
+    """team_stats og class_stats afrundet (sekunder fra julianday giver små flydetalsfejl)."""
+    rnd = lambda rows: [tuple(round(v, 3) if isinstance(v, float) else v for v in r) for r in rows]
+    return (
+        rnd(conn.execute("SELECT * FROM team_stats ORDER BY team_id;").fetchall()),
+        rnd(conn.execute("SELECT * FROM class_stats WHERE teams > 0 ORDER BY class_id;").fetchall()),
+    )
+
+
+def bench_stats(teams: int = 120, drivers_per_team: int = 4, stints_per_team: int = 40, rounds: int = 30,
+                reads: int = 50) -> dict:
+    """
+    Statistik-tavlen (core.stats): efter et løb med kørerskift, rødt flag og klasseskift skal
+    de trigger-vedligeholdte rækker være lig en fuld genberegning; tavlen læses mod samme
+    aggregering direkte over stints, og et kørerskift måles med og uden triggerne.
+    """
+    import sqlite3
+    from core import repo, stats
+    from core.eventlog import record_many
+
+    rnd = random.Random(46)
+    fmt = lambda e: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(e))
+    driver = lambda t, k: (t - 1) * drivers_per_team + 1 + k % drivers_per_team
+    with temp_db(teams=teams, drivers_per_team=drivers_per_team):
+        start = 1_750_000_000
+        with db.write_conn() as conn:
+            conn.executemany("INSERT INTO stint (team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?);", [
+                (t, driver(t, k), fmt(start + k * 3000), fmt(start + (k + 1) * 3000))
+                for t in range(1, teams + 1) for k in range(stints_per_team)
+            ])
+        now = start + stints_per_team * 3000
+        repo.race_green(None, fmt(now))
+        classes = repo.list_car_classes()
+        for i in range(rounds):
+            now += 60
+            picked = rnd.sample(range(1, teams + 1), teams // 10)
+            with db.write_conn() as conn:
+                record_many(conn, "stint_start", [{"team_id": t, "driver_id": driver(t, i + 1)} for t in picked],
+                            ts=fmt(now))
+            if i % 10 == 3:
+                repo.race_freeze(fmt(now + 10))
+                repo.race_unfreeze(fmt(now + 40))
+            if i % 7 == 5:
+                repo.set_team_class(rnd.randint(1, teams), rnd.choice(classes))
+        repo.race_freeze(fmt(now + 30))  # slut midt i et rødt flag: åbne pauser i ankrene
+
+        with db.read_conn() as conn:
+            incremental = _stats_dump(conn)
+        with db.write_conn() as conn:
+            stats.refresh(conn)
+        with db.read_conn() as conn:
+            consistent = _stats_dump(conn) == incremental
+
+        board_sql = "SELECT * FROM team_stats ts JOIN team t ON t.id = ts.team_id;"
+        naive_sql = "SELECT * FROM team_stats_calc;"
+        conn = db.get_conn()
+        try:
+            board_ms = _timed_ms(lambda: conn.execute(board_sql).fetchall(), reads)
+            naive_ms = _timed_ms(lambda: conn.execute(naive_sql).fetchall(), reads)
+        finally:
+            conn.close()
+        # Under rødt flag står stint-uret stille, mens "siden skift" går videre
+        board = stats.team_board()
+        early, late = stats.live_columns(board, now=now + 60), stats.live_columns(board, now=now + 600)
+        frozen_ok = bool(
+            board["open_pause_ts"].notna().all()
+            and (early["stint_sec"] == late["stint_sec"]).all()
+            and ((late["since_change_sec"] - early["since_change_sec"]).round() == 540).all()
+        )
+
+        repo.race_unfreeze(fmt(now + 50))
+
+        def swap_ms(n=40):
+            times = []
+            for k in range(n):
+                t = k % teams + 1
+                t0 = time.perf_counter()
+                with db.write_conn() as conn:
+                    record_many(conn, "stint_start", [{"team_id": t, "driver_id": driver(t, k)}], ts=fmt(now + 100 + k))
+                times.append(time.perf_counter() - t0)
+            return _percentile(times, 50) * 1000
+
+        swap_ms(10)  # opvarmning
+        with_triggers = swap_ms()
+        raw = sqlite3.connect(db.DB_PATH)
+        for (name,) in raw.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stats_%';").fetchall():
+            raw.execute(f"DROP TRIGGER {name};")
+        raw.commit()
+        raw.close()
+        without_triggers = swap_ms()
+
+    return {
+        "stints": teams * stints_per_team + teams + rounds * (teams // 10),
+        "consistent": consistent,
+        "board_ms": round(board_ms, 2),
+        "naive_ms": round(naive_ms, 1),
+        "swap_p50_ms": round(with_triggers, 2),
+        "swap_p50_no_triggers_ms": round(without_triggers, 2),
+        "ok": consistent and frozen_ok and board_ms * 10 < naive_ms and with_triggers - without_triggers < 3,
+    }
+
+
+def _entry_csv(file_no: int, teams: int, drivers_per_team: int) -> bytes:
+    """Bredt tilmeldingsark som fra et mesterskab: mojibake i navnene, enkelte dubletter."""
+    header = ["Team name", "Car class", "Car no"] + [f"Driver name {k + 1}" for k in range(drivers_per_team)]
+    lines = [",".join(header)]
+    for t in range(teams):
+        team = f"RÃ¸de Ã†bler {file_no}-{t}" if t % 5 == 0 else f"Team {file_no}-{t}"
+        drivers = [f"SÃ¸ren {file_no}-{t}-{k}" if k % 2 else f"Driver {file_no}-{t}-{k}" for k in range(drivers_per_team)]
+        lines.append(",".join([team, ("GT3 PRO", "GT3 AM", "GTP", "GT3")[t % 4], str(file_no * 1000 + t), *drivers]))
+    lines.append(lines[1])  # samme team to gange i filen
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def bench_batch_import(files: int = 48, teams_per_file: int = 60, drivers_per_team: int = 4) -> dict:
+    """
+    Batch-import af mange tilmeldingsfiler: parsing/validering i én proces mod en
+    proces-pulje med én arbejder pr. CPU (samme staging-frame), og én commit til sidst.
+    Skalering kræver flere kerner; på én kerne tjekkes kun at resultatet er det samme.
+    """
+    from core import importers
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    sources = [(f"runde-{i}.csv", _entry_csv(i, teams_per_file, drivers_per_team)) for i in range(files)]
+    with temp_db():
+        serial = importers.stage_batch(sources, "wide", workers=1)
+        parallel = importers.stage_batch(sources, "wide", workers=cores) if cores > 1 else serial
+        same = serial["staging"].equals(parallel["staging"])
+        t0 = time.perf_counter()
+        imported = importers.import_staging(parallel["staging"])
+        commit_ms = (time.perf_counter() - t0) * 1000
+        with db.read_conn() as conn:
+            teams, links = conn.execute("SELECT (SELECT COUNT(*) FROM team), (SELECT COUNT(*) FROM team_driver);").fetchone()
+
+    speedup = serial["ms"] / parallel["ms"]
+    return {
+        "files": files,
+        "mb": round(sum(len(c) for _, c in sources) / 2**20, 1),
+        "cores": cores,
+        "staged_rows": len(parallel["staging"]),
+        "duplicates": parallel["duplicates"],
+        "serial_ms": serial["ms"],
+        "parallel_ms": parallel["ms"],
+        "speedup": round(speedup, 2),
+        "commit_ms": round(commit_ms, 1),
+        "ok": same and teams == files * teams_per_file and links == teams * drivers_per_team
+              and imported["teams"] == teams and (cores < 2 or speedup >= 0.5 * min(cores, 8)),
+    }
+
+
+SUITES = {
+    "coherence": bench_coherence,
+    "mirror": bench_mirror,
+    "eventlog": bench_event_rebuild,
+    "dedupe": bench_dedupe,
+    "planner": bench_planner,
+    "feed": bench_feed,
+    "sheets": bench_sheets,
+    "timeline": bench_timeline,
+    "lifecycle": bench_lifecycle,
+    "integrity": bench_integrity,
+    "admission": bench_admission,
+    "soak": bench_soak,
+    "laps": bench_laps,
+    "stats": bench_stats,
+    "batch_import": bench_batch_import,
+}
+
+
+def run(names=None) -> dict:
+    return {name: SUITES[name]() for name in (names or SUITES)}
+
+
+if __name__ == "__main__":
+    for name, result in run(sys.argv[1:]).items():
+        print(f"{name}: {result}")
@@ -0,0 +1,81 @@
+# core/classes.py
+"""
+Bilklasse-kataloget: tabellerne car_class (navn, sort_rank, farve, standardklasse) og
+car_class_alias (alias → klasse). Teams peger på kataloget med team.class_id; team.car_class
+er klassens navn som label til søgning/visning og holdes ajour af en trigger ved omdøbning.
+
+Normaliseringen af klassefelter fra CSV/Sheets er data-drevet: et alias matcher når alle
+dets ord findes i værdien, og det mest specifikke match vinder ("GT3 AM" før "GT3").
+Står to klasser lige (fx "GT3 PRO-AM"), bruges næste, mindre specifikke niveau; ellers
+standardklassen. En ny klasse (LMP2, GT4) er derfor blot en ny række i kataloget.
+"""
+
+# Startindhold for en ny database: (navn, sort_rank, farve, aliaser, standard)
+DEFAULT_CLASSES = [
+    ("GTP", 0, "#d62728", ["LMDH"], 0),
+    ("GT3 PRO", 1, "#1f77b4", [], 0),
+    ("GT3 AM", 2, "#2ca02c", [], 0),
+    ("GT3", 3, "#ff7f0e", [], 1),
+]
+
+
+def load_rules(conn) -> tuple:
+    """(regler, standardklasse) hvor regler = ((ord, klassenavn, sort_rank), ...)."""
+    rows = conn.execute(
+        "SELECT a.alias, c.name, c.sort_rank FROM car_class_alias a "
+        "JOIN car_class c ON c.id = a.class_id;"
+    ).fetchall()
+    default = conn.execute(
+        "SELECT name FROM car_class ORDER BY is_default DESC, sort_rank DESC, id LIMIT 1;"
+    ).fetchone()
+    rules = tuple((tuple(alias.split()), name, rank) for alias, name, rank in rows)
+    return rules, (default[0] if default else None)
+
+
+def match_class(value, rules: tuple, default: str | None) -> str | None:
+    """Klassenavnet som value (fri tekst) bedst matcher, eller default."""
+    if not isinstance(value, str) or not value.strip():
+        return default
+    v = " ".join(value.strip().upper().split())
+    hits = {}
+    for words, name, rank in rules:
+        if " ".join(words) == v:
+            return name
+        if all(w in v for w in words):
+            hits.setdefault(len(words), {})[name] = rank
+    for level in sorted(hits, reverse=True):
+        if len(hits[level]) == 1:
+            return next(iter(hits[level]))
+    if hits:
+        # Ingen entydig på noget niveau: laveste sort_rank blandt de mest specifikke
+        top = hits[max(hits)]
+        return min(top, key=lambda n: (top[n], n))
+    return default
+
+
+def resolve_class(cur, value) -> tuple[int | None, str | None]:
+    """(class_id, navn) for en klasseværdi; præcise navne/aliaser slås op direkte."""
+    if isinstance(value, str) and value.strip():
+        row = cur.execute(
+            "SELECT c.id, c.name FROM car_class_alias a JOIN car_class c ON c.id = a.class_id "
+            "WHERE a.alias = ?;",
+            (" ".join(value.strip().upper().split()),),
+        ).fetchone()
+        if row:
+            return row
+    name = match_class(value, *load_rules(cur))
+    if name is None:
+        return None, None
+    return cur.execute("SELECT id, name FROM car_class WHERE name = ?;", (name,)).fetchone()
+
+
+def backfill_team_classes(conn) -> int:
+    """Sæt team.class_id (og navnet) hvor det mangler (migrering / gamle snapshots)."""
+    values = [r[0] for r in conn.execute("SELECT DISTINCT car_class FROM team WHERE class_id IS NULL;")]
+    for value in values:
+        class_id, name = resolve_class(conn, value)
+        conn.execute(
+            "UPDATE team SET class_id = ?, car_class = ? WHERE class_id IS NULL AND car_class IS ?;",
+            (class_id, name, value),
+        )
+    return len(values)
@@ -0,0 +1,193 @@
+# core/coherence.py
+"""
+Kohærens mellem flere Streamlit-processer (replikaer) der deler iracing.db.
+
+Sandheden er `change_seq`-tabellen, som triggers tæller op ved hver ændring.
+En ChangeWatcher pr. proces holder én fast forbindelse og ser billigt efter ændringer:
+  - notify-filens mtime (touch'es af db.write_conn efter commit)
+  - PRAGMA data_version (fanger også skrivninger der ikke går gennem write_conn)
+  - databasefilens inode (fanger slet/genskab)
+Læsninger med @cached genbruges indtil versionen flytter sig, højst MAX_STALENESS_SEC forsinket.
+Cache-miss går gennem adgangsporten (core.admission), så en storm af samtidige miss ikke
+kan fortrænge skrivningerne.
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from core import admission, db
+
+MAX_STALENESS_SEC = float(os.environ.get("RACE_MAX_STALENESS", "0.5"))
+
+
+def change_version(conn=None) -> int:
+    """Læs den aktuelle ændringsversion direkte fra DB."""
+    if conn is not None:
+        return conn.execute("SELECT seq FROM change_seq WHERE id = 1;").fetchone()[0]
+    c = db.get_conn()
+    try:
+        return change_version(c)
+    finally:
+        c.close()
+
+
+class ChangeWatcher:
+    """Følger ændringsversionen for én databasefil med en garanteret maks-forsinkelse."""
+
+    def __init__(self, path: str, max_delay: float = MAX_STALENESS_SEC):
+        self.path = path
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._conn = None
+        self._ino = None
+        self._data_version = None
+        self._notify_mtime = None
+        self._version = None
+        self._checked_at = 0.0
+        self._subscribers = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ----- intern tilstand -----
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_ino, st.st_mtime_ns
+        except FileNotFoundError:
+            return None, None
+
+    def _refresh(self) -> int:
+        ino, _ = self._stat(self.path)
+        _, notify_mtime = self._stat(self.path + ".notify")
+        if self._conn is None or ino != self._ino:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(self.path, timeout=db.BUSY_TIMEOUT_SEC, check_same_thread=False)
+            self._ino = ino
+            self._data_version = None
+
+        data_version = self._conn.execute("PRAGMA data_version;").fetchone()[0]
+        if (
+            self._version is None
+            or data_version != self._data_version
+            or notify_mtime != self._notify_mtime
+        ):
+            try:
+                self._version = change_version(self._conn)
+            except sqlite3.OperationalError:
+                # Schema ikke oprettet endnu
+                self._version = 0
+            self._data_version = data_version
+            self._notify_mtime = notify_mtime
+        self._checked_at = time.monotonic()
+        return self._version
+
+    # ----- offentligt API -----
+    def version(self) -> int:
+        """Aktuel version; spørger højst DB'en hvert max_delay sekund."""
+        with self._lock:
+            if self._version is None or time.monotonic() - self._checked_at >= self.max_delay:
+                return self._refresh()
+            return self._version
+
+    def invalidate(self):
+        """Tving næste version()-kald til at kigge efter (bruges efter lokale skrivninger)."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def subscribe(self, fn):
+        """fn(version) kaldes fra baggrundstråden når versionen ændrer sig."""
+        self._subscribers.append(fn)
+        self.start()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="change-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        last = None
+        while not self._stop.wait(self.max_delay):
+            try:
+                v = self.version()
+            except sqlite3.Error:
+                continue
+            if v != last:
+                last = v
+                for fn in list(self._subscribers):
+                    fn(v)
+
+
+_watchers: dict = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watcher() -> ChangeWatcher:
+    """Én watcher pr. databasefil pr. proces."""
+    path = os.path.abspath(db.DB_PATH)
+    with _watchers_lock:
+        w = _watchers.get(path)
+        if w is None:
+            w = _watchers[path] = ChangeWatcher(path)
+        return w
+
+
+def current_version() -> int:
+    return get_watcher().version()
+
+
+def _on_local_write():
+    with _watchers_lock:
+        watchers = list(_watchers.values())
+    for w in watchers:
+        w.invalidate()
+
+
+db.add_write_hook(_on_local_write)
+
+
+def cached(fn):
+    """
+    Genbrug resultatet af en læsefunktion så længe DB-versionen er uændret.
+    Cachen holder kun den aktuelle version, så den kan ikke vokse over tid. Under overlast
+    kan et miss blive besvaret med seneste gode resultat (core.admission).
+    DataFrames kopieres ud, så kaldere frit kan ændre i dem.
+    """
+    state = {"key": None, "values": {}}
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        version_key = (os.path.abspath(db.DB_PATH), current_version())
+        call_key = (args, tuple(sorted(kwargs.items())))
+        with lock:
+            if state["key"] != version_key:
+                state["key"] = version_key
+                state["values"] = {}
+            hit = state["values"].get(call_key, _MISS)
+        if hit is _MISS:
+            hit, fresh = admission.run_read(
+                (version_key[0], fn.__module__, fn.__qualname__, call_key), lambda: fn(*args, **kwargs)
+            )
+            with lock:
+                # Et gammelt resultat (porten var fuld) gemmes ikke under den nye version
+                if fresh and state["key"] == version_key:
+                    state["values"][call_key] = hit
+        return hit.copy() if isinstance(hit, (pd.DataFrame, dict, list)) else hit
+
+    wrapper.cache_clear = lambda: state.update(key=None, values={})
+    return wrapper
+
+
+_MISS = object()
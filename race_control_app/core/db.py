@@ -1,17 +1,184 @@
 # core/db.py
 import sqlite3
 import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "..", "iracing.db")
 
+# Flere server-processer (replikaer) kan dele samme fil → vent på låse i stedet for at fejle
+BUSY_TIMEOUT_SEC = 30
+
+# Tabeller hvor enhver ændring tæller change_seq op (se ensure_schema)
+VERSIONED_TABLES = [
+    "team", "driver", "team_driver", "stint", "stint_pause", "stint_lap_stats", "meta", "car_class", "car_class_alias",
+]
+
+# Tabeller der hører til ét event og tømmes når eventet arkiveres (core.archive),
+# i den rækkefølge de skal slettes
+EVENT_TABLES = [
+    "race_event", "race_event_archive", "race_snapshot", "integrity_issue", "integrity_dirty",
+    "stint_lap_stats", "stint_pause", "stint", "team_driver", "team", "driver", "team_stats", "class_stats",
+]
+
+# Kaldes efter hver commit via write_conn() (fx cache-invalidering i core.coherence)
+_write_hooks = []
+
+# Sættes af core.mirror.enable(): context manager der giver en læseforbindelse til spejlet
+_read_provider = None
+
+# Sættes af core.admission: context manager der giver skrivningen en plads i adgangsporten
+_write_gate = nullcontext
+
+# Databasefiler hvis schema er sikret i denne proces (ensure_schema_once)
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
 def get_conn():
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SEC)
+
+
+def notify_path() -> str:
+    """Sidefil som skrivere 'touch'er efter commit, så andre replikaer ser ændringen billigt."""
+    return DB_PATH + ".notify"
+
+
+def touch_notify():
+    path = notify_path()
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+
+# ---------- Én replika pr. rolle ----------
+try:
+    import fcntl
+
+    def _lock(fh, block: bool):
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+
+    def _unlock(fh):
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock(fh, block: bool):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK if block else msvcrt.LK_NBLCK, 1)
+
+    def _unlock(fh):
+        fh.seek(0)
+        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Låsfiler denne proces holder (sti → åben fil); OS'et frigiver dem når processen dør
+_lead_files = {}
+_lead_lock = threading.Lock()
+
+
+def lead(role: str) -> bool:
+    """
+    True hvis denne proces er den replika der udfører `role` (fx "feed", "snapshots",
+    "integrity"). Første kald tager en ikke-blokerende lås på <db>.<role>.lock og holder den;
+    de andre replikaer får False og kan spørge igen med mellemrum, så en af dem overtager
+    hvis lederen stopper.
+    """
+    path = f"{DB_PATH}.{role}.lock"
+    with _lead_lock:
+        if path in _lead_files:
+            return True
+        fh = open(path, "a+b")
+        try:
+            _lock(fh, block=False)
+        except OSError:
+            fh.close()
+            return False
+        _lead_files[path] = fh
+        return True
+
+
+def resign(role: str):
+    """Slip rollen igen (fx når en baggrundstråd stoppes)."""
+    with _lead_lock:
+        fh = _lead_files.pop(f"{DB_PATH}.{role}.lock", None)
+    if fh is not None:
+        fh.close()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Eksklusiv lås (venter) på sidefilen path – på tværs af replikaer og tråde."""
+    with open(path, "a+b") as fh:
+        _lock(fh, block=True)
+        try:
+            yield
+        finally:
+            _unlock(fh)
+
+
+def add_write_hook(fn):
+    if fn not in _write_hooks:
+        _write_hooks.append(fn)
+
+
+def set_read_provider(provider):
+    global _read_provider
+    _read_provider = provider
+
+
+def set_write_gate(gate):
+    global _write_gate
+    _write_gate = gate
+
+
+@contextmanager
+def read_conn():
+    """
+    Forbindelse til læsninger. Bruger in-memory spejlet hvis det er slået til (core.mirror),
+    ellers en kortlivet disk-forbindelse der lukkes igen.
+    """
+    if _read_provider is not None:
+        with _read_provider() as conn:
+            yield conn
+        return
+    conn = get_conn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def write_conn():
+    """
+    Forbindelse til skrivninger: commit ved succes, rollback ved fejl, luk altid.
+    Bagefter signaleres ændringen til denne proces (hooks) og andre replikaer (notify-fil).
+    Skrivningen venter på en plads i adgangsporten (core.admission), foran ventende læsninger.
+    """
+    with _write_gate():
+        conn = get_conn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        touch_notify()
+        for fn in list(_write_hooks):
+            fn()
+
 
 def ensure_schema():
     """Opretter minimal database hvis den ikke findes."""
     conn = get_conn()
     cur = conn.cursor()
 
+    # WAL: læsere (spectate på flere replikaer) blokerer ikke skrivere og omvendt
+    cur.execute("PRAGMA journal_mode=WAL;")
+
     # Minimal tables — just enough to not crash
     cur.execute("""
     CREATE TABLE IF NOT EXISTS team (
@@ -44,20 +211,567 @@ def ensure_schema():
         end_ts TIMESTAMP
     )
     """)
+    # Aktiv stint pr. team slås op ved hvert stintskift og i spectate-gridet
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_stint_team_open ON stint(team_id) WHERE end_ts IS NULL;")
+    # Tidslinjen (core.timeline) henter stints der overlapper et vindue
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_stint_start ON stint(start_ts);")
+    # Et teams stints i rækkefølge (historik, integritetstjek af overlap)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_stint_team_start ON stint(team_id, start_ts);")
+    ensure_active_stint_index(cur)
+    # Rødt flag: pauser i en stint (tæller ikke som køretid); end_ts NULL = pausen er i gang
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS stint_pause (
+        id INTEGER PRIMARY KEY,
+        stint_id INTEGER NOT NULL,
+        start_ts TIMESTAMP NOT NULL,
+        end_ts TIMESTAMP
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_stint_pause_stint ON stint_pause(stint_id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_stint_pause_open ON stint_pause(stint_id) WHERE end_ts IS NULL;")
+    # Omgangstider fra resultatfilen aggregeret pr. stint (core.laps); summer så de kan lægges sammen.
+    # Team og kører hentes altid gennem stint, så flyt/fletning af kørere slår igennem.
+    lap_stats_sql = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        stint_id INTEGER PRIMARY KEY,
+        laps INTEGER NOT NULL,
+        clean_laps INTEGER NOT NULL,
+        best_sec REAL,
+        sum_sec REAL NOT NULL,
+        sumsq_sec REAL NOT NULL,
+        first_lap INTEGER,
+        last_lap INTEGER
+    )
+    """
+    cur.execute(lap_stats_sql.format(name="stint_lap_stats"))
+    # --- MIGRATION: ældre stint_lap_stats havde en kopi af team_id/driver_id fra stint ---
+    if "driver_id" in [r[1] for r in cur.execute("PRAGMA table_info(stint_lap_stats);")]:
+        cols = "stint_id, laps, clean_laps, best_sec, sum_sec, sumsq_sec, first_lap, last_lap"
+        cur.execute("DROP INDEX IF EXISTS ix_stint_lap_stats_driver;")
+        cur.execute(lap_stats_sql.format(name="stint_lap_stats__new"))
+        cur.execute(f"INSERT INTO stint_lap_stats__new ({cols}) SELECT {cols} FROM stint_lap_stats;")
+        cur.execute("DROP TABLE stint_lap_stats;")  # versions-triggerne genskabes i ensure_schema
+        cur.execute("ALTER TABLE stint_lap_stats__new RENAME TO stint_lap_stats;")
+
     # --- MIGRATIONS: tilføj team_no hvis den mangler ---
     cur.execute("PRAGMA table_info(team);")
     team_cols = [r[1] for r in cur.fetchall()]
     if "team_no" not in team_cols:
         cur.execute("ALTER TABLE team ADD COLUMN team_no INTEGER;")
 
+    _ensure_class_catalog(cur)
+
     cur.execute("PRAGMA table_info(driver);")
     cols = [r[1] for r in cur.fetchall()]
     if "iracing_id" not in cols:
         cur.execute("ALTER TABLE driver ADD COLUMN iracing_id TEXT;")
+    if "name_key" not in cols:
+        cur.execute("ALTER TABLE driver ADD COLUMN name_key TEXT;")
+    # Dublet-genkendelse ved import (core.dedupe): normaliseret navn og iRacing-id
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_driver_name_key ON driver(name_key);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_driver_iracing_id ON driver(iracing_id);")
+
+    # Nøgle/værdi-indstillinger for det aktuelle event (fx event_name)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+
+    _ensure_change_seq(cur)
+    _ensure_event_log(cur)
+    _ensure_search_index(cur)
+    _ensure_integrity(cur)
+    _ensure_race_stats(cur)
+
+    # Data fra før hændelsesloggen skal med i en baseline-snapshot (se core.eventlog)
+    from core.classes import backfill_team_classes
+    from core.dedupe import backfill_name_keys
+    from core.eventlog import ensure_baseline
+    backfill_team_classes(conn)
+    backfill_name_keys(conn)
+    ensure_baseline(conn)
 
     conn.commit()
     conn.close()
 
+
+def ensure_active_stint_index(cur) -> bool:
+    """
+    Højst én aktiv stint pr. team (som i de oprindelige databaser). Findes der allerede
+    teams med to åbne stints, kan indekset ikke oprettes; core.integrity finder dem, og
+    indekset oprettes når de er rettet. Returnerer om indekset findes.
+    """
+    try:
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_stint_team_active ON stint(team_id) WHERE end_ts IS NULL;")
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+def _ensure_class_catalog(cur):
+    """
+    Bilklasse-katalog (core.classes) og team.class_id. Ældre databaser med
+    CHECK (car_class IN ('GTP','GT3')) bygges om, da den afviser "GT3 PRO"/"GT3 AM".
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS car_class (
+        id         INTEGER PRIMARY KEY,
+        name       TEXT NOT NULL UNIQUE,
+        sort_rank  INTEGER NOT NULL,
+        colour     TEXT,
+        is_default INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    # Unik (sort_rank, id) → klasser og grids kan læses i indeksrækkefølge uden sortering
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_car_class_rank ON car_class(sort_rank, id);")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS car_class_alias (
+        alias    TEXT PRIMARY KEY,
+        class_id INTEGER NOT NULL REFERENCES car_class(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """)
+    if cur.execute("SELECT COUNT(*) FROM car_class;").fetchone()[0] == 0:
+        from core.classes import DEFAULT_CLASSES
+        for name, rank, colour, aliases, is_default in DEFAULT_CLASSES:
+            cur.execute(
+                "INSERT INTO car_class (name, sort_rank, colour, is_default) VALUES (?, ?, ?, ?);",
+                (name, rank, colour, is_default),
+            )
+            cur.executemany(
+                "INSERT INTO car_class_alias (alias, class_id) VALUES (?, ?);",
+                [(a, cur.lastrowid) for a in (name, *aliases)],
+            )
+
+    table_sql = cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='team';").fetchone()[0]
+    if "CHECK" in table_sql.upper():
+        cols = [r[1] for r in cur.execute("PRAGMA table_info(team);")]
+        keep = [c for c in ("id", "name", "car_class", "team_pin", "team_no") if c in cols]
+        cur.execute("""
+        CREATE TABLE team__new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            car_class TEXT,
+            team_pin TEXT,
+            team_no INTEGER
+        )
+        """)
+        cur.execute(f"INSERT INTO team__new ({', '.join(keep)}) SELECT {', '.join(keep)} FROM team;")
+        cur.execute("DROP TABLE team;")  # tager også teamets triggers med; de genskabes nedenfor
+        cur.execute("ALTER TABLE team__new RENAME TO team;")
+
+    if "class_id" not in [r[1] for r in cur.execute("PRAGMA table_info(team);")]:
+        cur.execute("ALTER TABLE team ADD COLUMN class_id INTEGER REFERENCES car_class(id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_team_class ON team(class_id, team_no IS NULL, team_no, name);")
+    # Omdøbes en klasse, følger holdenes label med (og dermed søgeindekset)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_car_class_name
+    AFTER UPDATE OF name ON car_class
+    BEGIN
+        UPDATE team SET car_class = NEW.name WHERE class_id = NEW.id;
+    END
+    """)
+
+
+def _ensure_change_seq(cur):
+    """
+    Én-rækkes tæller der bumpes af triggers ved enhver ændring i VERSIONED_TABLES.
+    Startværdien er tidsbaseret, så en slettet/genskabt DB aldrig genbruger et gammelt versionsnummer.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS change_seq (
+        id  INTEGER PRIMARY KEY CHECK (id = 1),
+        seq INTEGER NOT NULL
+    )
+    """)
+    cur.execute(
+        "INSERT OR IGNORE INTO change_seq (id, seq) VALUES (1, ?);",
+        (int(time.time() * 1000),)
+    )
+    for table in VERSIONED_TABLES:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_seq
+            AFTER {op} ON {table}
+            BEGIN
+                UPDATE change_seq SET seq = seq + 1 WHERE id = 1;
+            END
+            """)
+
+
+def _ensure_event_log(cur):
+    """Tabeller til den append-only hændelseslog (core.eventlog)."""
+    # AUTOINCREMENT: id'er må aldrig genbruges efter komprimering har tømt den varme log
+    for table, pk in (("race_event", "INTEGER PRIMARY KEY AUTOINCREMENT"), ("race_event_archive", "INTEGER PRIMARY KEY")):
+        cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id        {pk},
+            ts        TEXT NOT NULL,
+            kind      TEXT NOT NULL,
+            team_id   INTEGER,
+            driver_id INTEGER,
+            payload   TEXT NOT NULL
+        )
+        """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_race_event_team ON race_event(team_id, id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_race_event_archive_team ON race_event_archive(team_id, id);")
+    # Hændelser må aldrig rettes, kun tilføjes (og flyttes til arkivet ved komprimering)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_race_event_no_update
+    BEFORE UPDATE ON race_event
+    BEGIN
+        SELECT RAISE(ABORT, 'race_event er append-only');
+    END
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS race_snapshot (
+        id            INTEGER PRIMARY KEY,
+        upto_event_id INTEGER NOT NULL,
+        created_at    TEXT NOT NULL,
+        state         BLOB NOT NULL,
+        is_baseline   INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+
+def _ensure_integrity(cur):
+    """
+    Tabeller til core.integrity. Triggers noterer hvilke stints/teams/navne der er berørt af
+    en ændring i integrity_dirty, så tjekket kun ser på dem (fra high-water mark i
+    integrity_state). Tabellerne er ikke versionerede: et tjek invaliderer ingen caches.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS integrity_dirty (
+        id    INTEGER PRIMARY KEY AUTOINCREMENT,
+        scope TEXT NOT NULL,
+        key   TEXT NOT NULL
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS integrity_state (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS integrity_issue (
+        id         INTEGER PRIMARY KEY,
+        check_name TEXT NOT NULL,
+        scope      TEXT NOT NULL,
+        scope_key  TEXT NOT NULL,
+        team_id    INTEGER,
+        ref        TEXT,
+        detail     TEXT,
+        found_at   TEXT NOT NULL
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_integrity_issue_scope ON integrity_issue(scope, scope_key);")
+
+    dirty = "INSERT INTO integrity_dirty (scope, key) VALUES ('{scope}', {key});"
+    name_key = "LOWER(TRIM(COALESCE({t}.name, '')))"
+    triggers = {
+        "trg_integrity_stint_ins": (
+            "AFTER INSERT ON stint BEGIN "
+            f"{dirty.format(scope='team', key='NEW.team_id')} "
+            f"{dirty.format(scope='stint', key='NEW.id')} END"
+        ),
+        "trg_integrity_stint_upd": (
+            "AFTER UPDATE ON stint BEGIN "
+            f"{dirty.format(scope='team', key='NEW.team_id')} "
+            f"{dirty.format(scope='team', key='OLD.team_id')} "
+            f"{dirty.format(scope='stint', key='NEW.id')} END"
+        ),
+        "trg_integrity_stint_del": (
+            "AFTER DELETE ON stint BEGIN "
+            f"{dirty.format(scope='team', key='OLD.team_id')} "
+            f"{dirty.format(scope='stint', key='OLD.id')} END"
+        ),
+        "trg_integrity_link_ins": f"AFTER INSERT ON team_driver BEGIN {dirty.format(scope='team', key='NEW.team_id')} END",
+        "trg_integrity_link_upd": (
+            "AFTER UPDATE OF team_id, driver_id ON team_driver BEGIN "
+            f"{dirty.format(scope='team', key='NEW.team_id')} "
+            f"{dirty.format(scope='team', key='OLD.team_id')} END"
+        ),
+        "trg_integrity_link_del": f"AFTER DELETE ON team_driver BEGIN {dirty.format(scope='team', key='OLD.team_id')} END",
+        "trg_integrity_driver_del": f"AFTER DELETE ON driver BEGIN {dirty.format(scope='driver', key='OLD.id')} END",
+        "trg_integrity_team_ins": (
+            "AFTER INSERT ON team BEGIN "
+            f"{dirty.format(scope='team', key='NEW.id')} "
+            f"{dirty.format(scope='name', key=name_key.format(t='NEW'))} END"
+        ),
+        "trg_integrity_team_upd": (
+            "AFTER UPDATE OF name ON team BEGIN "
+            f"{dirty.format(scope='name', key=name_key.format(t='NEW'))} "
+            f"{dirty.format(scope='name', key=name_key.format(t='OLD'))} END"
+        ),
+        "trg_integrity_team_del": (
+            "AFTER DELETE ON team BEGIN "
+            f"{dirty.format(scope='team', key='OLD.id')} "
+            f"{dirty.format(scope='name', key=name_key.format(t='OLD'))} END"
+        ),
+    }
+    # Under en genopbygning (eventlog.rebuild) er alt berørt; den sætter 'suspended' og
+    # nulstiller high-water mark'et, så næste tjek er fuldt i stedet for én markering pr. række.
+    # 'untracked' er sat når baggrundstjekket er slået fra (integrity.set_tracking) – så er der
+    # ingen til at rydde integrity_dirty op, og triggerne noterer intet.
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM integrity_state WHERE key IN ('suspended', 'untracked'))"
+    stale = {
+        name for name, sql in cur.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'trg_integrity_%';"
+        ).fetchall() if "'untracked'" not in sql
+    }
+    for name, body in triggers.items():
+        if name in stale:
+            cur.execute(f"DROP TRIGGER {name};")
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body.replace(' BEGIN ', f' {guard} BEGIN ', 1)};")
+
+
+# Statistik pr. team, beregnet fra bunden. Lukkede stints' længde er uden rødt flag-pauser;
+# for den åbne stint gives ankre (start, afsluttede pausers længde, start på igangværende
+# pause), så uret kan regnes ved visning. team_stats er et materialiseret udsnit af viewet
+# team_stats_calc: triggers genindsætter kun det berørte team ({where}).
+TEAM_STATS_SELECT = """
+SELECT t.id AS team_id, COALESCE(t.class_id, 0) AS class_id, COUNT(s.id) AS stints,
+       COUNT(s.end_ts) AS closed_stints,
+       COALESCE(SUM(
+         (julianday(s.end_ts) - julianday(s.start_ts)) * 86400
+         - COALESCE((SELECT SUM((julianday(p.end_ts) - julianday(p.start_ts)) * 86400)
+                     FROM stint_pause p WHERE p.stint_id = s.id AND p.end_ts IS NOT NULL), 0)
+       ), 0) AS closed_sec,
+       COUNT(DISTINCT s.driver_id) AS drivers_used,
+       COUNT(s.id) - COUNT(s.end_ts) AS open_stints,
+       MAX(s.start_ts) AS last_change_ts,
+       o.start_ts AS open_start_ts,
+       COALESCE((SELECT SUM((julianday(p.end_ts) - julianday(p.start_ts)) * 86400)
+                 FROM stint_pause p WHERE p.stint_id = o.id AND p.end_ts IS NOT NULL), 0) AS open_paused_sec,
+       (SELECT MIN(p.start_ts) FROM stint_pause p WHERE p.stint_id = o.id AND p.end_ts IS NULL) AS open_pause_ts
+FROM team t
+LEFT JOIN stint s ON s.team_id = t.id
+LEFT JOIN stint o ON o.team_id = t.id AND o.end_ts IS NULL
+{where}
+GROUP BY t.id
+"""
+
+_STATS_COLS = ("stints", "closed_stints", "closed_sec", "drivers_used", "open_stints")
+
+
+def _ensure_race_stats(cur):
+    """
+    Materialiseret statistik til spectate (core.stats): én række pr. team og pr. klasse.
+    Triggers på stint/stint_pause/team genberegner det berørte team (slet + indsæt fra
+    team_stats_calc); triggers på team_stats trækker den gamle række fra og lægger den nye
+    til i class_stats. Live-ure (tid siden skift, den åbne stints længde) regnes ved visning
+    ud fra ankrene (core.stats.live_columns). Under en genopbygning er triggerne slået fra
+    ('suspended' i integrity_state), og core.stats.refresh() bygger alt bagefter.
+    """
+    cur.execute(f"CREATE VIEW IF NOT EXISTS team_stats_calc AS {TEAM_STATS_SELECT.format(where='')};")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS team_stats (
+        team_id        INTEGER PRIMARY KEY,
+        class_id       INTEGER NOT NULL,
+        stints         INTEGER NOT NULL,
+        closed_stints  INTEGER NOT NULL,
+        closed_sec     REAL NOT NULL,
+        drivers_used   INTEGER NOT NULL,
+        open_stints    INTEGER NOT NULL,
+        last_change_ts TEXT,
+        open_start_ts  TEXT,
+        open_paused_sec REAL NOT NULL DEFAULT 0,
+        open_pause_ts  TEXT
+    )
+    """)
+    # class_id 0 = teams uden klasse
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS class_stats (
+        class_id      INTEGER PRIMARY KEY,
+        teams         INTEGER NOT NULL,
+        stints        INTEGER NOT NULL,
+        closed_stints INTEGER NOT NULL,
+        closed_sec    REAL NOT NULL,
+        drivers_used  INTEGER NOT NULL,
+        open_stints   INTEGER NOT NULL
+    )
+    """)
+    add = ", ".join(f"{c} = {c} + NEW.{c}" for c in _STATS_COLS)
+    sub = ", ".join(f"{c} = {c} - OLD.{c}" for c in _STATS_COLS)
+    class_add = (
+        f"INSERT INTO class_stats (class_id, teams, {', '.join(_STATS_COLS)}) "
+        f"VALUES (NEW.class_id, 1, {', '.join('NEW.' + c for c in _STATS_COLS)}) "
+        f"ON CONFLICT(class_id) DO UPDATE SET teams = teams + 1, {add};"
+    )
+    class_sub = f"UPDATE class_stats SET teams = teams - 1, {sub} WHERE class_id = OLD.class_id;"
+    # Triggerne holdes korte (skemaet parses ved hver ny forbindelse, se get_conn): WHERE
+    # team_id = NEW.x skubbes ind i viewets GROUP BY. Et underopslag gør ikke, så pausernes
+    # triggers (team findes via stinten) har forespørgslen skrevet ud med t.id = (opslag).
+    recompute = lambda team: (
+        f"DELETE FROM team_stats WHERE team_id = {team}; "
+        f"INSERT INTO team_stats SELECT * FROM team_stats_calc WHERE team_id = {team};"
+    )
+    recompute_pause = lambda t: (
+        f"DELETE FROM team_stats WHERE team_id = (SELECT team_id FROM stint WHERE id = {t}.stint_id); "
+        "INSERT INTO team_stats "
+        + TEAM_STATS_SELECT.format(where=f"WHERE t.id = (SELECT team_id FROM stint WHERE id = {t}.stint_id)").strip()
+        + ";"
+    )
+    guarded = {
+        "trg_stats_stint_ins": f"AFTER INSERT ON stint BEGIN {recompute('NEW.team_id')} END",
+        "trg_stats_stint_upd": (
+            f"AFTER UPDATE OF team_id, driver_id, start_ts, end_ts ON stint BEGIN {recompute('NEW.team_id')} END"
+        ),
+        # Stint flyttet til et andet team (sammenlægning af teams): det gamle team genberegnes også
+        "trg_stats_stint_move": (
+            "AFTER UPDATE OF team_id ON stint WHEN OLD.team_id IS NOT NEW.team_id BEGIN "
+            f"{recompute('OLD.team_id')} END"
+        ),
+        "trg_stats_stint_del": f"AFTER DELETE ON stint BEGIN {recompute('OLD.team_id')} END",
+        "trg_stats_pause_ins": f"AFTER INSERT ON stint_pause BEGIN {recompute_pause('NEW')} END",
+        "trg_stats_pause_upd": f"AFTER UPDATE ON stint_pause BEGIN {recompute_pause('NEW')} END",
+        "trg_stats_pause_del": f"AFTER DELETE ON stint_pause BEGIN {recompute_pause('OLD')} END",
+        "trg_stats_team_ins": f"AFTER INSERT ON team BEGIN {recompute('NEW.id')} END",
+        "trg_stats_team_upd": (
+            "AFTER UPDATE OF class_id ON team BEGIN "
+            "UPDATE team_stats SET class_id = COALESCE(NEW.class_id, 0) WHERE team_id = NEW.id; END"
+        ),
+        "trg_stats_team_del": "AFTER DELETE ON team BEGIN DELETE FROM team_stats WHERE team_id = OLD.id; END",
+    }
+    guard = "WHEN NOT EXISTS (SELECT 1 FROM integrity_state WHERE key = 'suspended')"
+    for name, body in guarded.items():
+        head, tail = body.split(" BEGIN ", 1)
+        head = head.replace(" WHEN ", f" {guard} AND ", 1) if " WHEN " in head else f"{head} {guard}"
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {head} BEGIN {tail};")
+    for name, body in {
+        "trg_class_stats_ins": f"AFTER INSERT ON team_stats BEGIN {class_add} END",
+        "trg_class_stats_upd": f"AFTER UPDATE ON team_stats BEGIN {class_sub} {class_add} END",
+        "trg_class_stats_del": f"AFTER DELETE ON team_stats BEGIN {class_sub} END",
+    }.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body};")
+    # Databaser fra før tabellerne fandtes (eller efter en afbrudt genopbygning)
+    teams, rows = cur.execute("SELECT (SELECT COUNT(*) FROM team), (SELECT COUNT(*) FROM team_stats);").fetchone()
+    if teams != rows:
+        from core.stats import refresh
+        refresh(cur)
+
+
+# Søgeindeks: team-rækker har rowid = team.id, kører-på-hold-rækker har negativt rowid
+_LINK_ROWID = "-({t}.team_id * 10000000 + {t}.driver_id)"
+
+
+def _ensure_search_index(cur):
+    """
+    FTS5-indeks over teamnavne, bilnumre, klasser og kørernavne (pr. hold-tilknytning).
+    Holdes ajour af triggers, så importers, settere og genopbygning altid rammer det.
+    Uden FTS5 i SQLite-bygget springes det over, og repo.search falder tilbage til LIKE.
+    """
+    try:
+        cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_idx USING fts5(
+            label, body,
+            kind UNINDEXED, team_id UNINDEXED, driver_id UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        )
+        """)
+    except sqlite3.OperationalError:
+        return
+
+    team_row = (
+        "INSERT INTO search_idx (rowid, label, body, kind, team_id, driver_id) "
+        "VALUES (NEW.id, NEW.name, "
+        "COALESCE(NEW.name,'') || ' ' || COALESCE(NEW.team_no,'') || ' ' || COALESCE(NEW.car_class,''), "
+        "'team', NEW.id, NULL);"
+    )
+    link_rows = (
+        "INSERT INTO search_idx (rowid, label, body, kind, team_id, driver_id) "
+        f"SELECT {_LINK_ROWID.format(t='td')}, d.name, d.name, 'driver', td.team_id, td.driver_id "
+        "FROM team_driver td JOIN driver d ON d.id = td.driver_id WHERE {where};"
+    )
+    triggers = {
+        "trg_search_team_ins": f"AFTER INSERT ON team BEGIN {team_row} END",
+        "trg_search_team_upd": (
+            "AFTER UPDATE OF name, team_no, car_class ON team BEGIN "
+            f"DELETE FROM search_idx WHERE rowid = OLD.id; {team_row} END"
+        ),
+        "trg_search_team_del": (
+            "AFTER DELETE ON team BEGIN "
+            "DELETE FROM search_idx WHERE rowid = OLD.id "
+            "   OR rowid BETWEEN -(OLD.id * 10000000 + 9999999) AND -(OLD.id * 10000000); END"
+        ),
+        "trg_search_link_ins": (
+            "AFTER INSERT ON team_driver BEGIN "
+            + link_rows.format(where="td.team_id = NEW.team_id AND td.driver_id = NEW.driver_id")
+            + " END"
+        ),
+        "trg_search_link_upd": (
+            "AFTER UPDATE OF team_id, driver_id ON team_driver BEGIN "
+            f"DELETE FROM search_idx WHERE rowid = {_LINK_ROWID.format(t='OLD')}; "
+            + link_rows.format(where="td.team_id = NEW.team_id AND td.driver_id = NEW.driver_id")
+            + " END"
+        ),
+        "trg_search_link_del": (
+            f"AFTER DELETE ON team_driver BEGIN DELETE FROM search_idx WHERE rowid = {_LINK_ROWID.format(t='OLD')}; END"
+        ),
+        "trg_search_driver_upd": (
+            "AFTER UPDATE OF name ON driver BEGIN "
+            f"DELETE FROM search_idx WHERE rowid IN (SELECT {_LINK_ROWID.format(t='td')} "
+            "FROM team_driver td WHERE td.driver_id = NEW.id); "
+            + link_rows.format(where="td.driver_id = NEW.id")
+            + " END"
+        ),
+    }
+    for name, body in triggers.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body};")
+
+    # Første gang (eller efter tab): fyld indekset fra eksisterende data
+    indexed = cur.execute("SELECT COUNT(*) FROM search_idx;").fetchone()[0]
+    expected = cur.execute(
+        "SELECT (SELECT COUNT(*) FROM team) + "
+        "(SELECT COUNT(*) FROM team_driver td JOIN driver d ON d.id = td.driver_id);"
+    ).fetchone()[0]
+    if indexed != expected:
+        rebuild_search_index(cur)
+
+
+def rebuild_search_index(cur):
+    cur.execute("DELETE FROM search_idx;")
+    cur.execute(
+        "INSERT INTO search_idx (rowid, label, body, kind, team_id, driver_id) "
+        "SELECT id, name, COALESCE(name,'') || ' ' || COALESCE(team_no,'') || ' ' || COALESCE(car_class,''), "
+        "'team', id, NULL FROM team;"
+    )
+    cur.execute(
+        "INSERT INTO search_idx (rowid, label, body, kind, team_id, driver_id) "
+        f"SELECT {_LINK_ROWID.format(t='td')}, d.name, d.name, 'driver', td.team_id, td.driver_id "
+        "FROM team_driver td JOIN driver d ON d.id = td.driver_id;"
+    )
+
+
+def ensure_schema_once():
+    """
+    ensure_schema() én gang pr. databasefil pr. proces. Appen kalder den ved hver rerun;
+    uden denne genkørte alle sessioner migreringerne ved en reconnect-storm.
+    """
+    path = os.path.abspath(DB_PATH)
+    if path in _schema_ready and os.path.exists(path):
+        return
+    with _schema_lock:
+        if path in _schema_ready and os.path.exists(path):
+            return
+        ensure_schema()
+        _schema_ready.add(path)
+
+
+def reset_db():
+    """Slet databasefilen (inkl. WAL-sidefiler) og genskab et tomt schema."""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+    ensure_schema()
+    touch_notify()
+    for fn in list(_write_hooks):
+        fn()
+
+
 def db_empty():
     """Returner True hvis der ikke er nogen teams i DB."""
     conn = get_conn()
@@ -66,9 +780,3 @@ def db_empty():
     count = cur.fetchone()[0]
     conn.close()
     return count == 0
-
-from core.db import get_conn
-con = get_conn(); cur = con.cursor()
-print(cur.execute("PRAGMA table_info(team);").fetchall())
-con.close()
-
@@ -0,0 +1,248 @@
+# core/dedupe.py
+"""
+Dublet-kørere: normaliserede navnenøgler, forslag til sammenlægning og bulk-merge.
+
+  - name_key(): mojibake-rettet, accent-foldet, casefold'et og mellemrums-normaliseret
+    navn. Gemmes i driver.name_key (indekseret) og bruges af importen til at genkende
+    "mads kjeldsen " som "Mads Kjeldsen".
+  - suggest_merges(): iracing_id er en stærk nøgle; ens name_key (eller samme ord i
+    anden rækkefølge) er et sikkert match; tastefejl i ét ord findes via et indeks over
+    ordforrådet med ét tegn slettet (blocking), så kun kandidatpar scores og det aldrig
+    bliver O(n²).
+  - apply_merges(): flytter team_driver og stint over på den beholdte kører i én
+    transaktion (driver_merge-hændelser i core.eventlog).
+"""
+import re
+import unicodedata
+from collections import Counter
+from itertools import chain
+
+import pandas as pd
+
+from core.db import read_conn
+
+# Bogstaver som NFKD ikke splitter op i grundbogstav + accent
+_FOLD = str.maketrans({"ø": "o", "æ": "ae", "å": "a", "ß": "ss", "ð": "d", "þ": "th", "ł": "l", "đ": "d"})
+
+# Kortere ord end dette matches kun eksakt (ét slettet bogstav i "bo" er for løst)
+MIN_FUZZY_LEN = 4
+
+DEFAULT_THRESHOLD = 0.88
+
+
+def name_key(name) -> str | None:
+    """Normaliseret sammenligningsnøgle for et kørernavn."""
+    if name is None or (isinstance(name, float) and pd.isna(name)):
+        return None
+    from core.importers import _fix_mojibake  # lazy: importers → repo → dedupe
+
+    text = _fix_mojibake(str(name)).casefold().translate(_FOLD)
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    text = re.sub(r"[^\w]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip() or None
+
+
+def backfill_name_keys(conn) -> int:
+    """Udfyld driver.name_key hvor den mangler (migrering / gamle snapshots)."""
+    rows = conn.execute("SELECT id, name FROM driver WHERE name_key IS NULL AND name IS NOT NULL;").fetchall()
+    conn.executemany("UPDATE driver SET name_key=? WHERE id=?;", [(name_key(n), i) for i, n in rows])
+    return len(rows)
+
+
+# ---------- Forslag ----------
+def _token_key(key: str) -> str:
+    """Ordene sorteret, så "kjeldsen mads" og "mads kjeldsen" giver samme nøgle."""
+    return " ".join(sorted(key.split()))
+
+
+def _deletions(key: str) -> list[str]:
+    """Nøglen med hvert enkelt tegn slettet (én tastefejl: manglende, ekstra eller forkert tegn)."""
+    return [key[:i] + key[i + 1:] for i in range(len(key))]
+
+
+class _UnionFind:
+    """Grupper af kørere; hver gruppe husker sine iracing_id'er (højst ét pr. gruppe)."""
+
+    def __init__(self):
+        self.parent = {}
+        self.irids = {}   # rod -> iracing_id'er i gruppen
+
+    def find(self, x):
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b, irid_a=None, irid_b=None) -> bool:
+        """
+        Læg grupperne sammen, medmindre de bærer forskellige iracing_id'er – så ville en
+        kæde A(111) ~ B(uden) ~ C(222) gøre to personer til én. False hvis afvist.
+        """
+        ra, rb = self.find(a), self.find(b)
+        ids_a = self.irids.setdefault(ra, set()) | ({irid_a} if irid_a else set())
+        ids_b = self.irids.setdefault(rb, set()) | ({irid_b} if irid_b else set())
+        if ids_a and ids_b and ids_a != ids_b:
+            return False
+        self.irids[ra] = ids_a | ids_b
+        if ra != rb:
+            self.parent[rb] = ra
+            self.irids.pop(rb, None)
+        return True
+
+
+def _load_drivers() -> pd.DataFrame:
+    with read_conn() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT d.id, d.name, d.name_key, NULLIF(TRIM(d.iracing_id), '') AS iracing_id,
+                   COALESCE(s.n, 0) AS stints, COALESCE(td.n, 0) AS teams
+            FROM driver d
+            LEFT JOIN (SELECT driver_id, COUNT(*) AS n FROM stint GROUP BY driver_id) s ON s.driver_id = d.id
+            LEFT JOIN (SELECT driver_id, COUNT(*) AS n FROM team_driver GROUP BY driver_id) td ON td.driver_id = d.id;
+            """,
+            conn,
+        )
+
+
+def suggest_merges(threshold: float = DEFAULT_THRESHOLD, drivers: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Foreslå sammenlægninger. Én række pr. kører der bør lægges ind i en anden:
+      keep_id, keep_name, drop_id, drop_name, score, reason
+    Den beholdte kører i hver gruppe er den med iracing_id, flest stints/hold, lavest id.
+    """
+    cols = ["keep_id", "keep_name", "drop_id", "drop_name", "score", "reason"]
+    df = _load_drivers() if drivers is None else drivers
+    if df.empty:
+        return pd.DataFrame(columns=cols)
+    df = df.assign(name_key=[k if isinstance(k, str) else name_key(n) for k, n in zip(df["name_key"], df["name"])])
+
+    ids = df["id"].to_numpy()
+    keys = df["name_key"].tolist()
+    irids = df["iracing_id"].tolist()
+    uf = _UnionFind()
+    evidence = {}  # (a, b) -> (score, reason)
+
+    def compatible(i, j):
+        # To forskellige iracing_id'er er to forskellige personer
+        a, b = irids[i], irids[j]
+        return not (isinstance(a, str) and isinstance(b, str) and a != b)
+
+    def link(i, j, score, reason):
+        a, b = int(ids[i]), int(ids[j])
+        irid = lambda k: irids[k] if isinstance(irids[k], str) else None
+        if not uf.union(a, b, irid(i), irid(j)):
+            return  # grupperne har hver sit iracing_id
+        key = (min(a, b), max(a, b))
+        if score > evidence.get(key, (0, ""))[0]:
+            evidence[key] = (score, reason)
+
+    # 1) Stærk nøgle: iracing_id, 2) eksakt navnenøgle, 3) samme ord i anden rækkefølge
+    token_keys = [_token_key(k) if isinstance(k, str) else None for k in keys]
+    for col, reason in ((irids, "iracing_id"), (keys, "navn-nøgle"), (token_keys, "ombyttet navn")):
+        first = {}
+        for i, v in enumerate(col):
+            if not isinstance(v, str):
+                continue
+            j = first.setdefault(v, i)
+            if j != i and compatible(i, j):
+                link(j, i, 1.0, reason)
+
+    # 4) Tastefejl i ét ord: ordforrådet (langt mindre end rosteret) indekseres med ét
+    #    tegn slettet, så ord med én tastefejl til forskel findes uden at sammenligne par
+    by_key = {}
+    for i, k in enumerate(keys):
+        if isinstance(k, str):
+            by_key.setdefault(k, i)
+    vocab = {t for k in by_key for t in k.split() if len(t) >= MIN_FUZZY_LEN}
+    variants = {t: {t, *_deletions(t)} for t in vocab}
+    counts = Counter(chain.from_iterable(variants.values()))
+    by_variant = {}
+    for t, vs in variants.items():
+        for v in vs:
+            if counts[v] > 1:
+                by_variant.setdefault(v, []).append(t)
+    near = {}  # ord -> {nabo-ord: længde af fælles delsekvens}
+    for v, toks in by_variant.items():
+        for t in toks:
+            for u in toks:
+                if t != u and len(v) > near.setdefault(t, {}).get(u, 0):
+                    near[t][u] = len(v)
+
+    #    Navne der er ens bortset fra ét ord (samme "maske") og hvor ordene er naboer.
+    #    Fælles delsekvens i hele navnet → scoren 2·|fælles| / (|a|+|b|) som difflib's ratio
+    masks = {}
+    for k, i in by_key.items():
+        toks = k.split()
+        for p, t in enumerate(toks):
+            if t in near:
+                masks.setdefault((*toks[:p], "", *toks[p + 1:]), {}).setdefault(t, []).append(i)
+    for group in masks.values():
+        if len(group) < 2:
+            continue
+        for t, rows_t in group.items():
+            for u, common in near[t].items():
+                if u <= t or u not in group:
+                    continue
+                for i in rows_t:
+                    for j in group[u]:
+                        score = round(2 * (len(keys[i]) - len(t) + common) / (len(keys[i]) + len(keys[j])), 3)
+                        if score >= threshold and compatible(i, j):
+                            link(i, j, score, "lighed")
+
+    if not evidence:
+        return pd.DataFrame(columns=cols)
+
+    # Saml grupper og vælg den kører der beholdes
+    pos = {int(x): i for i, x in enumerate(ids)}
+    names, stints, teams = df["name"].tolist(), df["stints"].tolist(), df["teams"].tolist()
+    groups = {}
+    for a, b in evidence:
+        for x in (a, b):
+            groups.setdefault(uf.find(x), set()).add(x)
+    best = {}
+    for (a, b), (score, _) in evidence.items():
+        for x in (a, b):
+            best[x] = max(best.get(x, 0.0), score)
+
+    rows = []
+    for members in groups.values():
+        keep = max(members, key=lambda m: (isinstance(irids[pos[m]], str), stints[pos[m]], teams[pos[m]], -m))
+        for m in sorted(members - {keep}):
+            score, reason = evidence.get((min(keep, m), max(keep, m)), (None, None))
+            if score is None:
+                # Kun indirekte forbundet (via en anden dublet i gruppen)
+                score, reason = best[m], "via gruppe"
+            rows.append((keep, names[pos[keep]], m, names[pos[m]], score, reason))
+    return pd.DataFrame(rows, columns=cols).sort_values(["score", "keep_name"], ascending=[False, True]).reset_index(drop=True)
+
+
+# ---------- Sammenlægning ----------
+def apply_merges(pairs) -> int:
+    """
+    Læg kørere sammen i én transaktion. pairs: [(keep_id, drop_id), ...] eller et
+    DataFrame fra suggest_merges(). Kæder (a→b, b→c) foldes så alt ender hos c's keep.
+    """
+    from core.db import write_conn
+    from core.eventlog import record_many
+
+    if isinstance(pairs, pd.DataFrame):
+        pairs = list(zip(pairs["keep_id"], pairs["drop_id"]))
+    target = {}
+    for keep, drop in pairs:
+        keep, drop = int(keep), int(drop)
+        if keep != drop:
+            target[drop] = keep
+
+    def resolve(x, seen=()):
+        while x in target and x not in seen:
+            seen = (*seen, x)
+            x = target[x]
+        return x
+
+    payloads = [{"keep_id": resolve(k), "drop_id": d} for d, k in target.items() if resolve(k) != d]
+    if not payloads:
+        return 0
+    with write_conn() as conn:
+        record_many(conn, "driver_merge", payloads)
+    return len(payloads)
@@ -0,0 +1,544 @@
+# core/eventlog.py
+"""
+Append-only hændelseslog for løbet (race_event) med projektion og snapshots.
+
+Alle skrivninger til team/driver/team_driver/stint går gennem record(): hændelsen
+anvendes på projektionstabellerne og lægges i loggen i samme transaktion. Dermed kan
+alt revideres og afspilles igen.
+
+  - race_event          hændelser siden seneste snapshot (den "varme" log)
+  - race_event_archive  hændelser der er foldet ind i en snapshot (bevares til revision)
+  - race_snapshot       gzip'et JSON af projektionen op til og med en hændelses-id
+
+rebuild() genskaber projektionen fra seneste snapshot + de efterfølgende hændelser,
+så opstart og genopbygning forbliver hurtige gennem et 24t-løb.
+"""
+import gzip
+import json
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from core import db, stats
+from core.classes import backfill_team_classes, resolve_class
+from core.dedupe import backfill_name_keys, name_key
+
+# Tabeller der udgør projektionen (i indsættelsesrækkefølge)
+PROJECTION_TABLES = ["team", "driver", "team_driver", "stint", "stint_pause"]
+
+# Snapshot + komprimering når den varme log er vokset til så mange hændelser
+SNAPSHOT_EVERY = 500
+
+# Ud over den første (baseline) beholdes kun de nyeste snapshots
+KEEP_SNAPSHOTS = 2
+
+# Write-hooket ser kun efter om loggen er lang ved hver n'te skrivning i processen
+COMPACT_CHECK_EVERY = 50
+_writes_since_check = 0
+
+_TEAM_FIELDS = ("name", "car_class", "team_no", "team_pin")
+_DRIVER_FIELDS = ("name", "iracing_id")
+
+
+def utc_now() -> str:
+    """Tidsstempel i samme format og tidszone som SQLite's datetime('now')."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ---------- Anvendelse af hændelser på projektionen ----------
+# Hver funktion får (cur, ts, payload). Mangler et id i payload (live-skrivning), tildeles
+# det af SQLite og skrives tilbage i payload, så afspilning giver præcis samme rækker.
+
+def _team_class(cur, p) -> tuple[int | None, str | None]:
+    """
+    (class_id, navn) for hændelsens car_class. Første gang slås værdien op i kataloget og
+    class_id skrives tilbage i payload; afspilning bruger det id (så længe klassen findes),
+    så et senere omdøbt eller ændret katalog ikke flytter holdet til en anden klasse.
+    """
+    if p.get("class_id") is not None:
+        row = cur.execute("SELECT id, name FROM car_class WHERE id = ?;", (p["class_id"],)).fetchone()
+        if row:
+            return row
+    class_id, name = resolve_class(cur, p.get("car_class"))
+    p["class_id"] = class_id
+    return class_id, name
+
+
+def _team_assignments(cur, fields, p) -> tuple[list[str], list]:
+    """Kolonner/værdier til team; car_class slås op i kataloget og giver også class_id."""
+    cols, values = [], []
+    for f in fields:
+        if f == "car_class":
+            class_id, name = _team_class(cur, p)
+            cols += ["car_class", "class_id"]
+            values += [name, class_id]
+        else:
+            cols.append(f)
+            values.append(p[f])
+    return cols, values
+
+
+def _apply_team_create(cur, ts, p):
+    class_id, car_class = _team_class(cur, p)
+    cur.execute(
+        "INSERT INTO team (id, name, car_class, class_id, team_no, team_pin) VALUES (?, ?, ?, ?, ?, ?);",
+        (p.get("team_id"), p["name"], car_class, class_id, p.get("team_no"), p.get("team_pin")),
+    )
+    p["team_id"] = cur.lastrowid
+
+
+def _apply_team_set(cur, ts, p):
+    fields = [f for f in _TEAM_FIELDS if f in p]
+    if fields:
+        cols, values = _team_assignments(cur, fields, p)
+        cur.execute(
+            f"UPDATE team SET {', '.join(f'{c}=?' for c in cols)} WHERE id=?;",
+            (*values, p["team_id"]),
+        )
+
+
+def _apply_driver_create(cur, ts, p):
+    cur.execute(
+        "INSERT INTO driver (id, name, iracing_id, name_key) VALUES (?, ?, ?, ?);",
+        (p.get("driver_id"), p["name"], p.get("iracing_id"), name_key(p["name"])),
+    )
+    p["driver_id"] = cur.lastrowid
+
+
+def _apply_driver_set(cur, ts, p):
+    fields = [f for f in _DRIVER_FIELDS if f in p]
+    if fields:
+        values = [p[f] for f in fields]
+        if "name" in p:
+            fields.append("name_key")
+            values.append(name_key(p["name"]))
+        cur.execute(
+            f"UPDATE driver SET {', '.join(f'{f}=?' for f in fields)} WHERE id=?;",
+            (*values, p["driver_id"]),
+        )
+
+
+def _apply_driver_merge(cur, ts, p):
+    _apply_driver_merge_many(cur, ts, [p])
+
+
+def _apply_team_driver_add(cur, ts, p):
+    cur.execute(
+        "INSERT OR IGNORE INTO team_driver (team_id, driver_id, is_active) VALUES (?, ?, ?);",
+        (p["team_id"], p["driver_id"], int(p.get("is_active", 1))),
+    )
+
+
+def _apply_team_driver_remove(cur, ts, p):
+    cur.execute("DELETE FROM team_driver WHERE team_id=? AND driver_id=?;", (p["team_id"], p["driver_id"]))
+
+
+def _apply_team_driver_move(cur, ts, p):
+    # team_id = nyt hold; aktiv-status følger med køreren
+    cur.execute(
+        "INSERT OR IGNORE INTO team_driver (team_id, driver_id, is_active) "
+        "SELECT ?, driver_id, is_active FROM team_driver WHERE team_id=? AND driver_id=?;",
+        (p["team_id"], p["from_team_id"], p["driver_id"]),
+    )
+    cur.execute("DELETE FROM team_driver WHERE team_id=? AND driver_id=?;", (p["from_team_id"], p["driver_id"]))
+
+
+def _apply_driver_active(cur, ts, p):
+    cur.execute(
+        "UPDATE team_driver SET is_active=? WHERE team_id=? AND driver_id=?;",
+        (int(p["is_active"]), p["team_id"], p["driver_id"]),
+    )
+
+
+def _close_pauses(cur, ts, team_ids) -> set:
+    """Afslut igangværende pauser for teamenes aktive stints; returnerer de teams der var frosset."""
+    marks = ",".join("?" for _ in team_ids)
+    frozen = {r[0] for r in cur.execute(
+        f"SELECT s.team_id FROM stint s JOIN stint_pause p ON p.stint_id = s.id AND p.end_ts IS NULL "
+        f"WHERE s.end_ts IS NULL AND s.team_id IN ({marks});",
+        tuple(team_ids),
+    )}
+    if frozen:
+        cur.executemany(
+            "UPDATE stint_pause SET end_ts=? WHERE end_ts IS NULL AND stint_id IN "
+            "(SELECT id FROM stint WHERE team_id=? AND end_ts IS NULL);",
+            [(ts, t) for t in frozen],
+        )
+    return frozen
+
+
+def _apply_stint_start(cur, ts, p):
+    # Slut evt. eksisterende aktiv stint for teamet, start ny (under rødt flag er den nye også frosset)
+    frozen = _close_pauses(cur, ts, [p["team_id"]])
+    cur.execute("UPDATE stint SET end_ts=? WHERE team_id=? AND end_ts IS NULL;", (ts, p["team_id"]))
+    cur.execute(
+        "INSERT INTO stint (id, team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?, NULL);",
+        (p.get("stint_id"), p["team_id"], p["driver_id"], ts),
+    )
+    p["stint_id"] = cur.lastrowid
+    if frozen:
+        cur.execute("INSERT INTO stint_pause (stint_id, start_ts) VALUES (?, ?);", (p["stint_id"], ts))
+
+
+def _apply_stint_close(cur, ts, p):
+    # Reparation (core.integrity): luk én bestemt stint ved end_ts
+    cur.execute("UPDATE stint_pause SET end_ts=MAX(start_ts, ?) WHERE stint_id=? AND end_ts IS NULL;",
+                (p["end_ts"], p["stint_id"]))
+    cur.execute("UPDATE stint SET end_ts=? WHERE id=?;", (p["end_ts"], p["stint_id"]))
+
+
+# Løbsstyring: hver hændelse rammer alle teams med ét mængde-statement
+
+def _apply_race_green(cur, ts, p):
+    # Teams der allerede kører, springes over (også ved afspilning)
+    running = {r[0] for r in cur.execute("SELECT team_id FROM stint WHERE end_ts IS NULL;")}
+    starters = [s for s in p["starters"] if s["team_id"] not in running]
+    if starters:
+        _apply_stint_start_many(cur, ts, starters)
+    p["starters"] = starters
+
+
+def _apply_race_freeze(cur, ts, p):
+    cur.execute(
+        "INSERT INTO stint_pause (stint_id, start_ts) "
+        "SELECT s.id, ? FROM stint s WHERE s.end_ts IS NULL "
+        "AND NOT EXISTS (SELECT 1 FROM stint_pause p WHERE p.stint_id = s.id AND p.end_ts IS NULL);",
+        (ts,),
+    )
+    p["stints"] = cur.rowcount
+
+
+def _apply_race_unfreeze(cur, ts, p):
+    cur.execute("UPDATE stint_pause SET end_ts=? WHERE end_ts IS NULL;", (ts,))
+    p["stints"] = cur.rowcount
+
+
+def _apply_race_finish(cur, ts, p):
+    # Et målflag sat bagud i tid lukker aldrig en stint før den startede
+    cur.execute("UPDATE stint_pause SET end_ts=MAX(start_ts, ?) WHERE end_ts IS NULL;", (ts,))
+    cur.execute("UPDATE stint SET end_ts=MAX(start_ts, ?) WHERE end_ts IS NULL;", (ts,))
+    p["stints"] = cur.rowcount
+
+
+def _apply_noop(cur, ts, p):
+    """Markør-hændelser (fx import) der kun står i loggen."""
+
+
+APPLIERS = {
+    "team_create": _apply_team_create,
+    "team_set": _apply_team_set,
+    "driver_create": _apply_driver_create,
+    "driver_set": _apply_driver_set,
+    "team_driver_add": _apply_team_driver_add,
+    "team_driver_remove": _apply_team_driver_remove,
+    "team_driver_move": _apply_team_driver_move,
+    "driver_active": _apply_driver_active,
+    "driver_merge": _apply_driver_merge,
+    "stint_start": _apply_stint_start,
+    "stint_close": _apply_stint_close,
+    "race_green": _apply_race_green,
+    "race_freeze": _apply_race_freeze,
+    "race_unfreeze": _apply_race_unfreeze,
+    "race_finish": _apply_race_finish,
+    "import": _apply_noop,
+}
+
+
+# Mængde-varianter: samme effekt som APPLIERS, men med executemany pr. ensartet gruppe
+
+def _apply_team_set_many(cur, ts, payloads):
+    groups = {}
+    for p in payloads:
+        groups.setdefault(tuple(f for f in _TEAM_FIELDS if f in p), []).append(p)
+    for fields, group in groups.items():
+        if fields:
+            rows = [_team_assignments(cur, fields, p) for p in group]
+            cur.executemany(
+                f"UPDATE team SET {', '.join(f'{c}=?' for c in rows[0][0])} WHERE id=?;",
+                [(*values, p["team_id"]) for (_, values), p in zip(rows, group)],
+            )
+
+
+def _apply_driver_active_many(cur, ts, payloads):
+    cur.executemany(
+        "UPDATE team_driver SET is_active=? WHERE team_id=? AND driver_id=?;",
+        [(int(p["is_active"]), p["team_id"], p["driver_id"]) for p in payloads],
+    )
+
+
+def _apply_team_driver_add_many(cur, ts, payloads):
+    cur.executemany(
+        "INSERT OR IGNORE INTO team_driver (team_id, driver_id, is_active) VALUES (?, ?, ?);",
+        [(p["team_id"], p["driver_id"], int(p.get("is_active", 1))) for p in payloads],
+    )
+
+
+def _apply_team_driver_remove_many(cur, ts, payloads):
+    cur.executemany(
+        "DELETE FROM team_driver WHERE team_id=? AND driver_id=?;",
+        [(p["team_id"], p["driver_id"]) for p in payloads],
+    )
+
+
+def _apply_stint_start_many(cur, ts, payloads):
+    # Ét skift pr. team i batchen (ellers rækkefølgen betyder noget → ét ad gangen)
+    if len({p["team_id"] for p in payloads}) < len(payloads):
+        for p in payloads:
+            _apply_stint_start(cur, ts, p)
+        return
+    frozen = _close_pauses(cur, ts, [p["team_id"] for p in payloads])
+    cur.executemany("UPDATE stint SET end_ts=? WHERE team_id=? AND end_ts IS NULL;",
+                    [(ts, p["team_id"]) for p in payloads])
+    # Samme id'er som AUTOINCREMENT ville give (sqlite_sequence overlever sletning ved arkivering)
+    next_id = cur.execute(
+        "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name='stint'), 0), "
+        "COALESCE((SELECT MAX(id) FROM stint), 0)) + 1;"
+    ).fetchone()[0]
+    for p in payloads:
+        if p.get("stint_id") is None:
+            p["stint_id"] = next_id
+            next_id += 1
+    cur.executemany(
+        "INSERT INTO stint (id, team_id, driver_id, start_ts, end_ts) VALUES (?, ?, ?, ?, NULL);",
+        [(p["stint_id"], p["team_id"], p["driver_id"], ts) for p in payloads],
+    )
+    if frozen:
+        cur.executemany(
+            "INSERT INTO stint_pause (stint_id, start_ts) VALUES (?, ?);",
+            [(p["stint_id"], ts) for p in payloads if p["team_id"] in frozen],
+        )
+
+
+def _apply_driver_merge_many(cur, ts, payloads):
+    # Hold-tilknytninger og stints flyttes til keep; keep arver iracing_id hvis den mangler
+    rows = [(p["keep_id"], p["drop_id"]) for p in payloads]
+    cur.executemany(
+        "INSERT OR IGNORE INTO team_driver (team_id, driver_id, is_active) "
+        "SELECT team_id, ?, is_active FROM team_driver WHERE driver_id=?;",
+        rows,
+    )
+    cur.executemany("DELETE FROM team_driver WHERE driver_id=?;", [(d,) for _, d in rows])
+    cur.executemany("UPDATE stint SET driver_id=? WHERE driver_id=?;", rows)
+    cur.executemany(
+        "UPDATE driver SET iracing_id = (SELECT iracing_id FROM driver WHERE id=?) "
+        "WHERE id=? AND NULLIF(TRIM(iracing_id), '') IS NULL;",
+        [(d, k) for k, d in rows],
+    )
+    cur.executemany("DELETE FROM driver WHERE id=?;", [(d,) for _, d in rows])
+
+
+BATCH_APPLIERS = {
+    "stint_start": _apply_stint_start_many,
+    "driver_merge": _apply_driver_merge_many,
+    "team_driver_add": _apply_team_driver_add_many,
+    "team_driver_remove": _apply_team_driver_remove_many,
+    "team_set": _apply_team_set_many,
+    "driver_active": _apply_driver_active_many,
+}
+
+
+def record(conn, kind: str, ts: str | None = None, **payload) -> dict:
+    """
+    Anvend og log én hændelse i den åbne transaktion på conn (typisk db.write_conn()).
+    Returnerer payload inkl. evt. tildelte id'er.
+    """
+    ts = ts or utc_now()
+    cur = conn.cursor()
+    APPLIERS[kind](cur, ts, payload)
+    cur.execute(
+        "INSERT INTO race_event (ts, kind, team_id, driver_id, payload) VALUES (?, ?, ?, ?, ?);",
+        (ts, kind, payload.get("team_id"), payload.get("driver_id"), json.dumps(payload)),
+    )
+    return payload
+
+
+def record_many(conn, kind: str, payloads: list[dict], ts: str | None = None) -> list[dict]:
+    """Samme som record() for mange hændelser af samme slags; loggen skrives med executemany."""
+    ts = ts or utc_now()
+    cur = conn.cursor()
+    if kind in BATCH_APPLIERS:
+        BATCH_APPLIERS[kind](cur, ts, payloads)
+    else:
+        apply = APPLIERS[kind]
+        for p in payloads:
+            apply(cur, ts, p)
+    cur.executemany(
+        "INSERT INTO race_event (ts, kind, team_id, driver_id, payload) VALUES (?, ?, ?, ?, ?);",
+        [(ts, kind, p.get("team_id"), p.get("driver_id"), json.dumps(p)) for p in payloads],
+    )
+    return payloads
+
+
+# ---------- Snapshots af projektionen ----------
+def _dump_state(conn) -> bytes:
+    state = {}
+    for table in PROJECTION_TABLES:
+        cur = conn.execute(f"SELECT * FROM {table} ORDER BY rowid;")
+        state[table] = {"cols": [c[0] for c in cur.description], "rows": cur.fetchall()}
+    return gzip.compress(json.dumps(state).encode("utf-8"))
+
+
+def _load_state(conn, blob: bytes | None):
+    """Erstat projektionen med en snapshot (eller tøm den hvis blob er None)."""
+    for table in reversed(PROJECTION_TABLES):
+        conn.execute(f"DELETE FROM {table};")
+    if blob is None:
+        return
+    state = json.loads(gzip.decompress(blob).decode("utf-8"))
+    for table in PROJECTION_TABLES:
+        part = state.get(table)
+        if not part or not part["rows"]:
+            continue
+        cols = ", ".join(part["cols"])
+        marks = ", ".join("?" for _ in part["cols"])
+        conn.executemany(f"INSERT INTO {table} ({cols}) VALUES ({marks});", part["rows"])
+
+
+def _max_event_id(conn) -> int:
+    return conn.execute(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM race_event), 0), "
+        "           COALESCE((SELECT MAX(id) FROM race_event_archive), 0));"
+    ).fetchone()[0]
+
+
+def take_snapshot(conn, baseline: bool = False) -> int:
+    """Gem projektionen som snapshot op til seneste hændelse. Returnerer upto_event_id."""
+    upto = _max_event_id(conn)
+    conn.execute(
+        "INSERT INTO race_snapshot (upto_event_id, created_at, state, is_baseline) VALUES (?, ?, ?, ?);",
+        (upto, utc_now(), _dump_state(conn), int(baseline)),
+    )
+    return upto
+
+
+def compact(conn) -> int:
+    """
+    Fold den varme log ind i en ny snapshot: hændelserne flyttes til race_event_archive,
+    og gamle snapshots (bortset fra baseline) ud over KEEP_SNAPSHOTS slettes.
+    Returnerer antal flyttede hændelser.
+
+    Kalderen skal holde skrivelåsen (BEGIN IMMEDIATE) fra før upto og tilstanden læses,
+    ellers kan en anden replika committe en hændelse der både kommer med i snapshotten
+    og bliver liggende i den varme log – og dermed afspilles to gange.
+    """
+    upto = take_snapshot(conn)
+    conn.execute("INSERT INTO race_event_archive SELECT * FROM race_event WHERE id <= ?;", (upto,))
+    moved = conn.execute("DELETE FROM race_event WHERE id <= ?;", (upto,)).rowcount
+    conn.execute(
+        """
+        DELETE FROM race_snapshot
+        WHERE is_baseline = 0
+          AND id NOT IN (SELECT id FROM race_snapshot WHERE is_baseline = 0 ORDER BY id DESC LIMIT ?);
+        """,
+        (KEEP_SNAPSHOTS,),
+    )
+    return moved
+
+
+def ensure_baseline(conn):
+    """
+    En database med data fra før hændelsesloggen (ingen hændelser, ingen snapshot)
+    får en baseline-snapshot, så rebuild() aldrig taber eksisterende teams og kørere.
+    """
+    has_log = conn.execute(
+        "SELECT EXISTS(SELECT 1 FROM race_snapshot) OR EXISTS(SELECT 1 FROM race_event) "
+        "OR EXISTS(SELECT 1 FROM race_event_archive);"
+    ).fetchone()[0]
+    if has_log:
+        return
+    has_data = any(
+        conn.execute(f"SELECT EXISTS(SELECT 1 FROM {t});").fetchone()[0] for t in PROJECTION_TABLES
+    )
+    if has_data:
+        take_snapshot(conn, baseline=True)
+
+
+def _hot_log_size(conn) -> int:
+    """Antal hændelser i den varme log; id'erne er fortløbende, så to indeksopslag er nok."""
+    return conn.execute(
+        "SELECT COALESCE(MAX(id) - MIN(id) + 1, 0) FROM race_event;"
+    ).fetchone()[0]
+
+
+def _maybe_compact():
+    """
+    Write-hook: komprimér når den varme log er blevet lang. Kigges der kun efter ved hver
+    COMPACT_CHECK_EVERY'te skrivning, så almindelige skrivninger ikke betaler for en ekstra
+    forbindelse. Optælling, snapshot og flytning sker i én BEGIN IMMEDIATE-transaktion.
+    """
+    global _writes_since_check
+    _writes_since_check += 1
+    if _writes_since_check < COMPACT_CHECK_EVERY:
+        return
+    _writes_since_check = 0
+    conn = db.get_conn()
+    try:
+        if _hot_log_size(conn) < SNAPSHOT_EVERY:
+            return
+        conn.execute("BEGIN IMMEDIATE;")
+        if _hot_log_size(conn) >= SNAPSHOT_EVERY:  # en anden replika kan være kommet først
+            compact(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()  # komprimering er en optimering; den må ikke vælte en skrivning
+    finally:
+        conn.close()
+
+
+db.add_write_hook(_maybe_compact)
+
+
+# ---------- Genopbygning og revision ----------
+def rebuild(from_scratch: bool = False) -> dict:
+    """
+    Genopbyg projektionen. Normalt fra seneste snapshot + varm log; med from_scratch
+    fra baseline (eller tom) + alle hændelser inkl. arkivet.
+    """
+    with db.write_conn() as conn:
+        where = "WHERE is_baseline = 1" if from_scratch else ""
+        snap = conn.execute(
+            f"SELECT upto_event_id, state FROM race_snapshot {where} ORDER BY id DESC LIMIT 1;"
+        ).fetchone()
+        upto, blob = snap if snap else (0, None)
+        # Alt bliver berørt: integritetstjekket springer markeringerne over og tjekker alt næste gang
+        conn.execute("INSERT OR REPLACE INTO integrity_state (key, value) VALUES ('suspended', '1');")
+        _load_state(conn, blob)
+
+        cur = conn.cursor()
+        rows = cur.execute(
+            """
+            SELECT ts, kind, payload FROM (
+              SELECT id, ts, kind, payload FROM race_event_archive WHERE id > ?
+              UNION ALL
+              SELECT id, ts, kind, payload FROM race_event WHERE id > ?
+            ) ORDER BY id;
+            """,
+            (upto, upto),
+        ).fetchall()
+        for ts, kind, payload in rows:
+            APPLIERS[kind](cur, ts, json.loads(payload))
+        # Snapshots fra før name_key/class_id fandtes
+        backfill_name_keys(conn)
+        backfill_team_classes(conn)
+        stats.refresh(conn)
+        conn.execute("DELETE FROM integrity_state WHERE key IN ('suspended', 'hwm');")
+    return {"snapshot_upto": upto, "replayed": len(rows)}
+
+
+def event_history(team_id: int | None = None, limit: int = 200) -> pd.DataFrame:
+    """Seneste hændelser (nyeste først), evt. kun for ét team."""
+    where = "WHERE team_id = ?" if team_id is not None else ""
+    params = (team_id, team_id, limit) if team_id is not None else (limit,)
+    sql = f"""
+    SELECT id, ts, kind, team_id, driver_id, payload FROM (
+      SELECT * FROM race_event_archive {where}
+      UNION ALL
+      SELECT * FROM race_event {where}
+    ) ORDER BY id DESC LIMIT ?;
+    """
+    # Fra disken: loggen er ikke med i in-memory spejlet (core.mirror)
+    conn = db.get_conn()
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
@@ -0,0 +1,335 @@
+# core/feed.py
+"""
+Automatisk kørerskift fra et live session-feed.
+
+Feedet er JSON-beskeder, én pr. linje (JSONL-fil der vokser, eller UDP-datagrammer):
+    {"t": 1718380800.25, "car": "12", "driver": 345678}
+t = sessionstid (epoch sek., valgfri – ellers modtagetid), car = bilnummer (→ team.team_no),
+driver = iRacing-id (→ driver.iracing_id).
+
+Feedet sender samme tilstand mange gange i sekundet, så hukommelsen holdes begrænset ved
+kun at gemme seneste tilstand pr. bil (ikke en kø af beskeder). Et skift accepteres først
+når den nye kører har været rapporteret i DEBOUNCE_SEC uden afbrydelse (udfald og flimmer
+ved pit-stop ignoreres). Accepterede skift skrives samlet hvert FLUSH_SEC som stint_start-
+hændelser i én transaktion – samme vej som "Start ny stint" i UI'et.
+
+    python -m core.feed feed.jsonl        # følg en fil
+    python -m core.feed udp://0.0.0.0:9999
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+from core import db
+from core.coherence import current_version
+from core.eventlog import record_many
+
+DEBOUNCE_SEC = float(os.environ.get("RACE_FEED_DEBOUNCE", "3"))
+FLUSH_SEC = 0.5
+LEAD_RETRY_SEC = 5.0     # hvor ofte en replika uden feed-rollen ser om den er blevet ledig
+LAG_SAMPLES = 2048       # seneste målinger bag lag-percentilerne
+
+
+def _pct(values, p) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def _utc(epoch: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch))
+
+
+def _norm_no(value) -> str | None:
+    s = str(value).strip().lstrip("#")
+    if not s:
+        return None
+    try:
+        return str(int(float(s)))
+    except ValueError:
+        return s
+
+
+def _norm_irid(value) -> str | None:
+    s = str(value).strip()
+    return s.removesuffix(".0") or None
+
+
+# ---------- Ingestor ----------
+class FeedIngestor:
+    """Detektér kørerskift i feedet og skriv dem i batches."""
+
+    def __init__(self, debounce: float = DEBOUNCE_SEC, flush_every: float = FLUSH_SEC):
+        self.debounce = debounce
+        self.flush_every = flush_every
+        self._version = None
+        self._team_by_no = {}       # bilnummer → team_id
+        self._driver_by_irid = {}   # iRacing-id → driver_id
+        self._links = set()         # (team_id, driver_id)
+        self._current = {}          # team_id → driver_id i bilen (DB)
+        self._candidate = {}        # team_id → (driver_id, set siden t, senest set t)
+        self._pending = {}          # team_id → (driver_id, t for skiftet, modtaget)
+        self._last_flush = time.monotonic()
+        self._ingest_lag = deque(maxlen=LAG_SAMPLES)
+        self._apply_lag = deque(maxlen=LAG_SAMPLES)
+        self._started = time.monotonic()
+        self.counters = dict.fromkeys(
+            ["messages", "parse_errors", "unknown_car", "unknown_driver", "changes", "batches", "flaps"], 0)
+
+    # ----- opslag -----
+    def _refresh(self, force: bool = False):
+        """Genindlæs bil/kører-opslag når DB'en er ændret (fx nye numre eller manuelle skift)."""
+        version = current_version()
+        if not force and version == self._version:
+            return
+        with db.read_conn() as conn:
+            self._team_by_no = {
+                _norm_no(no): tid for tid, no in conn.execute("SELECT id, team_no FROM team WHERE team_no IS NOT NULL;")
+            }
+            self._driver_by_irid = {
+                _norm_irid(irid): did
+                for did, irid in conn.execute("SELECT id, iracing_id FROM driver WHERE NULLIF(TRIM(iracing_id), '') IS NOT NULL;")
+            }
+            self._links = set(conn.execute("SELECT team_id, driver_id FROM team_driver;").fetchall())
+            self._current = dict(conn.execute("SELECT team_id, driver_id FROM stint WHERE end_ts IS NULL;").fetchall())
+        self._version = version
+
+    # ----- indlæsning -----
+    def feed_lines(self, lines, received: float | None = None):
+        """Behandl en portion rå linjer (bytes/str) fra kilden."""
+        received = time.time() if received is None else received
+        self._refresh()
+        counters = self.counters
+        t = None
+        for line in lines:
+            if not line or not line.strip():
+                continue
+            counters["messages"] += 1
+            try:
+                msg = json.loads(line)
+                car, irid = msg["car"], msg["driver"]
+                t = float(msg.get("t") or received)
+            except (ValueError, KeyError, TypeError):
+                counters["parse_errors"] += 1
+                continue
+            self._observe(car, irid, t, received)
+        if t is not None:
+            # Én måling pr. portion (seneste besked) holder prisen nede ved tusindvis pr. sekund
+            self._ingest_lag.append(max(0.0, received - t))
+        if time.monotonic() - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def _observe(self, car, irid, t: float, received: float):
+        team_id = self._team_by_no.get(_norm_no(car))
+        if team_id is None:
+            self.counters["unknown_car"] += 1
+            return
+        driver_id = self._driver_by_irid.get(_norm_irid(irid))
+        if driver_id is None:
+            self.counters["unknown_driver"] += 1
+            return
+
+        known = self._pending.get(team_id, (self._current.get(team_id),))[0]
+        cand = self._candidate.get(team_id)
+        if driver_id == known:
+            if cand is not None:
+                # Flimmer: den nye kører forsvandt før debounce
+                self.counters["flaps"] += 1
+                del self._candidate[team_id]
+            return
+        if cand is None or cand[0] != driver_id:
+            self._candidate[team_id] = (driver_id, t, t)
+            return
+        self._candidate[team_id] = cand = (driver_id, cand[1], max(cand[2], t))
+        if cand[2] - cand[1] >= self.debounce:
+            del self._candidate[team_id]
+            if team_id in self._pending:
+                # To skift for samme bil før næste flush (fx ved afspilning): skriv det første nu
+                self.flush()
+            self._pending[team_id] = (driver_id, cand[1], received)
+
+    # ----- skrivning -----
+    def flush(self) -> int:
+        """Skriv ventende skift som stint_start i én transaktion. Returnerer antal skift."""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return 0
+        pending = self._pending
+        by_ts = {}
+        links = []
+        for team_id, (driver_id, t, _) in pending.items():
+            by_ts.setdefault(_utc(t), []).append({"team_id": team_id, "driver_id": driver_id})
+            if (team_id, driver_id) not in self._links:
+                links.append({"team_id": team_id, "driver_id": driver_id, "is_active": 1})
+        with db.write_conn() as conn:
+            if links:
+                record_many(conn, "team_driver_add", links)
+            for ts, payloads in sorted(by_ts.items()):
+                record_many(conn, "stint_start", payloads, ts=ts)
+        # Først efter commit: fejler skrivningen, forsøges de samme skift igen ved næste flush
+        self._pending = {}
+        done = time.time()
+        for team_id, (driver_id, _, received) in pending.items():
+            self._current[team_id] = driver_id
+            self._apply_lag.append(done - received)
+        self._links.update((p["team_id"], p["driver_id"]) for p in links)
+        self.counters["changes"] += len(pending)
+        self.counters["batches"] += 1
+        return len(pending)
+
+    def metrics(self) -> dict:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        ingest, apply = list(self._ingest_lag), list(self._apply_lag)
+        return {
+            **self.counters,
+            "msgs_per_sec": round(self.counters["messages"] / elapsed, 1),
+            "cars_tracked": len(self._candidate) + len(self._pending),
+            "ingest_lag_p50_ms": round(_pct(ingest, 50) * 1000, 1),
+            "ingest_lag_p95_ms": round(_pct(ingest, 95) * 1000, 1),
+            "apply_lag_p95_ms": round(_pct(apply, 95) * 1000, 1),
+            "apply_lag_max_ms": round(max(apply, default=0.0) * 1000, 1),
+        }
+
+
+# ---------- Kilder ----------
+def jsonl_source(path: str, stop: threading.Event, follow: bool = True, poll: float = 0.05, chunk: int = 4096):
+    """Følg en JSONL-fil (som tail -f); giver lister af linjer, tomme lister når der intet er."""
+    fh = None
+    try:
+        while not stop.is_set():
+            if fh is None:
+                if not os.path.exists(path):
+                    stop.wait(poll)
+                    continue
+                fh = open(path, "rb")
+                if follow:
+                    fh.seek(0, os.SEEK_END)
+            lines = fh.readlines(chunk * 64)
+            if lines:
+                # En halv linje i slutningen gemmes til næste gang
+                if not lines[-1].endswith(b"\n"):
+                    fh.seek(fh.tell() - len(lines.pop()))
+                yield lines
+                continue
+            if not follow:
+                return
+            # Filen er roteret/trunkeret → begynd forfra
+            if os.path.exists(path) and os.path.getsize(path) < fh.tell():
+                fh.close()
+                fh = open(path, "rb")
+            yield []
+            stop.wait(poll)
+    finally:
+        if fh is not None:
+            fh.close()
+
+
+def udp_source(host: str, port: int, stop: threading.Event, max_batch: int = 2048):
+    """Modtag UDP-datagrammer (én eller flere JSON-linjer hver); giver lister af linjer."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+    sock.bind((host, port))
+    sock.settimeout(FLUSH_SEC / 2)
+    try:
+        while not stop.is_set():
+            batch = []
+            try:
+                data = sock.recv(65535)
+                batch.extend(data.splitlines())
+                sock.setblocking(False)
+                while len(batch) < max_batch:
+                    batch.extend(sock.recv(65535).splitlines())
+            except (socket.timeout, BlockingIOError):
+                pass
+            finally:
+                sock.settimeout(FLUSH_SEC / 2)
+            yield batch
+    finally:
+        sock.close()
+
+
+def open_source(spec: str, stop: threading.Event):
+    """'udp://host:port' eller en filsti."""
+    if spec.startswith("udp://"):
+        host, _, port = spec[len("udp://"):].rpartition(":")
+        return udp_source(host or "0.0.0.0", int(port), stop)
+    return jsonl_source(spec, stop)
+
+
+# ---------- Baggrundstråd ----------
+class FeedRunner:
+    """
+    Læser kilden i en baggrundstråd og fodrer en FeedIngestor. Kun én replika ad gangen læser
+    feedet (db.lead("feed")) – ellers ville hver replika skrive de samme skift, og UDP-porten
+    kan kun bindes én gang. De andre venter og overtager hvis lederen stopper.
+    """
+
+    def __init__(self, spec: str, ingestor: FeedIngestor | None = None):
+        self.spec = spec
+        self.ingestor = ingestor or FeedIngestor()
+        self.leading = False
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="race-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self.leading:
+            self.ingestor.flush()
+            db.resign("feed")
+            self.leading = False
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.leading:
+                self.leading = db.lead("feed")
+                if not self.leading:
+                    self._stop.wait(LEAD_RETRY_SEC)
+                    continue
+            try:
+                for lines in open_source(self.spec, self._stop):
+                    self.ingestor.feed_lines(lines)
+            except Exception as e:  # feedet må aldrig vælte serveren
+                self.last_error = str(e)
+                self._stop.wait(1.0)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def start_from_env() -> FeedRunner | None:
+    """Start feed-ingest én gang pr. proces hvis RACE_FEED er sat (filsti eller udp://host:port)."""
+    global _runner
+    spec = os.environ.get("RACE_FEED", "").strip()
+    if not spec:
+        return None
+    with _runner_lock:
+        if _runner is None:
+            _runner = FeedRunner(spec).start()
+        return _runner
+
+
+def get_runner() -> FeedRunner | None:
+    return _runner
+
+
+if __name__ == "__main__":
+    db.ensure_schema()
+    runner = FeedRunner(sys.argv[1]).start()
+    try:
+        while True:
+            time.sleep(5)
+            print(runner.ingestor.metrics(), runner.last_error or "", flush=True)
+    except KeyboardInterrupt:
+        runner.stop()
@@ -1,27 +1,52 @@
 # core/importers.py
 from __future__ import annotations
 
+import hashlib
 import io
+import json
+import multiprocessing
+import os
+import threading
+import time
 import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Iterable, Optional
 
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from core.db import get_conn
-from core.repo import normalize_class
+from core import db
+from core.db import write_conn
+from core.eventlog import record
+from core.repo import normalize_class, roster_bulk
 
 __all__ = [
     "guess_column",
+    "guess_tab",
     "import_wide_csv",
     "import_csv_to_db",
     "fetch_public_sheet_as_df",
+    "fetch_sheets",
+    "import_tabs",
+    "read_batch_sources",
+    "stage_batch",
+    "import_staging",
     "_fix_mojibake",
     "fix_mojibake",
 ]
 
 # -------------- Små hjælpere --------------
 
+# Kolonne-heuristikker (admin-UI'ets standardvalg og CLI'ens automatiske mapping)
+CANDIDATE_TEAM    = ["team", "team name", "team_name", "hold", "holdnavn"]
+CANDIDATE_CLASS   = ["class", "car_class", "klasse", "bilklasse", "car category"]
+CANDIDATE_DRIVER  = ["driver", "driver name", "driver_name", "kører", "koerer"]
+CANDIDATE_TEAM_NO = ["car no", "car no.", "number", "start no", "start nr", "team no", "team nr"]
+
 def guess_column(cols: Iterable[str], candidates: Iterable[str]) -> Optional[str]:
     """Find første kolonnenavn i 'cols' der (løst) matcher en af 'candidates'."""
     cl = [c.lower() for c in cols]
@@ -33,6 +58,25 @@ def guess_column(cols: Iterable[str], candidates: Iterable[str]) -> Optional[str
     return None
 
 
+def guess_tab(df: pd.DataFrame, mode: str = "wide") -> dict:
+    """
+    Gæt kolonne-mappingen for et ark og returnér en fane til import_tabs():
+    team = første team-agtige kolonne (ellers 1.), klasse (ellers 2.), valgfrit nummer og
+    driver-kolonnerne (wide: alle driver-agtige, ellers resten; long: den første).
+    """
+    cols = df.columns.tolist()
+    col_team = guess_column(cols, CANDIDATE_TEAM) or cols[0]
+    col_class = guess_column(cols, CANDIDATE_CLASS) or cols[1]
+    col_team_no = guess_column(cols, CANDIDATE_TEAM_NO)
+    driver_cols = [c for c in cols if any(k in c.lower() for k in ["driver", "kører", "koerer"])] or cols[2:]
+    if mode == "wide":
+        return dict(df=df, mode="wide", col_team=col_team, col_class=col_class,
+                    driver_cols=driver_cols, col_team_no=col_team_no)
+    col_driver = guess_column(cols, CANDIDATE_DRIVER) or driver_cols[0]
+    return dict(df=df, mode="long", col_team=col_team, col_driver=col_driver,
+                col_class=col_class, col_irid=None, col_team_no=col_team_no)
+
+
 def _fix_mojibake(text: str) -> str:
     """
     Ret klassisk UTF-8→latin1 mojibake for nordiske tegn (æøå m.fl.).
@@ -85,51 +129,35 @@ def _apply_fix_to_cols(df: pd.DataFrame, cols: Iterable[str]) -> pd.DataFrame:
 
 
 # -------------- Insert-hjælpere --------------
+# Alle ændringer logges som hændelser (core.eventlog); hele importen er én transaktion.
+# Kørere og hold-tilknytninger samles og skrives til sidst med repo.roster_bulk.
 
-def _get_or_create_team(conn, name: str, car_class: str, team_no: Optional[int]):
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM team WHERE name=?;", (name,))
-    row = cur.fetchone()
-    if row:
-        team_id = row[0]
-        if team_no is not None:
-            cur.execute("UPDATE team SET team_no=? WHERE id=?;", (team_no, team_id))
-        if car_class:
-            cur.execute("UPDATE team SET car_class=? WHERE id=?;", (car_class, team_id))
-        conn.commit()
-        return team_id
-
-    cur.execute(
-        "INSERT INTO team (name, car_class, team_no) VALUES (?, ?, ?);",
-        (name, car_class, team_no),
-    )
-    conn.commit()
-    return cur.lastrowid
+@contextmanager
+def _tx(conn=None):
+    """Brug kalderens åbne transaktion (flere faner i én import) eller åbn en ny."""
+    if conn is not None:
+        yield conn
+    else:
+        with write_conn() as new_conn:
+            yield new_conn
 
 
-def _get_or_create_driver(conn, name: str):
+def _get_or_create_team(conn, name: str, car_class: str, team_no: Optional[int]):
     cur = conn.cursor()
-    cur.execute("SELECT id FROM driver WHERE name=?;", (name,))
+    cur.execute("SELECT id, car_class, team_no FROM team WHERE name=?;", (name,))
     row = cur.fetchone()
     if row:
-        return row[0]
-    cur.execute("INSERT INTO driver (name) VALUES (?);", (name,))
-    conn.commit()
-    return cur.lastrowid
-
+        team_id, old_class, old_no = row
+        changes = {}
+        if team_no is not None and team_no != old_no:
+            changes["team_no"] = team_no
+        if car_class and car_class != old_class:
+            changes["car_class"] = car_class
+        if changes:
+            record(conn, "team_set", team_id=team_id, **changes)
+        return team_id
 
-def _ensure_team_driver(conn, team_id: int, driver_id: int):
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT 1 FROM team_driver WHERE team_id=? AND driver_id=?;",
-        (team_id, driver_id),
-    )
-    if not cur.fetchone():
-        cur.execute(
-            "INSERT INTO team_driver (team_id, driver_id, is_active) VALUES (?, ?, 1);",
-            (team_id, driver_id),
-        )
-        conn.commit()
+    return record(conn, "team_create", name=name, car_class=car_class, team_no=team_no)["team_id"]
 
 
 # -------------- Public importers --------------
@@ -141,10 +169,12 @@ def import_wide_csv(
     col_class: str,
     driver_cols: Iterable[str],
     col_team_no: Optional[str] = None,
+    conn=None,
 ) -> None:
     """
     Wide-format: én række pr. team med flere 'Driver name N' kolonner.
     col_team_no er valgfri; angives den, opdateres/indsættes team_no.
+    Med conn køres importen i kalderens transaktion.
     """
     cols = df.columns.tolist()
     assert col_team in cols and col_class in cols, "Missing team/class columns"
@@ -155,7 +185,9 @@ def import_wide_csv(
         text_cols.add(col_team_no)
     _apply_fix_to_cols(df, text_cols)
 
-    with get_conn() as conn:
+    with _tx(conn) as conn:
+        record(conn, "import", source="wide_csv", rows=len(df))
+        roster_ops: list[dict] = []
         for _, row in df.iterrows():
             team_name = str(row[col_team]).strip()
             if not team_name:
@@ -184,8 +216,9 @@ def import_wide_csv(
                 if not name:
                     continue
 
-                driver_id = _get_or_create_driver(conn, name)
-                _ensure_team_driver(conn, team_id, driver_id)
+                roster_ops.append({"op": "add", "team_id": team_id, "name": name})
+
+        roster_bulk(conn, roster_ops)
 
 
 def import_csv_to_db(
@@ -194,11 +227,13 @@ def import_csv_to_db(
     col_team: str,
     col_driver: str,
     col_class: str,
-    col_irid: Optional[str] = None,     # reserveret til fremtidig brug
+    col_irid: Optional[str] = None,     # valgfri kolonne med iRacing-id (genkender kørere)
     col_team_no: Optional[str] = None,  # valgfri kolonne for team nummer
+    conn=None,
 ) -> None:
     """
     Long-format: én række pr. (team, driver)-par.
+    Med conn køres importen i kalderens transaktion.
     """
     cols = df.columns.tolist()
     assert col_team in cols and col_driver in cols and col_class in cols, "Missing columns"
@@ -208,8 +243,12 @@ def import_csv_to_db(
     if col_team_no:
         text_cols.add(col_team_no)
     _apply_fix_to_cols(df, text_cols)
+    if col_irid and col_irid not in cols:
+        col_irid = None
 
-    with get_conn() as conn:
+    with _tx(conn) as conn:
+        record(conn, "import", source="long_csv", rows=len(df))
+        roster_ops: list[dict] = []
         for _, row in df.iterrows():
             team_name = str(row[col_team]).strip()
             driver_name = str(row[col_driver]).strip()
@@ -227,29 +266,405 @@ def import_csv_to_db(
                 except Exception:
                     team_no = None
 
+            irid = None
+            if col_irid:
+                v = row[col_irid]
+                irid = str(v).strip().removesuffix(".0") if pd.notna(v) and str(v).strip() else None
+
             team_id = _get_or_create_team(conn, team_name, car_class, team_no)
-            driver_id = _get_or_create_driver(conn, driver_name)
-            _ensure_team_driver(conn, team_id, driver_id)
+            roster_ops.append({"op": "add", "team_id": team_id, "name": driver_name, "iracing_id": irid})
 
+        roster_bulk(conn, roster_ops)
 
-# -------------- Google Sheets fetcher --------------
 
-def fetch_public_sheet_as_df(sheet_id: str, gid: str) -> pd.DataFrame:
+def import_tabs(tabs: list[dict]) -> int:
     """
-    Henter et offentligt (viewer) Google Sheet-faneblad som CSV og returnerer et DataFrame.
-    Vi dekoder altid som UTF-8 (errors='replace') og kører derefter en mojibake-rettelse
-    på alle object-kolonner.
+    Importér flere faner/filer i én transaktion (alt eller intet). Hver fane er
+    {"df": DataFrame, "mode": "wide" | "long", ...kolonne-mapping som til import_wide_csv /
+    import_csv_to_db}. Returnerer antal importerede faner.
     """
-    url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
+    with write_conn() as conn:
+        for tab in tabs:
+            kwargs = {k: v for k, v in tab.items() if k not in ("df", "mode")}
+            if tab.get("mode", "wide") == "wide":
+                import_wide_csv(tab["df"], conn=conn, **kwargs)
+            else:
+                import_csv_to_db(tab["df"], conn=conn, **kwargs)
+    return len(tabs)
+
+
+# -------------- Batch-import (mange filer / zip) --------------
+# Til afdelinger i et mesterskab kommer der én CSV pr. team eller klasse, ofte dusinvis.
+# Parsing, kolonnegæt, mojibake-rettelse og validering er ren CPU og kører i en
+# proces-pulje (én fil pr. opgave, uden DB); resultatet er én samlet staging-frame i langt
+# format (én række pr. team/kører) med fejl pr. fil. Først import_staging() skriver – i én
+# transaktion. Klasse-normaliseringen kræver katalogets regler og sker derfor i hovedprocessen.
+
+IMPORT_WORKERS = int(os.environ.get("RACE_IMPORT_WORKERS", "0"))  # 0 = én pr. CPU
+MAX_FILE_ERRORS = 20   # fejl pr. fil der gemmes i rapporten (resten tælles)
+POOL_MIN_BYTES = 512 * 1024   # mindre batches parses direkte (puljen tager ~0,5 sek. at starte)
+
+STAGING_COLUMNS = ["team", "car_class", "team_no", "driver", "iracing_id", "file", "team_key", "driver_key"]
+
 
+def read_batch_sources(paths: Iterable[str]) -> list[tuple[str, bytes]]:
+    """Læs filer fra disk til (navn, indhold); zip-filer pakkes ud til deres CSV'er."""
+    out = []
+    for path in paths:
+        with open(path, "rb") as fh:
+            out.append((os.path.basename(path), fh.read()))
+    return _expand_zips(out)
+
+
+def _expand_zips(sources: Iterable[tuple[str, bytes]]) -> list[tuple[str, bytes]]:
+    out = []
+    for name, content in sources:
+        if not name.lower().endswith(".zip"):
+            out.append((name, content))
+            continue
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            for info in sorted(zf.infolist(), key=lambda i: i.filename):
+                base = os.path.basename(info.filename)
+                if info.is_dir() or base.startswith(".") or not base.lower().endswith(".csv"):
+                    continue  # mapper, __MACOSX/._fil m.m.
+                out.append((f"{name}/{info.filename}", zf.read(info)))
+    return out
+
+
+def _fix_unique(col: pd.Series) -> pd.Series:
+    """Mojibake-fix én gang pr. forskellig værdi (navne går igen på tværs af rækker)."""
+    values = col.dropna().unique()
+    return col.map(dict(zip(values, (_fix_mojibake(v) for v in values))))
+
+
+def _clean_text(col: pd.Series) -> pd.Series:
+    return _fix_unique(col.astype("string").str.strip()).replace("", pd.NA)
+
+
+def _parse_entry_file(name: str, content: bytes, mode: str, columns: dict) -> dict:
+    """
+    Én fil → staging-rækker + fejlrapport. Kører i en arbejdsproces: ingen DB, kun
+    pandas. columns overstyrer gættede kolonner (col_team, col_class, col_team_no,
+    driver_cols / col_driver, col_irid).
+    """
+    from core.dedupe import name_key  # lazy: dedupe → importers
+
+    t0 = time.perf_counter()
+    report = {"file": name, "rows": 0, "staged": 0, "ms": 0.0, "errors": [], "error_count": 0}
+
+    def error(msg: str):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_FILE_ERRORS:
+            report["errors"].append(msg)
+
+    empty = pd.DataFrame(columns=STAGING_COLUMNS)
+    try:
+        df = pd.read_csv(io.StringIO(content.decode("utf-8-sig", errors="replace")), dtype=str)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeError) as e:
+        error(f"kan ikke læses: {e}")
+        return {**report, "ms": round((time.perf_counter() - t0) * 1000, 1), "staging": empty}
+    report["rows"] = len(df)
+    if len(df.columns) < 2:
+        error("mindst to kolonner (team og klasse) er påkrævet")
+        return {**report, "ms": round((time.perf_counter() - t0) * 1000, 1), "staging": empty}
+
+    tab = {**guess_tab(df, mode), **{k: v for k, v in columns.items() if v}}
+    driver_cols = tab["driver_cols"] if mode == "wide" else [tab["col_driver"]]
+    missing = [c for c in (tab["col_team"], tab["col_class"], tab.get("col_team_no"), tab.get("col_irid"), *driver_cols)
+               if c and c not in df.columns]
+    if missing:
+        error(f"kolonner findes ikke: {', '.join(missing)}")
+        return {**report, "ms": round((time.perf_counter() - t0) * 1000, 1), "staging": empty}
+
+    base = pd.DataFrame({
+        "team": _clean_text(df[tab["col_team"]]),
+        "car_class": _clean_text(df[tab["col_class"]]).fillna(""),
+        "row": df.index + 2,  # linjenummer i filen (header = 1)
+    })
+    if tab.get("col_team_no"):
+        raw_no = df[tab["col_team_no"]].astype("string").str.strip()
+        team_no = pd.to_numeric(raw_no, errors="coerce")
+        for row in base["row"][raw_no.notna() & (raw_no != "") & (team_no.isna() | (team_no % 1 != 0))]:
+            error(f"linje {row}: ugyldigt team nummer {raw_no[row - 2]!r}")
+        base["team_no"] = team_no.where(team_no % 1 == 0).astype("Int64")
+    else:
+        base["team_no"] = pd.array([pd.NA] * len(df), dtype="Int64")
+    for row in base["row"][base["team"].isna()]:
+        error(f"linje {row}: tomt teamnavn")
+    base = base[base["team"].notna()]
+
+    # Langt format: én række pr. driver-kolonne og team; teams uden kørere får én række uden kører
+    parts = [base.assign(driver=_clean_text(df.loc[base.index, c])) for c in driver_cols]
+    long = pd.concat(parts, ignore_index=True) if parts else base.assign(driver=pd.NA)
+    if mode != "wide":
+        for row in long["row"][long["driver"].isna()]:
+            error(f"linje {row}: tom kørerkolonne")
+    has_driver = long["driver"].notna()
+    teams_with_driver = set(long.loc[has_driver, "team"])
+    long = pd.concat([long[has_driver], long[~has_driver & ~long["team"].isin(teams_with_driver)]
+                      .drop_duplicates("team")], ignore_index=True)
+
+    irid_col = tab.get("col_irid") if mode != "wide" else None
+    long["iracing_id"] = (
+        df.loc[long["row"] - 2, irid_col].astype("string").str.strip().str.removesuffix(".0")
+        .replace("", pd.NA).to_numpy() if irid_col in df.columns else pd.NA
+    )
+    long["file"] = name
+    long["team_key"] = long["team"].map(name_key)
+    long["driver_key"] = long["driver"].map(name_key, na_action="ignore")
+    staging = long[STAGING_COLUMNS].reset_index(drop=True)
+    report["staged"] = len(staging)
+    report["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return {**report, "staging": staging}
+
+
+def _pool_context():
+    """
+    Arbejdsprocesser startes fra en forkserver med dette modul forudindlæst: billigt som
+    fork, men uden at arve Streamlit-serverens tråde og låse (fork fra en proces med tråde
+    kan hænge). Hvor forkserver ikke findes (Windows, macOS-standard), bruges spawn.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _worker_count(workers: Optional[int], sources: list[tuple[str, bytes]]) -> int:
+    if workers is None:
+        if sum(len(content) for _, content in sources) < POOL_MIN_BYTES:
+            return 1
+        workers = IMPORT_WORKERS or os.cpu_count() or 1
+    return max(1, min(int(workers), len(sources)))
+
+
+def stage_batch(
+    sources: Iterable[tuple[str, bytes]],
+    mode: str = "wide",
+    *,
+    columns: Optional[dict] = None,
+    workers: Optional[int] = None,
+) -> dict:
+    """
+    Parse og valider mange filer (sources = [(navn, bytes)], zip pakkes ud) parallelt og
+    saml dem til én staging-frame uden dubletter (samme team + kører på tværs af filer).
+    Returnerer {"staging": DataFrame (STAGING_COLUMNS), "files": [rapport pr. fil],
+    "conflicts": [...], "duplicates": n, "workers": n, "ms": ms}. Intet skrives til DB.
+    Med én arbejder, én fil eller under POOL_MIN_BYTES parses i den kaldende proces.
+    """
+    t0 = time.perf_counter()
+    sources = _expand_zips(sources)
+    columns = columns or {}
+    n = _worker_count(workers, sources)
+    if n <= 1:
+        results = [_parse_entry_file(name, content, mode, columns) for name, content in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=n, mp_context=_pool_context()) as pool:
+            futures = [pool.submit(_parse_entry_file, name, content, mode, columns) for name, content in sources]
+            results = [f.result() for f in futures]
+
+    frames = [r.pop("staging") for r in results]
+    merged = pd.concat([f for f in frames if len(f)], ignore_index=True) if any(len(f) for f in frames) \
+        else pd.DataFrame(columns=STAGING_COLUMNS)
+    merged["car_class"] = merged["car_class"].map(
+        {c: normalize_class(c) for c in merged["car_class"].unique()}
+    )
+
+    # Samme team i flere filer: første fils klasse/nummer vinder; uenighed rapporteres
+    conflicts = []
+    for col in ("car_class", "team_no"):
+        seen = merged.dropna(subset=[col]).groupby("team_key")[col].nunique()
+        for key in seen[seen > 1].index:
+            rows = merged[(merged["team_key"] == key) & merged[col].notna()].drop_duplicates(col)
+            conflicts.append({
+                "team": rows["team"].iloc[0], "field": col,
+                "values": [f"{v} ({f})" for v, f in zip(rows[col], rows["file"])],
+            })
+    first = merged.groupby("team_key", sort=False).agg(
+        team=("team", "first"), car_class=("car_class", "first"), team_no=("team_no", "first"),
+    )
+    merged = merged.drop(columns=["team", "car_class", "team_no"]).join(first, on="team_key")
+
+    before = len(merged)
+    with_driver = merged[merged["driver_key"].notna()].drop_duplicates(["team_key", "driver_key"])
+    without = merged[merged["driver_key"].isna() & ~merged["team_key"].isin(with_driver["team_key"])]
+    staging = pd.concat([with_driver, without.drop_duplicates("team_key")], ignore_index=True)[STAGING_COLUMNS]
+    return {
+        "staging": staging,
+        "files": results,
+        "conflicts": conflicts,
+        "duplicates": before - len(staging),
+        "workers": n,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def import_staging(staging: pd.DataFrame, conn=None) -> dict:
+    """
+    Skriv en staging-frame fra stage_batch() i én transaktion (eller kalderens): teams
+    oprettes/opdateres, kørerne tilknyttes via repo.roster_bulk. Teksten er allerede
+    renset og klasserne normaliseret, så her køres der ikke mojibake-fix pr. celle.
+    """
+    with _tx(conn) as conn:
+        record(conn, "import", source="batch", rows=len(staging), files=int(staging["file"].nunique()))
+        team_ids: dict[str, int] = {}
+        roster_ops: list[dict] = []
+        for row in staging.itertuples(index=False):
+            team_id = team_ids.get(row.team_key)
+            if team_id is None:
+                team_no = None if pd.isna(row.team_no) else int(row.team_no)
+                team_id = team_ids[row.team_key] = _get_or_create_team(conn, row.team, row.car_class, team_no)
+            if not pd.isna(row.driver):
+                irid = None if pd.isna(row.iracing_id) else row.iracing_id
+                roster_ops.append({"op": "add", "team_id": team_id, "name": row.driver, "iracing_id": irid,
+                                   "name_key": row.driver_key})
+        result = roster_bulk(conn, roster_ops)
+    return {"teams": len(team_ids), "drivers": len(roster_ops), "roster": result}
+
+
+# -------------- Google Sheets fetcher --------------
+# Alle hentninger deler én requests.Session (forbindelses-pulje, retry med backoff) og
+# et disk-cache med rå svar pr. URL. Cachen sender ETag/Last-Modified med, så uændrede
+# faner kommer tilbage som 304 uden body, og bruges også hvis Google ikke svarer.
+# Basis-URL'en kan peges på en lokal stand-in (RACE_SHEETS_BASE_URL eller base_url=).
+
+SHEETS_BASE_URL = os.environ.get("RACE_SHEETS_BASE_URL", "https://docs.google.com")
+FETCH_WORKERS = 6
+FETCH_TIMEOUT = 30
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Fælles HTTP-session for alle hentninger i processen."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=FETCH_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def sheet_csv_url(sheet_id: str, gid: str, base_url: Optional[str] = None) -> str:
+    base = (base_url or SHEETS_BASE_URL).rstrip("/")
+    return f"{base}/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
+
+
+def sheet_cache_dir() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "sheet_cache")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _cache_paths(url: str) -> tuple[str, str]:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    base = os.path.join(sheet_cache_dir(), key)
+    return base + ".csv", base + ".json"
+
+
+def _fetch_raw(url: str) -> tuple[bytes, str]:
+    """Hent rå bytes for url via cachen. Returnerer (indhold, status)."""
+    body_path, meta_path = _cache_paths(url)
+    cached = None
+    if os.path.exists(body_path) and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as fh:
+            cached = json.load(fh)
+
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    try:
+        r = get_session().get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        if r.status_code == 304 and cached:
+            with open(body_path, "rb") as fh:
+                return fh.read(), "uændret (304)"
+        r.raise_for_status()
+    except requests.RequestException:
+        if not cached:
+            raise
+        with open(body_path, "rb") as fh:
+            return fh.read(), "cache (offline)"
+
+    for path, data in ((body_path, r.content), (meta_path, json.dumps({
+        "url": url,
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }).encode("utf-8"))):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    return r.content, "hentet"
+
+
+def _parse_sheet_csv(content: bytes) -> pd.DataFrame:
     # Tving UTF-8 (replace = vis evt. fejltegn i stedet for at crashe)
-    text = r.content.decode("utf-8", errors="replace")
+    text = content.decode("utf-8", errors="replace")
     df = pd.read_csv(io.StringIO(text), encoding="utf-8")
 
     # Ret typisk mojibake i ALLE object-kolonner
     for c in df.select_dtypes(include="object").columns:
         df[c] = df[c].apply(_fix_mojibake)
-
     return df
+
+
+def _fetch_one(sheet_id: str, gid: str, base_url: Optional[str]) -> dict:
+    url = sheet_csv_url(sheet_id, gid, base_url)
+    t0 = time.perf_counter()
+    out = {"sheet_id": sheet_id, "gid": str(gid), "url": url, "status": None,
+           "bytes": 0, "ms": 0.0, "df": None, "error": None}
+    try:
+        content, out["status"] = _fetch_raw(url)
+        out["bytes"] = len(content)
+        out["df"] = _parse_sheet_csv(content)
+    except Exception as e:
+        out["status"], out["error"] = "fejl", e
+    out["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return out
+
+
+def fetch_sheets(
+    sources: Iterable[tuple[str, str]],
+    *,
+    base_url: Optional[str] = None,
+    workers: int = FETCH_WORKERS,
+) -> list[dict]:
+    """
+    Hent flere faner samtidigt. sources = [(sheet_id, gid), ...]. Hentning og parsing
+    sker parallelt i en tråd-pulje; resultatet har samme rækkefølge som sources:
+    {"sheet_id", "gid", "url", "status", "bytes", "ms", "df", "error"}.
+    """
+    sources = [(str(sid).strip(), str(gid).strip()) for sid, gid in sources]
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sources))), thread_name_prefix="sheets") as pool:
+        return list(pool.map(lambda src: _fetch_one(*src, base_url), sources))
+
+
+def fetch_public_sheet_as_df(sheet_id: str, gid: str) -> pd.DataFrame:
+    """
+    Henter et offentligt (viewer) Google Sheet-faneblad som CSV og returnerer et DataFrame.
+    Vi dekoder altid som UTF-8 (errors='replace') og kører derefter en mojibake-rettelse
+    på alle object-kolonner.
+    """
+    res = fetch_sheets([(sheet_id, gid)])[0]
+    if res["error"] is not None:
+        raise res["error"]
+    return res["df"]
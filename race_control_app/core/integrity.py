@@ -0,0 +1,399 @@
+# core/integrity.py
+"""
+Integritetstjek af race-databasen.
+
+Invarianter appen bygger på:
+  - open_stints      højst én åben stint pr. team (current_stint tager ellers bare én)
+  - bad_interval     end_ts før start_ts
+  - overlap          en stint starter før teamets forrige stint er slut
+  - orphan_link      team_driver peger på en slettet kører eller et slettet team
+  - orphan_stint     stint peger på en slettet kører
+  - duplicate_name   to teams med samme navn (uden store/små bogstaver og mellemrum)
+
+Tjekket er inkrementelt: triggers (db._ensure_integrity) noterer berørte stints, teams
+og navne i integrity_dirty, og check() ser kun på rækkerne efter high-water mark'et i
+integrity_state – så det kan køre hvert par sekunder under et løb. check(full=True)
+tjekker alt. Fundne problemer ligger i integrity_issue indtil de er rettet; repair()
+retter dem der kan rettes sikkert gennem hændelsesloggen, efter at have set på rækkerne igen.
+
+Baggrundstjekket kører kun i én replika (db.lead("integrity")). Er det slået fra
+(RACE_INTEGRITY_SEC=0), noterer triggerne intet, og et manuelt tjek er altid fuldt.
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+from core import db
+from core.eventlog import record, utc_now
+
+INTERVAL_SEC = float(os.environ.get("RACE_INTEGRITY_SEC", "5"))
+
+SUGGESTIONS = {
+    "open_stints": "Luk de ældre åbne stints ved starten af den nyeste",
+    "bad_interval": "Sæt sluttid = starttid (stinten får længden 0)",
+    "overlap": "Luk den forrige stint ved starten af den næste",
+    "orphan_link": "Fjern tilknytningen til den slettede kører/det slettede team",
+    "orphan_stint": "Ret manuelt: flyt stinten til en eksisterende kører",
+    "duplicate_name": "Ret manuelt: omdøb et af teamene",
+}
+REPAIRABLE = {"open_stints", "bad_interval", "overlap", "orphan_link"}
+
+
+# ---------- Tjek pr. scope ----------
+# Forespørgslerne er begrænset til stints i temp.ic_stint, teams i temp.ic_team og navne i
+# temp.ic_name. Hver giver (scope_key, team_id, ref, detail).
+_STINT_CHECKS = {
+    "bad_interval": """
+        SELECT id, team_id, id, 'slut ' || end_ts || ' før start ' || start_ts
+        FROM stint WHERE id IN (SELECT id FROM temp.ic_stint) AND end_ts < start_ts
+    """,
+    # Kun forrige stint i teamets rækkefølge (ix_stint_team_start), så prisen følger antal ændrede stints
+    "overlap": """
+        SELECT s.id, s.team_id, p.id || ',' || s.id,
+               'starter ' || s.start_ts || ' før forrige slutter ' || p.end_ts
+        FROM stint s
+        JOIN stint p ON p.id = (
+          SELECT x.id FROM stint x
+          WHERE x.team_id = s.team_id AND (x.start_ts, x.id) < (s.start_ts, s.id)
+          ORDER BY x.start_ts DESC, x.id DESC LIMIT 1
+        )
+        WHERE s.id IN (SELECT id FROM temp.ic_stint) AND p.end_ts > s.start_ts
+    """,
+    "orphan_stint": """
+        SELECT s.id, s.team_id, s.id, 'kører ' || s.driver_id || ' findes ikke'
+        FROM stint s LEFT JOIN driver d ON d.id = s.driver_id
+        WHERE s.id IN (SELECT id FROM temp.ic_stint) AND d.id IS NULL
+    """,
+}
+
+_TEAM_CHECKS = {
+    "open_stints": """
+        SELECT team_id, team_id, GROUP_CONCAT(id), COUNT(*) || ' åbne stints'
+        FROM stint WHERE end_ts IS NULL AND team_id IN (SELECT team_id FROM temp.ic_team)
+        GROUP BY team_id HAVING COUNT(*) > 1
+    """,
+    "orphan_link": """
+        SELECT td.team_id, td.team_id, td.driver_id,
+               CASE WHEN t.id IS NULL THEN 'team findes ikke' ELSE 'kører findes ikke' END
+        FROM team_driver td
+        LEFT JOIN team t ON t.id = td.team_id
+        LEFT JOIN driver d ON d.id = td.driver_id
+        WHERE td.team_id IN (SELECT team_id FROM temp.ic_team) AND (t.id IS NULL OR d.id IS NULL)
+    """,
+}
+
+_NAME_CHECKS = {
+    "duplicate_name": """
+        SELECT LOWER(TRIM(COALESCE(name, ''))) AS k, NULL, GROUP_CONCAT(id), COUNT(*) || ' teams hedder ' || MIN(name)
+        FROM team WHERE k IN (SELECT k FROM temp.ic_name) AND k <> ''
+        GROUP BY k HAVING COUNT(*) > 1
+    """,
+}
+
+_SCOPES = (("stint", "ic_stint", "id", _STINT_CHECKS), ("team", "ic_team", "team_id", _TEAM_CHECKS),
+           ("name", "ic_name", "k", _NAME_CHECKS))
+
+
+def _state(cur, key, default=None):
+    row = cur.execute("SELECT value FROM integrity_state WHERE key=?;", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(cur, **values):
+    cur.executemany(
+        "INSERT INTO integrity_state (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
+        [(k, str(v)) for k, v in values.items()],
+    )
+
+
+def _mark_scope(cur, full: bool, hwm, top):
+    """Fyld temp-tabellerne med det der skal tjekkes."""
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS ic_stint (id INTEGER PRIMARY KEY);")
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS ic_team (team_id INTEGER PRIMARY KEY);")
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS ic_name (k TEXT PRIMARY KEY);")
+    for table in ("ic_stint", "ic_team", "ic_name"):
+        cur.execute(f"DELETE FROM temp.{table};")
+    if full:
+        cur.execute("INSERT INTO temp.ic_stint SELECT id FROM stint;")
+        cur.execute(
+            "INSERT OR IGNORE INTO temp.ic_team SELECT id FROM team "
+            "UNION SELECT team_id FROM team_driver UNION SELECT team_id FROM stint;"
+        )
+        cur.execute("INSERT OR IGNORE INTO temp.ic_name SELECT LOWER(TRIM(COALESCE(name, ''))) FROM team;")
+        return
+
+    dirty = "SELECT CAST(key AS INTEGER) FROM integrity_dirty WHERE id > ? AND id <= ? AND scope = ?"
+    cur.execute(f"INSERT OR IGNORE INTO temp.ic_stint {dirty};", (hwm, top, "stint"))
+    cur.execute(f"INSERT OR IGNORE INTO temp.ic_team {dirty};", (hwm, top, "team"))
+    cur.execute(
+        "INSERT OR IGNORE INTO temp.ic_name SELECT key FROM integrity_dirty WHERE id > ? AND id <= ? AND scope = 'name';",
+        (hwm, top),
+    )
+    # En slettet kører berører teams og stints der stadig peger på den
+    cur.execute(
+        f"INSERT OR IGNORE INTO temp.ic_team SELECT team_id FROM team_driver WHERE driver_id IN ({dirty});",
+        (hwm, top, "driver"),
+    )
+    cur.execute(
+        f"INSERT OR IGNORE INTO temp.ic_stint SELECT id FROM stint WHERE driver_id IN ({dirty});",
+        (hwm, top, "driver"),
+    )
+    # Overlap afhænger også af naboen: næste stint efter hver ændret, og stints hvis
+    # registrerede overlap peger på en ændret (fx slettet) forrige stint
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO temp.ic_stint
+        SELECT next_id FROM (
+          SELECT (SELECT x.id FROM stint x
+                  WHERE x.team_id = s.team_id AND (x.start_ts, x.id) > (s.start_ts, s.id)
+                  ORDER BY x.start_ts, x.id LIMIT 1) AS next_id
+          FROM stint s WHERE s.id IN (SELECT id FROM temp.ic_stint)
+        ) WHERE next_id IS NOT NULL;
+        """
+    )
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO temp.ic_stint
+        SELECT CAST(scope_key AS INTEGER) FROM integrity_issue
+        WHERE check_name = 'overlap'
+          AND CAST(substr(ref, 1, instr(ref, ',') - 1) AS INTEGER) IN (SELECT id FROM temp.ic_stint);
+        """
+    )
+
+
+def check(full: bool = False) -> dict:
+    """
+    Tjek de stints/teams/navne der er ændret siden sidst (eller alt med full=True, og altid
+    første gang). Skriver direkte (ikke via write_conn), da intet versioneret ændres.
+    """
+    t0 = time.perf_counter()
+    conn = db.get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE;")
+        hwm = _state(cur, "hwm")
+        untracked = _state(cur, "untracked") is not None
+        full = full or hwm is None or untracked
+        top = cur.execute("SELECT COALESCE(MAX(id), 0) FROM integrity_dirty;").fetchone()[0]
+        _mark_scope(cur, full, hwm, top)
+
+        now = utc_now()
+        found, checked = 0, {}
+        for scope, table, col, checks in _SCOPES:
+            checked[scope] = cur.execute(f"SELECT COUNT(*) FROM temp.{table};").fetchone()[0]
+            if full:
+                cur.execute("DELETE FROM integrity_issue WHERE scope = ?;", (scope,))
+            else:
+                cast = "scope_key" if scope == "name" else "CAST(scope_key AS INTEGER)"
+                cur.execute(
+                    f"DELETE FROM integrity_issue WHERE scope = ? AND {cast} IN (SELECT {col} FROM temp.{table});",
+                    (scope,),
+                )
+            for name, sql in checks.items():
+                rows = cur.execute(sql).fetchall()
+                cur.executemany(
+                    "INSERT INTO integrity_issue (check_name, scope, scope_key, team_id, ref, detail, found_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    [(name, scope, str(key), team, str(ref), detail, now) for key, team, ref, detail in rows],
+                )
+                found += len(rows)
+
+        # Behandlede markeringer fjernes; high-water mark'et sikrer at nye (også under tjekket) tages næste gang
+        cur.execute("DELETE FROM integrity_dirty WHERE id <= ?;", (top,))
+        issues = cur.execute("SELECT COUNT(*) FROM integrity_issue;").fetchone()[0]
+        ms = round((time.perf_counter() - t0) * 1000, 1)
+        _set_state(cur, last_run=now, last_ms=ms, issues=issues, **({} if untracked else {"hwm": top}))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {"full": full, "stints_checked": checked["stint"], "teams_checked": checked["team"],
+            "names_checked": checked["name"], "found": found, "issues": issues, "ms": ms}
+
+
+def set_tracking(enabled: bool):
+    """
+    Slå triggernes markeringer i integrity_dirty til eller fra for databasen. Fra: tabellen
+    tømmes og holdes tom. Til igen: high-water mark'et nulstilles, så næste tjek er fuldt.
+    """
+    conn = db.get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE;")
+        untracked = _state(cur, "untracked") is not None
+        if enabled and untracked:
+            cur.execute("DELETE FROM integrity_state WHERE key IN ('untracked', 'hwm');")
+        elif not enabled and not untracked:
+            _set_state(cur, untracked=1)
+            cur.execute("DELETE FROM integrity_state WHERE key = 'hwm';")
+            cur.execute("DELETE FROM integrity_dirty;")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# ---------- Læsninger ----------
+def status() -> dict:
+    """Til admin-badget: antal åbne problemer og seneste kørsel (uden at tjekke)."""
+    conn = db.get_conn()
+    try:
+        cur = conn.cursor()
+        pending = cur.execute(
+            "SELECT COUNT(*) FROM integrity_dirty WHERE id > ?;", (int(_state(cur, "hwm", 0)),)
+        ).fetchone()[0]
+        return {
+            "issues": int(_state(cur, "issues", 0)),
+            "last_run": _state(cur, "last_run"),
+            "last_ms": float(_state(cur, "last_ms", 0)),
+            "pending": pending,
+            "unique_active_index": cur.execute(
+                "SELECT EXISTS(SELECT 1 FROM sqlite_master WHERE type='index' AND name='ux_stint_team_active');"
+            ).fetchone()[0] == 1,
+        }
+    finally:
+        conn.close()
+
+
+def issues() -> pd.DataFrame:
+    """Åbne problemer med forslag til rettelse."""
+    conn = db.get_conn()
+    try:
+        df = pd.read_sql_query(
+            """
+            SELECT i.id, i.check_name, i.scope_key, COALESCE(t.name, i.scope_key) AS team,
+                   i.ref, i.detail, i.found_at
+            FROM integrity_issue i LEFT JOIN team t ON t.id = i.team_id
+            ORDER BY i.check_name, i.team_id, i.scope_key;
+            """,
+            conn,
+        )
+    finally:
+        conn.close()
+    df["suggestion"] = df["check_name"].map(SUGGESTIONS)
+    df["repairable"] = df["check_name"].isin(REPAIRABLE)
+    return df
+
+
+# ---------- Reparation ----------
+def _repair_events(cur, check_name: str, scope_key: str, ref: str) -> list[tuple[str, dict]]:
+    """
+    Hændelserne der retter ét problem, ud fra rækkerne som de er nu (ikke som da problemet
+    blev fundet): er det allerede rettet eller ændret, gives ingen.
+    """
+    ids = [int(x) for x in ref.split(",")]
+    if check_name == "orphan_link":
+        still = cur.execute(
+            """
+            SELECT 1 FROM team_driver td
+            LEFT JOIN team t ON t.id = td.team_id
+            LEFT JOIN driver d ON d.id = td.driver_id
+            WHERE td.team_id = ? AND td.driver_id = ? AND (t.id IS NULL OR d.id IS NULL);
+            """,
+            (int(scope_key), ids[0]),
+        ).fetchone()
+        return [("team_driver_remove", {"team_id": int(scope_key), "driver_id": ids[0]})] if still else []
+    marks = ",".join("?" for _ in ids)
+    rows = cur.execute(
+        f"SELECT id, start_ts, end_ts FROM stint WHERE id IN ({marks}) ORDER BY start_ts, id;", ids
+    ).fetchall()
+    if check_name == "open_stints":
+        open_rows = [r for r in rows if r[2] is None]
+        if len(open_rows) < 2:
+            return []
+        newest = open_rows[-1]
+        return [("stint_close", {"stint_id": i, "end_ts": newest[1]}) for i, _, _ in open_rows[:-1]]
+    if check_name == "bad_interval":
+        return [("stint_close", {"stint_id": i, "end_ts": start})
+                for i, start, end in rows if end is not None and end < start]
+    if check_name == "overlap" and len(rows) == 2 and rows[0][2] is not None and rows[0][2] > rows[1][1]:
+        return [("stint_close", {"stint_id": rows[0][0], "end_ts": rows[1][1]})]
+    return []
+
+
+def repair(issue_ids=None) -> dict:
+    """
+    Ret de valgte problemer (alle rettelige hvis None) gennem hændelsesloggen i én
+    transaktion, tjek igen og forsøg at oprette ux_stint_team_active.
+    """
+    df = issues()
+    df = df[df["repairable"]]
+    if issue_ids is not None:
+        df = df[df["id"].isin([int(i) for i in issue_ids])]
+    done = 0
+    with db.write_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE;")  # rækkerne kan ikke ændre sig mellem eftersyn og rettelse
+        for r in df.itertuples():
+            for kind, payload in _repair_events(cur, r.check_name, r.scope_key, r.ref):
+                record(conn, kind, **payload)
+                done += 1
+    result = check()
+    conn = db.get_conn()
+    try:
+        result["unique_active_index"] = db.ensure_active_stint_index(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    return {"repairs": done, **result}
+
+
+# ---------- Baggrundstråd ----------
+class IntegrityChecker:
+    """
+    Kører check() hvert INTERVAL_SEC (inkrementelt, så det er billigt under et løb) – kun i
+    den replika der har rollen db.lead("integrity"); de andre ser efter om den er blevet ledig.
+    """
+
+    def __init__(self, interval: float = INTERVAL_SEC):
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="integrity-checker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not db.lead("integrity"):
+                continue
+            try:
+                check()
+                self.last_error = None
+            except Exception as e:  # tjekket må aldrig vælte serveren
+                self.last_error = str(e)
+
+
+_checker = None
+_checker_lock = threading.Lock()
+_tracking_set = False
+
+
+def start_checker() -> IntegrityChecker | None:
+    """
+    Start baggrundstjekket én gang pr. proces. RACE_INTEGRITY_SEC=0 slår det fra – og dermed
+    også markeringerne (set_tracking), så integrity_dirty ikke vokser uden at blive ryddet.
+    """
+    global _checker, _tracking_set
+    with _checker_lock:
+        if not _tracking_set:
+            set_tracking(INTERVAL_SEC > 0)
+            _tracking_set = True
+        if INTERVAL_SEC <= 0:
+            return None
+        if _checker is None:
+            _checker = IntegrityChecker().start()
+        return _checker
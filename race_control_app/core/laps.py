@@ -0,0 +1,269 @@
+# core/laps.py
+"""
+Omgangstider fra simulatorens resultatfil, fordelt på stints.
+
+Filen har én række pr. omgang: bilnummer, omgangsnummer, omgangstid og tidsstempel (når
+omgangen blev kørt færdig). load_laps() læser den i ét hug og normaliserer kolonnerne;
+attribute_laps() finder hver omgangs stint med et sorteret interval-join (pd.merge_asof
+pr. team på tidsstemplet: seneste stint der startede før omgangen, og som ikke var slut),
+i stedet for et SQL-opslag pr. række. Derefter aggregeres pr. stint og gemmes i
+stint_lap_stats, der erstatter tallene for de stints filen dækker.
+
+Tabellen gemmer summer (antal, sum, kvadratsum) for de rene omgange, så gennemsnit og
+konsistens (standardafvigelse) kan lægges eksakt sammen pr. kører eller team. En omgang
+er "ren" når den er højst CLEAN_FACTOR × stintens bedste tid – pit-, gul flag- og
+ud/ind-omgange tæller med i antallet, men ikke i tempoet.
+"""
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.coherence import cached
+from core.db import get_conn, read_conn, write_conn
+from core.importers import guess_column
+
+CLEAN_FACTOR = 1.07   # 107 %-reglen
+
+CANDIDATE_CAR = ["car no", "car_no", "car number", "car_number", "carnumber", "car #", "car", "#", "number", "nr"]
+CANDIDATE_LAP = ["lap number", "lap_number", "lapnumber", "lap no", "lap #", "lap"]
+CANDIDATE_LAPTIME = ["lap time", "lap_time", "laptime", "time (s)", "duration"]
+CANDIDATE_TS = ["timestamp", "utc", "ts", "finished at", "session time", "date"]
+
+LAP_STATS_COLUMNS = [
+    "stint_id", "laps", "clean_laps", "best_sec", "sum_sec", "sumsq_sec", "first_lap", "last_lap",
+]
+
+
+# ---------- Indlæsning ----------
+def parse_lap_time(values: pd.Series) -> pd.Series:
+    """Omgangstid i sekunder fra tal, "ss.sss", "m:ss.sss" eller "h:mm:ss.sss" (vektoriseret)."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    s = values.astype(str).str.strip().str.replace(",", ".", regex=False)
+    parts = s.str.split(":", expand=True)
+    secs = pd.Series(0.0, index=s.index)
+    for col in parts.columns:
+        secs = secs * 60 + pd.to_numeric(parts[col], errors="coerce").fillna(0.0)
+    # Tomme/ulæselige felter → NaN (ikke 0 sekunder)
+    return secs.where(pd.to_numeric(parts[parts.columns[-1]], errors="coerce").notna())
+
+
+def load_laps(source) -> pd.DataFrame:
+    """
+    Læs en omgangsfil (sti, bytes eller fil-objekt; CSV) til kolonnerne
+    car_no, lap, lap_sec, ts (epoch-sek., UTC). Rækker uden bil, tid eller tidsstempel droppes.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    raw = pd.read_csv(source, sep=";" if _semicolons(source) else ",")
+    cols = list(raw.columns)
+    lap_time_col = guess_column(cols, CANDIDATE_LAPTIME)
+    ts_col = guess_column([c for c in cols if c != lap_time_col], CANDIDATE_TS)
+    lap_col = guess_column([c for c in cols if c not in (lap_time_col, ts_col)], CANDIDATE_LAP)
+    car_col = guess_column([c for c in cols if c not in (lap_time_col, ts_col, lap_col)], CANDIDATE_CAR)
+    missing = [n for n, c in (("bilnummer", car_col), ("omgangstid", lap_time_col), ("tidsstempel", ts_col)) if c is None]
+    if missing:
+        raise ValueError(f"Kan ikke finde kolonne(r) for {', '.join(missing)} i {cols}")
+
+    ts = raw[ts_col]
+    if pd.api.types.is_numeric_dtype(ts):
+        epoch = ts.astype(float)
+    else:
+        when = pd.to_datetime(ts, utc=True, errors="coerce")
+        epoch = (when - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+    df = pd.DataFrame({
+        "car_no": pd.to_numeric(raw[car_col].astype(str).str.lstrip("#"), errors="coerce"),
+        "lap": pd.to_numeric(raw[lap_col], errors="coerce") if lap_col else np.nan,
+        "lap_sec": parse_lap_time(raw[lap_time_col]),
+        "ts": epoch,
+    })
+    df = df.dropna(subset=["car_no", "lap_sec", "ts"])
+    df = df[df["lap_sec"] > 0]
+    return df.astype({"car_no": "int64"}).reset_index(drop=True)
+
+
+def _semicolons(source) -> bool:
+    """True hvis første linje er semikolon-separeret (dansk Excel) frem for komma."""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            head = f.read(4096)
+    else:
+        pos = source.tell()
+        head = source.read(4096)
+        source.seek(pos)
+    if isinstance(head, str):
+        head = head.encode("utf-8", "ignore")
+    first = head.split(b"\n", 1)[0]
+    return first.count(b";") > first.count(b",")
+
+
+# ---------- Interval-join ----------
+def _stint_frame(conn) -> pd.DataFrame:
+    return pd.read_sql_query(
+        """
+        SELECT s.id AS stint_id, s.team_id, s.driver_id, t.team_no,
+               CAST(strftime('%s', s.start_ts) AS REAL) AS start,
+               CAST(strftime('%s', s.end_ts) AS REAL) AS end
+        FROM stint s JOIN team t ON t.id = s.team_id;
+        """,
+        conn,
+    )
+
+
+def attribute_laps(laps: pd.DataFrame, stints: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ren beregning (ingen DB): giv hver omgang team_id, stint_id og driver_id.
+    laps: car_no, lap, lap_sec, ts. stints: stint_id, team_id, driver_id, team_no, start, end
+    (epoch; end NaN = åben). Omgange uden team eller uden stint på tidspunktet får stint_id NaN.
+    """
+    teams = stints.dropna(subset=["team_no"]).drop_duplicates("team_id")
+    by_no = dict(zip(teams["team_no"].astype("int64"), teams["team_id"]))
+    laps = laps.assign(team_id=laps["car_no"].map(by_no))
+    known = laps.dropna(subset=["team_id"]).astype({"team_id": "int64"}).sort_values("ts", kind="stable")
+    right = stints[["stint_id", "team_id", "driver_id", "start", "end"]].astype({"team_id": "int64"})
+    right = right.sort_values("start", kind="stable")
+    joined = pd.merge_asof(known, right, left_on="ts", right_on="start", by="team_id", direction="backward")
+    # Omgangen er kørt færdig efter stinten sluttede (hul i stints) → ingen stint
+    outside = joined["end"].notna() & (joined["ts"] > joined["end"])
+    joined.loc[outside, ["stint_id", "driver_id"]] = np.nan
+    unknown = laps[laps["team_id"].isna()].assign(stint_id=np.nan, driver_id=np.nan)
+    return pd.concat([joined.drop(columns=["start", "end"]), unknown], ignore_index=True)
+
+
+def stint_aggregates(attributed: pd.DataFrame) -> pd.DataFrame:
+    """Ren beregning: LAP_STATS_COLUMNS pr. stint fra attribute_laps()."""
+    df = attributed.dropna(subset=["stint_id"])
+    if df.empty:
+        return pd.DataFrame(columns=LAP_STATS_COLUMNS)
+    best = df.groupby("stint_id")["lap_sec"].transform("min")
+    clean = df["lap_sec"] <= best * CLEAN_FACTOR
+    df = df.assign(
+        clean=clean,
+        clean_sec=df["lap_sec"].where(clean, 0.0),
+        clean_sq=(df["lap_sec"] ** 2).where(clean, 0.0),
+    )
+    out = df.groupby("stint_id", sort=True).agg(
+        laps=("lap_sec", "size"),
+        clean_laps=("clean", "sum"),
+        best_sec=("lap_sec", "min"),
+        sum_sec=("clean_sec", "sum"),
+        sumsq_sec=("clean_sq", "sum"),
+        first_lap=("lap", "min"),
+        last_lap=("lap", "max"),
+    ).reset_index()
+    return out.astype({"stint_id": "int64"})[LAP_STATS_COLUMNS]
+
+
+# ---------- Import ----------
+def import_laps(source) -> dict:
+    """
+    Læs en omgangsfil, fordel omgangene på stints og gem aggregaterne i stint_lap_stats
+    (erstatter tallene for de stints filen dækker). Returnerer tællinger og tider.
+    """
+    t0 = time.perf_counter()
+    laps = load_laps(source)
+    t_load = time.perf_counter()
+    with read_conn() as conn:
+        stints = _stint_frame(conn)
+    attributed = attribute_laps(laps, stints)
+    agg = stint_aggregates(attributed)
+    t_join = time.perf_counter()
+    rows = list(agg.itertuples(index=False, name=None))
+    with write_conn() as conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO stint_lap_stats ({', '.join(LAP_STATS_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(LAP_STATS_COLUMNS))});",
+            [tuple(v.item() if hasattr(v, "item") else v for v in r) for r in rows],
+        )
+    no_team = attributed["team_id"].isna()
+    return {
+        "laps": len(laps),
+        "matched": int(attributed["stint_id"].notna().sum()),
+        "unknown_car": int(no_team.sum()),
+        "outside_stints": int((attributed["stint_id"].isna() & ~no_team).sum()),
+        "stints": len(agg),
+        "load_ms": round((t_load - t0) * 1000, 1),
+        "join_ms": round((t_join - t_load) * 1000, 1),
+        "store_ms": round((time.perf_counter() - t_join) * 1000, 1),
+    }
+
+
+# ---------- Læsninger ----------
+def pace_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """avg_sec og std_sec (konsistens) ud fra clean_laps/sum_sec/sumsq_sec."""
+    num = {c: pd.to_numeric(df[c], errors="coerce").astype(float) for c in ("clean_laps", "sum_sec", "sumsq_sec", "best_sec")}
+    n = num["clean_laps"].where(num["clean_laps"] > 0)
+    avg = num["sum_sec"] / n
+    var = (num["sumsq_sec"] / n - avg ** 2).clip(lower=0)
+    return df.assign(avg_sec=avg.round(3), std_sec=np.sqrt(var).round(3), best_sec=num["best_sec"].round(3))
+
+
+@cached
+def driver_pace(team_id: int | None = None) -> pd.DataFrame:
+    """
+    Tempo pr. kører (evt. kun ét team): laps, clean_laps, best_sec, avg_sec, std_sec; hurtigst først.
+    Team og kører tages fra stinten som den er nu (fx efter en fletning af dublet-kørere).
+    """
+    where = "WHERE s.team_id = ?" if team_id is not None else ""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT d.name AS driver, t.name AS team, COUNT(*) AS stints,
+                   SUM(l.laps) AS laps, SUM(l.clean_laps) AS clean_laps, MIN(l.best_sec) AS best_sec,
+                   SUM(l.sum_sec) AS sum_sec, SUM(l.sumsq_sec) AS sumsq_sec
+            FROM stint_lap_stats l
+            JOIN stint s ON s.id = l.stint_id
+            JOIN driver d ON d.id = s.driver_id
+            JOIN team t ON t.id = s.team_id
+            {where}
+            GROUP BY s.team_id, s.driver_id;
+            """,
+            conn,
+            params=(team_id,) if team_id is not None else (),
+        )
+    out = pace_columns(df).drop(columns=["sum_sec", "sumsq_sec"])
+    return out.sort_values(["avg_sec", "driver"], na_position="last").reset_index(drop=True)
+
+
+# ---------- Eksport ----------
+EXPORT_COLUMNS = [
+    "team_no", "team", "car_class", "driver", "start_ts", "end_ts", "laps", "clean_laps",
+    "best_sec", "avg_sec", "std_sec",
+]
+
+
+def iter_stint_export(chunk_rows: int = 5000):
+    """
+    Alle stints med omgangstal som CSV i bidder (header først), læst med fetchmany, så et
+    helt løb kan skrives til fil uden at ligge i hukommelsen på én gang. (Admin-downloaden
+    samler bidderne til bytes, da st.download_button kun tager str/bytes.)
+    """
+    conn = get_conn()
+    try:
+        cur = conn.execute(
+            """
+            SELECT t.team_no, t.name, t.car_class, d.name, s.start_ts, s.end_ts,
+                   l.laps, l.clean_laps, l.best_sec, l.sum_sec, l.sumsq_sec
+            FROM stint s
+            JOIN team t ON t.id = s.team_id
+            LEFT JOIN driver d ON d.id = s.driver_id
+            LEFT JOIN stint_lap_stats l ON l.stint_id = s.id
+            ORDER BY t.team_no IS NULL, t.team_no, t.name, s.start_ts, s.id;
+            """
+        )
+        cols = EXPORT_COLUMNS[:8] + ["best_sec", "sum_sec", "sumsq_sec"]
+        header = True
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows and not header:
+                return
+            df = pace_columns(pd.DataFrame.from_records(rows, columns=cols))
+            df = df.astype({"team_no": "Int64", "laps": "Int64", "clean_laps": "Int64"})
+            yield df[EXPORT_COLUMNS].to_csv(index=False, header=header)
+            header = False
+            if not rows:
+                return
+    finally:
+        conn.close()
@@ -0,0 +1,192 @@
+# core/mirror.py
+"""
+Valgfrit in-memory spejl af race-databasen (én pr. server-proces).
+
+Når det er slået til, kører alle læsninger i core.repo (via db.read_conn) mod en
+:memory:-kopi, mens skrivninger fortsat går til disken (db.write_conn).
+Spejlet kopieres på ny når ændringsversionen flytter sig (core.coherence), så det højst er
+MAX_STALENESS_SEC bagud i forhold til andre replikaer og altid opdateret efter skrivninger
+fra egen tråd. Kun tabellerne læsningerne bruger (MIRROR_TABLES) kopieres, med ATTACH og
+INSERT ... SELECT i én læsetransaktion; hændelseslog, snapshots og integritetstabeller
+bliver på disken.
+
+Hver kopi er en ny "generation": en navngiven in-memory DB i SQLite's memdb-VFS
+(file:/...?vfs=memdb), der aldrig skrives i efter den er lagt frem. Hver tråd (session)
+læser over sin egen forbindelse til den aktuelle generation; forbindelserne deler filen men
+ikke cache og låse (som cache=shared ville), så læsninger ikke venter på hinanden.
+Mens én tråd kopierer, læser de andre videre i den forrige generation; kun en tråd der selv
+har skrevet siden sin sidste læsning venter på kopien. En gammel generation frigives når
+den sidste tråd der læste i den er gået videre til den nye.
+
+Slå til med miljøvariablen RACE_DB_MIRROR=1 eller mirror.enable().
+"""
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+from core import db
+from core.coherence import get_watcher
+
+_names = itertools.count(1)
+# ATTACH arver memdb-VFS'en fra generationen; disken åbnes med platformens almindelige VFS
+_DISK_VFS = "win32" if os.name == "nt" else "unix"
+
+# Tabeller som læsningerne (db.read_conn) bruger; FTS5-indeksets skyggetabeller følger med
+MIRROR_TABLES = [*db.VERSIONED_TABLES, "team_stats", "class_stats", "search_idx"]
+
+
+class Mirror:
+    def __init__(self, path: str):
+        self.path = path
+        self._name = f"race-mirror-{os.getpid()}-{next(_names)}"
+        self._lock = threading.Lock()     # kun kopiering og skift af generation
+        self._local = threading.local()   # trådens forbindelse: conn, gen, depth
+        self._gen = 0
+        self._keeper = None               # holder den aktuelle generation i live
+        self._version = None
+        self.syncs = 0
+        self.last_sync_ms = 0.0
+
+    def _uri(self, gen: int) -> str:
+        return f"file:/{self._name}-{gen}?vfs=memdb"
+
+    def _copy(self, keeper):
+        """Opret MIRROR_TABLES (med indekser og views) i keeper og kopiér rækkerne fra disken."""
+        keeper.execute("ATTACH DATABASE ? AS disk;", (f"file:{urllib.parse.quote(self.path)}?vfs={_DISK_VFS}",))
+        try:
+            keeper.execute("BEGIN;")  # ét øjebliksbillede af disken for alle tabeller
+            schema = keeper.execute(
+                "SELECT type, name, tbl_name, sql FROM disk.sqlite_master "
+                "WHERE sql IS NOT NULL AND type IN ('table', 'index', 'view') ORDER BY rowid;"
+            ).fetchall()
+            virtual = [n for t, n, _, sql in schema if t == "table" and n in MIRROR_TABLES
+                       and sql.upper().startswith("CREATE VIRTUAL")]
+            shadow = lambda n: any(n.startswith(f"{v}_") for v in virtual)
+            tables = [(n, sql) for t, n, _, sql in schema if t == "table" and (n in MIRROR_TABLES or shadow(n))]
+            for name, sql in tables:
+                if not shadow(name):
+                    keeper.execute(sql)
+            for name, sql in tables:
+                if name in virtual:
+                    continue  # indholdet ligger i skyggetabellerne
+                if shadow(name):
+                    keeper.execute(f'DELETE FROM main."{name}";')
+                keeper.execute(f'INSERT INTO main."{name}" SELECT * FROM disk."{name}";')
+            # Indekser efter rækkerne (hurtigere end at vedligeholde dem under indsættelsen)
+            for t, name, tbl, sql in schema:
+                if t == "index" and tbl in MIRROR_TABLES:
+                    keeper.execute(sql)
+            for t, name, tbl, sql in schema:
+                if t == "view":
+                    keeper.execute(sql)
+            keeper.execute("COMMIT;")
+        finally:
+            if keeper.in_transaction:
+                keeper.execute("ROLLBACK;")
+            keeper.execute("DETACH DATABASE disk;")
+
+    def sync(self, force: bool = False, wait: bool = True):
+        """
+        Kopiér disken ind i en ny generation hvis versionen har flyttet sig.
+        Med wait=False returneres straks hvis en anden tråd allerede er i gang med en kopi.
+        """
+        if not force and get_watcher().version() == self._version:
+            return
+        if not self._lock.acquire(blocking=wait or self._keeper is None):
+            return
+        old = None
+        try:
+            # Versionen læses FØR kopien: en skrivning midt imellem giver blot en ekstra sync
+            version = get_watcher().version()
+            if not force and version == self._version:
+                return
+            t0 = time.perf_counter()
+            gen = self._gen + 1
+            keeper = sqlite3.connect(self._uri(gen), uri=True, check_same_thread=False,
+                                     timeout=db.BUSY_TIMEOUT_SEC, isolation_level=None)
+            try:
+                self._copy(keeper)
+            except Exception:
+                keeper.close()
+                raise
+            old, self._keeper = self._keeper, keeper
+            self._gen, self._version = gen, version
+            self.syncs += 1
+            self.last_sync_ms = (time.perf_counter() - t0) * 1000
+        finally:
+            self._lock.release()
+        if old is not None:
+            old.close()
+
+    def wrote(self):
+        """Kaldes efter en skrivning: trådens næste læsning venter på en kopi der har den med."""
+        self._local.wrote = True
+
+    @contextmanager
+    def conn(self):
+        """Trådens læseforbindelse til den aktuelle generation (genbruges mellem kald)."""
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        if depth == 0:
+            # Indlejrede læsninger bliver på forbindelsen de startede på
+            self.sync(wait=getattr(local, "wrote", False))
+            local.wrote = False
+            if getattr(local, "gen", None) != self._gen:
+                if getattr(local, "conn", None) is not None:
+                    local.conn.close()
+                with self._lock:
+                    # Under låsen lever generationen (keeper), så URI'en rammer kopien og ikke en ny tom DB
+                    local.conn = sqlite3.connect(self._uri(self._gen), uri=True)
+                    local.gen = self._gen
+                local.conn.execute("PRAGMA query_only = 1;")
+        local.depth = depth + 1
+        try:
+            yield local.conn
+        finally:
+            local.depth = depth
+
+
+_mirrors: dict = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror() -> Mirror:
+    path = os.path.abspath(db.DB_PATH)
+    with _mirrors_lock:
+        m = _mirrors.get(path)
+        if m is None:
+            m = _mirrors[path] = Mirror(path)
+        return m
+
+
+def _provider():
+    return get_mirror().conn()
+
+
+def _on_local_write():
+    if enabled():
+        get_mirror().wrote()
+
+
+db.add_write_hook(_on_local_write)
+
+
+def enable():
+    db.set_read_provider(_provider)
+
+
+def disable():
+    db.set_read_provider(None)
+
+
+def enabled() -> bool:
+    return db._read_provider is _provider
+
+
+def enable_from_env():
+    if os.environ.get("RACE_DB_MIRROR", "").lower() in ("1", "true", "yes"):
+        enable()
@@ -0,0 +1,255 @@
+# core/planner.py
+"""
+Stint-rotationsplan for hele feltet i ét hug.
+
+Planen beregnes altid ud fra virkeligheden: hver kørers faktiske køretid (stint-historik)
+og den igangværende stint er udgangspunktet, og resten af løbet fordeles i slots af
+stint_minutes * stints_per_turn. Ændres historikken (ny stint, kører deaktiveret), skifter
+DB-versionen og planen lægges om fra det aktuelle tidspunkt – der gemmes ingen plan.
+
+Løseren er grådig men vektoriseret over alle teams (numpy, én matrix teams × kørere):
+hvert slot gives til den kører med mindst samlet køretid, med forrang til kørere under
+min_drive_hours, uden at overskride max_drive_hours (hvis muligt) og ikke samme kører to
+gange i træk når holdet har flere. Antallet af iterationer er antal slots (~30 for 24t),
+ikke antal teams, så hundredvis af teams løses på millisekunder.
+
+Konfigurationen ligger som JSON i meta (nøglen plan_config).
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from core.coherence import cached
+from core.db import read_conn
+from core.repo import get_meta, set_meta
+
+PLAN_META_KEY = "plan_config"
+
+DEFAULT_CONFIG = {
+    "race_start": None,       # UTC "YYYY-MM-DD HH:MM:SS"; None = første stint (eller nu)
+    "race_hours": 24.0,
+    "stint_minutes": 55.0,    # brændstofvindue
+    "stints_per_turn": 1,     # dobbelt-stints: 2
+    "min_drive_hours": 0.0,
+    "max_drive_hours": 0.0,   # 0 = ingen grænse
+}
+
+PLAN_COLUMNS = ["team_id", "slot", "driver_id", "driver", "start_ts", "end_ts", "planned_hours"]
+
+
+# ---------- Konfiguration ----------
+def get_plan_config() -> dict:
+    raw = get_meta(PLAN_META_KEY)
+    cfg = dict(DEFAULT_CONFIG)
+    if raw:
+        try:
+            cfg.update({k: v for k, v in json.loads(raw).items() if k in DEFAULT_CONFIG})
+        except ValueError:
+            pass
+    return cfg
+
+
+def set_plan_config(**changes) -> dict:
+    unknown = set(changes) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Ukendte planindstillinger: {', '.join(sorted(unknown))}")
+    cfg = {**get_plan_config(), **changes}
+    if float(cfg["stint_minutes"]) <= 0 or int(cfg["stints_per_turn"]) < 1 or float(cfg["race_hours"]) <= 0:
+        raise ValueError("Løbslængde, stintlængde og stints pr. tur skal være positive")
+    set_meta(PLAN_META_KEY, json.dumps(cfg))
+    return cfg
+
+
+def _epoch(ts: str) -> float:
+    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+def _ts(epoch) -> str:
+    return datetime.fromtimestamp(float(epoch), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ---------- Løser ----------
+def solve(
+    roster: pd.DataFrame,
+    drive: pd.DataFrame,
+    open_stints: pd.DataFrame,
+    cfg: dict,
+    now: float,
+    race_start: float,
+) -> pd.DataFrame:
+    """
+    Ren beregning (ingen DB): roster = team_id, driver_id, name (aktive kørere);
+    drive = team_id, driver_id, drive_sec (faktisk køretid indtil now);
+    open_stints = team_id, driver_id, start (epoch). Returnerer planens slots (PLAN_COLUMNS);
+    planned_hours er kørerens samlede køretid ved løbets slut hvis planen følges.
+    """
+    if roster.empty:
+        return pd.DataFrame(columns=PLAN_COLUMNS)
+    slot_sec = float(cfg["stint_minutes"]) * 60 * int(cfg["stints_per_turn"])
+    race_end = race_start + float(cfg["race_hours"]) * 3600
+    min_sec = float(cfg["min_drive_hours"]) * 3600
+    max_sec = float(cfg["max_drive_hours"]) * 3600 or np.inf
+
+    # Teams × kørere-matrix (kolonne = kørerens plads i holdets roster)
+    roster = roster.sort_values(["team_id", "name", "driver_id"]).reset_index(drop=True)
+    team_ids, row = np.unique(roster["team_id"].to_numpy(), return_inverse=True)
+    col = roster.groupby("team_id").cumcount().to_numpy()
+    n_teams, width = len(team_ids), int(col.max()) + 1
+    valid = np.zeros((n_teams, width), dtype=bool)
+    valid[row, col] = True
+    driver_ids = np.zeros((n_teams, width), dtype=np.int64)
+    driver_ids[row, col] = roster["driver_id"].to_numpy()
+    names = np.empty((n_teams, width), dtype=object)
+    names[row, col] = roster["name"].to_numpy()
+
+    pos = pd.Series(col, index=pd.MultiIndex.from_arrays([roster["team_id"], roster["driver_id"]]))
+    total = np.zeros((n_teams, width))
+    if not drive.empty:
+        hit = pos.reindex(pd.MultiIndex.from_arrays([drive["team_id"], drive["driver_id"]]))
+        ok = hit.notna().to_numpy()
+        t = np.searchsorted(team_ids, drive["team_id"].to_numpy()[ok])
+        total[t, hit.to_numpy()[ok].astype(int)] = drive["drive_sec"].to_numpy()[ok]
+
+    # Hvor står hvert team nu: kører i bilen og hvornår næste slot begynder
+    last = np.full(n_teams, -1)
+    next_start = np.full(n_teams, max(now, race_start))
+    if not open_stints.empty:
+        t = np.searchsorted(team_ids, open_stints["team_id"].to_numpy())
+        inside = (t < n_teams) & (team_ids[np.minimum(t, n_teams - 1)] == open_stints["team_id"].to_numpy())
+        t = t[inside]
+        stint_ends = np.maximum(open_stints["start"].to_numpy()[inside] + slot_sec, now)
+        next_start[t] = np.minimum(stint_ends, race_end)
+        hit = pos.reindex(pd.MultiIndex.from_arrays([open_stints["team_id"].to_numpy()[inside],
+                                                     open_stints["driver_id"].to_numpy()[inside]]))
+        ok = hit.notna().to_numpy()
+        last[t[ok]] = hit.to_numpy()[ok].astype(int)
+        # Den igangværende stint tælles med til dens forventede slut
+        total[t[ok], last[t[ok]]] += next_start[t[ok]] - now
+
+    n_slots = np.ceil(np.maximum(race_end - next_start, 0) / slot_sec).astype(int)
+    rows_idx = np.arange(n_teams)
+    slots = int(n_slots.max()) if n_teams else 0
+    pick = np.full((n_teams, slots), -1)
+    starts = np.zeros((n_teams, slots))
+    ends = np.zeros((n_teams, slots))
+    seats = valid.sum(axis=1)
+    start = next_start.copy()
+    for k in range(slots):
+        live = k < n_slots
+        length = np.minimum(slot_sec, race_end - start)
+        score = np.where(valid, total, np.inf)
+        # Under minimumstid først; over maksimum kun hvis ingen anden kan køre
+        score = np.where(valid & (total < min_sec), score - 1e9, score)
+        capped = valid & (total + length[:, None] > max_sec)
+        score = np.where(capped & ~np.all(capped | ~valid, axis=1)[:, None], np.inf, score)
+        # Ikke samme kører to gange i træk når holdet har flere
+        repeat = (last >= 0) & (seats > 1)
+        score[rows_idx[repeat], last[repeat]] = np.inf
+        choice = np.argmin(score, axis=1)
+        pick[live, k] = choice[live]
+        starts[live, k] = start[live]
+        ends[live, k] = start[live] + length[live]
+        total[rows_idx[live], choice[live]] += length[live]
+        last = np.where(live, choice, last)
+        start = np.where(live, start + length, start)
+
+    t, k = np.nonzero(pick >= 0)
+    c = pick[t, k]
+    return pd.DataFrame({
+        "team_id": team_ids[t],
+        "slot": k + 1,
+        "driver_id": driver_ids[t, c],
+        "driver": names[t, c],
+        "start_ts": pd.to_datetime(starts[t, k], unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+        "end_ts": pd.to_datetime(ends[t, k], unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+        "planned_hours": np.round(total[t, c] / 3600, 2),
+    }, columns=PLAN_COLUMNS)
+
+
+# ---------- Data fra DB ----------
+def _load_state(now: float):
+    now_ts = _ts(now)
+    with read_conn() as conn:
+        roster = pd.read_sql_query(
+            """
+            SELECT td.team_id, td.driver_id, d.name
+            FROM team_driver td JOIN driver d ON d.id = td.driver_id
+            WHERE td.is_active = 1;
+            """,
+            conn,
+        )
+        # Rødt flag-pauser (stint_pause) trækkes fra køretiden
+        paused = """
+            SELECT stint_id, SUM((julianday(COALESCE(end_ts, ?)) - julianday(start_ts)) * 86400) AS sec
+            FROM stint_pause GROUP BY stint_id
+        """
+        drive = pd.read_sql_query(
+            f"""
+            SELECT s.team_id, s.driver_id,
+                   SUM((julianday(COALESCE(s.end_ts, ?)) - julianday(s.start_ts)) * 86400
+                       - COALESCE(p.sec, 0)) AS drive_sec
+            FROM stint s LEFT JOIN ({paused}) p ON p.stint_id = s.id
+            GROUP BY s.team_id, s.driver_id;
+            """,
+            conn,
+            params=(now_ts, now_ts),
+        )
+        # En frossen stint slutter tilsvarende senere: start forskydes med pausetiden
+        open_stints = pd.read_sql_query(
+            f"""
+            SELECT s.team_id, s.driver_id, CAST(strftime('%s', s.start_ts) AS REAL) + COALESCE(p.sec, 0) AS start
+            FROM stint s LEFT JOIN ({paused}) p ON p.stint_id = s.id
+            WHERE s.end_ts IS NULL;
+            """,
+            conn,
+            params=(now_ts,),
+        )
+        first = conn.execute("SELECT MIN(start_ts) FROM stint;").fetchone()[0]
+    return roster, drive, open_stints, first
+
+
+def plan_field(now: float | None = None) -> pd.DataFrame:
+    """
+    Planen for alle teams (PLAN_COLUMNS), beregnet fra faktisk historik frem til now
+    (standard: nu rundet ned til hele minutter). now afgøres før cachen, så den aldrig
+    gemmer en plan under now=None.
+    """
+    return _plan_field(_now_minute() if now is None else now)
+
+
+@cached
+def _plan_field(now: float) -> pd.DataFrame:
+    cfg = get_plan_config()
+    roster, drive, open_stints, first = _load_state(now)
+    if cfg["race_start"]:
+        race_start = _epoch(cfg["race_start"])
+    else:
+        race_start = _epoch(first) if first else now
+    return solve(roster, drive, open_stints, cfg, now, race_start)
+
+
+def _now_minute() -> float:
+    # Planen genbruges inden for samme minut (og DB-version), så sider ikke løser igen ved hver rerun
+    return float(int(time.time()) // 60 * 60)
+
+
+def team_plan(team_id: int) -> pd.DataFrame:
+    plan = plan_field(_now_minute())
+    return plan[plan["team_id"] == team_id].drop(columns="team_id").reset_index(drop=True)
+
+
+def next_driver(team_id: int) -> dict | None:
+    """Planlagt næste kører og ETA (UTC) for et team, eller None hvis intet er planlagt."""
+    plan = team_plan(team_id)
+    if plan.empty:
+        return None
+    r = plan.iloc[0]
+    return {
+        "driver_id": int(r["driver_id"]),
+        "driver": r["driver"],
+        "eta": r["start_ts"],
+        "eta_min": max(0, round((_epoch(r["start_ts"]) - time.time()) / 60)),
+    }
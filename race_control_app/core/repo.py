@@ -1,58 +1,81 @@
 # core/repo.py
+import re
+import sqlite3
+from datetime import datetime
+
 import pandas as pd
-from core.db import get_conn
+from core.db import read_conn, write_conn
+from core.coherence import cached
+from core.classes import load_rules, match_class
+from core.dedupe import name_key
+from core.eventlog import record, record_many, utc_now
 
 # ---------- Hjælpere ----------
+@cached
+def _class_rules() -> tuple:
+    with read_conn() as conn:
+        return load_rules(conn)
+
+
 def normalize_class(val: str) -> str:
     """
-    Normaliserer klasse-felter fra CSV/Sheets til faste værdier:
+    Normaliserer klasse-felter fra CSV/Sheets til et klassenavn fra kataloget (car_class):
       - "GTP" (eller "LMDh" osv.) -> "GTP"
       - "GT3 AM" -> "GT3 AM"
       - "GT3 PRO" -> "GT3 PRO"
-      - Alle andre GT3-varianter -> "GT3"
+      - Alle andre GT3-varianter og ukendte værdier -> standardklassen ("GT3")
+    Se core.classes.match_class for reglerne.
     """
-    if not isinstance(val, str):
-        return "GT3"
-
-    v = val.strip().upper()
-
-    # GTP/LMDh
-    if "GTP" in v or "LMDH" in v:
-        return "GTP"
-
-    if "GT3" in v:
-        has_am = "AM" in v
-        has_pro = "PRO" in v
-        if has_am and not has_pro:
-            return "GT3 AM"
-        if has_pro and not has_am:
-            return "GT3 PRO"
-        return "GT3"
-
-    return "GT3"
+    return match_class(val, *_class_rules())
 
 
 # ---------- Læsninger ----------
+@cached
 def list_car_classes():
-    """Returnér liste af klasser i en fornuftig rækkefølge."""
-    with get_conn() as conn:
-        df = pd.read_sql_query("SELECT DISTINCT car_class FROM team;", conn)
-    classes = df["car_class"].dropna().tolist()
+    """Returnér de klasser der har teams, i katalogets rækkefølge (sort_rank)."""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            """
+            SELECT c.name FROM car_class c
+            WHERE EXISTS (SELECT 1 FROM team t WHERE t.class_id = c.id)
+            ORDER BY c.sort_rank, c.id;
+            """,
+            conn,
+        )
+    return df["name"].tolist()
 
-    order = {"GTP": 0, "GT3 PRO": 1, "GT3 AM": 2, "GT3": 3}
-    classes.sort(key=lambda x: order.get(x, 99))
-    return classes
+
+@cached
+def list_class_catalog() -> pd.DataFrame:
+    """Hele kataloget til redigering: id, name, sort_rank, colour, aliases, is_default, teams."""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            """
+            SELECT c.id, c.name, c.sort_rank, c.colour,
+                   COALESCE((SELECT GROUP_CONCAT(a.alias, ', ') FROM car_class_alias a
+                             WHERE a.class_id = c.id AND a.alias <> UPPER(c.name)), '') AS aliases,
+                   c.is_default,
+                   (SELECT COUNT(*) FROM team t WHERE t.class_id = c.id) AS teams
+            FROM car_class c
+            ORDER BY c.sort_rank, c.id;
+            """,
+            conn,
+        )
+    df["is_default"] = df["is_default"].astype(bool)
+    return df
 
 
+@cached
 def list_teams(car_class=None):
     """Returnér teams (id, name, team_no) sorteret på klasse → team_no → name.
        Fallback til schema uden team_no hvis nødvendigt."""
-    with get_conn() as conn:
+    with read_conn() as conn:
         try:
             if car_class:
                 return pd.read_sql_query(
-                    "SELECT id, name, team_no FROM team WHERE car_class=? "
-                    "ORDER BY team_no IS NULL, team_no, name;",
+                    "SELECT t.id, t.name, t.team_no FROM team t "
+                    "JOIN car_class c ON c.id = t.class_id WHERE c.name=? "
+                    "ORDER BY t.team_no IS NULL, t.team_no, t.name;",
                     conn, params=(car_class,)
                 )
             return pd.read_sql_query(
@@ -64,7 +87,8 @@ def list_teams(car_class=None):
             # Fallback til ældre schema uden team_no
             if car_class:
                 return pd.read_sql_query(
-                    "SELECT id, name FROM team WHERE car_class=? ORDER BY name;",
+                    "SELECT t.id, t.name FROM team t "
+                    "JOIN car_class c ON c.id = t.class_id WHERE c.name=? ORDER BY t.name;",
                     conn, params=(car_class,)
                 )
             return pd.read_sql_query(
@@ -73,79 +97,126 @@ def list_teams(car_class=None):
             )
 
 
+@cached
 def spectate_grid():
     """
     Returnerer en DataFrame med nuværende kører pr. team.
-    Kolonner: team_no, car_class, team_name, driver_name
-    Sortering: GTP -> GT3 PRO -> GT3 AM -> GT3 -> andre; derefter team_no, teamnavn.
+    Kolonner: team_no, car_class, class_colour, team_name, driver_name, paused (rødt flag)
+    Sortering: katalogets sort_rank (GTP -> GT3 PRO -> GT3 AM -> GT3 -> ...); derefter team_no,
+    teamnavn. Teams uden klasse (class_id NULL) kommer med til sidst, med car_class "-".
     """
     sql = """
     SELECT
       t.team_no,
-      t.car_class,
-      t.name  AS team_name,
-      d.name  AS driver_name
+      c.name   AS car_class,
+      c.colour AS class_colour,
+      t.name   AS team_name,
+      d.name   AS driver_name,
+      EXISTS (SELECT 1 FROM stint_pause p WHERE p.stint_id = s.id AND p.end_ts IS NULL) AS paused
     FROM team t
+    LEFT JOIN car_class c
+      ON c.id = t.class_id
     LEFT JOIN stint s
       ON s.team_id = t.id AND s.end_ts IS NULL
     LEFT JOIN driver d
       ON d.id = s.driver_id
     ORDER BY
-      CASE UPPER(COALESCE(t.car_class,'')) 
-        WHEN 'GTP' THEN 0
-        WHEN 'GT3 PRO' THEN 1
-        WHEN 'GT3 AM' THEN 2
-        WHEN 'GT3' THEN 3
-        ELSE 9
-      END,
+      c.sort_rank IS NULL,
+      c.sort_rank,
+      c.id,
       t.team_no IS NULL,
       t.team_no,
       t.name;
     """
-    with get_conn() as conn:
-        try:
-            df = pd.read_sql_query(sql, conn)
-        except Exception:
-            # Fallback hvis ældre schema uden team_no
-            sql_legacy = """
-            SELECT
-              NULL AS team_no,
-              t.car_class,
-              t.name AS team_name,
-              d.name AS driver_name
-            FROM team t
-            LEFT JOIN stint s
-              ON s.team_id = t.id AND s.end_ts IS NULL
-            LEFT JOIN driver d
-              ON d.id = s.driver_id
-            ORDER BY
-              CASE UPPER(COALESCE(t.car_class,'')) 
-                WHEN 'GTP' THEN 0
-                WHEN 'GT3 PRO' THEN 1
-                WHEN 'GT3 AM' THEN 2
-                WHEN 'GT3' THEN 3
-                ELSE 9
-              END,
-              t.name;
-            """
-            df = pd.read_sql_query(sql_legacy, conn)
+    with read_conn() as conn:
+        df = pd.read_sql_query(sql, conn)
 
     # UI-venlig formatering
-    if "driver_name" in df.columns:
-        df["driver_name"] = df["driver_name"].fillna("-")
-    if "team_no" in df.columns:
-        df["team_no"] = df["team_no"].astype("Int64")  # bevarer NaN som <NA>
+    df["driver_name"] = df["driver_name"].fillna("-")
+    df["car_class"] = df["car_class"].fillna("-")
+    df["team_no"] = df["team_no"].astype("Int64")  # bevarer NaN som <NA>
+    df["paused"] = df["paused"].astype(bool)
+    return df
+
+
+@cached
+def race_status() -> dict:
+    """
+    Løbets fase ud fra projektionen: "før start", "grønt", "rødt flag" eller "afsluttet",
+    plus antal kørende og frosne stints.
+    """
+    with read_conn() as conn:
+        stints, running, frozen = conn.execute(
+            """
+            SELECT COUNT(*),
+                   COALESCE(SUM(end_ts IS NULL), 0),
+                   (SELECT COUNT(*) FROM stint_pause WHERE end_ts IS NULL)
+            FROM stint;
+            """
+        ).fetchone()
+    if frozen:
+        phase = "rødt flag"
+    elif running:
+        phase = "grønt"
+    elif stints:
+        phase = "afsluttet"
+    else:
+        phase = "før start"
+    return {"phase": phase, "running": running, "frozen": frozen, "stints": stints}
+
+
+@cached
+def default_starters() -> pd.DataFrame:
+    """
+    Startkører pr. team uden aktiv stint: første aktive kører efter navn (samme valg som
+    planlæggeren gør uden historik). Kolonner: team_id, team_no, team_name, driver_id, driver.
+    """
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            """
+            SELECT t.id AS team_id, t.team_no, t.name AS team_name, d.id AS driver_id, d.name AS driver
+            FROM team t
+            LEFT JOIN car_class c ON c.id = t.class_id
+            LEFT JOIN driver d ON d.id = (
+              SELECT td.driver_id FROM team_driver td JOIN driver x ON x.id = td.driver_id
+              WHERE td.team_id = t.id AND td.is_active = 1
+              ORDER BY x.name, x.id LIMIT 1
+            )
+            WHERE NOT EXISTS (SELECT 1 FROM stint s WHERE s.team_id = t.id AND s.end_ts IS NULL)
+            ORDER BY c.sort_rank, t.team_no IS NULL, t.team_no, t.name;
+            """,
+            conn,
+        )
+    df["team_no"] = df["team_no"].astype("Int64")
+    df["driver_id"] = df["driver_id"].astype("Int64")
     return df
 
 
+@cached
+def active_roster() -> pd.DataFrame:
+    """Alle aktive kørere på tværs af teams: team_id, driver_id, name."""
+    with read_conn() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT td.team_id, td.driver_id, d.name
+            FROM team_driver td JOIN driver d ON d.id = td.driver_id
+            WHERE td.is_active = 1
+            ORDER BY td.team_id, d.name;
+            """,
+            conn,
+        )
+
+
+@cached
 def get_team_id_by_name(name: str):
-    with get_conn() as conn:
+    with read_conn() as conn:
         df = pd.read_sql_query("SELECT id FROM team WHERE name=?;", conn, params=(name,))
     return int(df.iloc[0]["id"]) if not df.empty else None
 
 
+@cached
 def get_team_pin(team_id: int) -> str:
-    with get_conn() as conn:
+    with read_conn() as conn:
         df = pd.read_sql_query(
             "SELECT COALESCE(team_pin,'1234') AS team_pin FROM team WHERE id=?;",
             conn, params=(team_id,)
@@ -153,6 +224,7 @@ def get_team_pin(team_id: int) -> str:
     return df.iloc[0]["team_pin"] if not df.empty else "1234"
 
 
+@cached
 def team_drivers(team_id: int):
     sql = """
       SELECT d.id AS driver_id, d.name, td.is_active
@@ -161,70 +233,498 @@ def team_drivers(team_id: int):
       WHERE td.team_id = ?
       ORDER BY d.name;
     """
-    with get_conn() as conn:
+    with read_conn() as conn:
         return pd.read_sql_query(sql, conn, params=(team_id,))
 
 
+@cached
 def current_stint(team_id: int):
     sql = """
       SELECT s.id, s.team_id, s.driver_id, d.name, s.start_ts
       FROM stint s
       JOIN driver d ON d.id = s.driver_id
       WHERE s.team_id=? AND s.end_ts IS NULL
+      ORDER BY s.start_ts DESC, s.id DESC
       LIMIT 1;
     """
-    with get_conn() as conn:
+    with read_conn() as conn:
         df = pd.read_sql_query(sql, conn, params=(team_id,))
     return df.iloc[0].to_dict() if not df.empty else None
 
 
+@cached
 def stint_history(team_id: int, limit: int = 20):
+    """Seneste stints; laps/best_sec/avg_sec/std_sec når omgangstider er importeret (core.laps)."""
+    from core.laps import pace_columns  # lazy: laps → importers → repo
+
     sql = """
-      SELECT d.name AS driver, s.start_ts, COALESCE(s.end_ts,'(active)') AS end_ts
+      SELECT d.name AS driver, s.start_ts, COALESCE(s.end_ts,'(active)') AS end_ts,
+             l.laps, l.clean_laps, l.best_sec, l.sum_sec, l.sumsq_sec
       FROM stint s
       JOIN driver d ON d.id = s.driver_id
+      LEFT JOIN stint_lap_stats l ON l.stint_id = s.id
       WHERE s.team_id=?
       ORDER BY s.start_ts DESC
       LIMIT ?;
     """
-    with get_conn() as conn:
-        return pd.read_sql_query(sql, conn, params=(team_id, limit))
+    with read_conn() as conn:
+        df = pd.read_sql_query(sql, conn, params=(team_id, limit))
+    df = pace_columns(df).astype({"laps": "Int64"})
+    return df[["driver", "start_ts", "end_ts", "laps", "best_sec", "avg_sec", "std_sec"]]
+
+
+@cached
+def count_teams() -> int:
+    with read_conn() as conn:
+        return conn.execute("SELECT COUNT(*) FROM team;").fetchone()[0]
+
+
+@cached
+def teams_page(offset: int = 0, limit: int = 50) -> pd.DataFrame:
+    """Én side af teams til admin-editoren (id, name, team_no, car_class, team_pin)."""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            "SELECT t.id, t.name, t.team_no, c.name AS car_class, COALESCE(t.team_pin,'1234') AS team_pin "
+            "FROM team t LEFT JOIN car_class c ON c.id = t.class_id "
+            "ORDER BY t.name, t.id LIMIT ? OFFSET ?;",
+            conn, params=(limit, offset)
+        )
+    df["team_no"] = df["team_no"].astype("Int64")
+    return df
+
+
+def team_edit_diff(before: pd.DataFrame, after: pd.DataFrame) -> list[dict]:
+    """
+    Sammenlign to udgaver af teams_page() og returnér kun de ændrede celler
+    som [{"team_id": .., "<felt>": ny_værdi, ...}] klar til apply_team_edits().
+    """
+    changes = []
+    a = after.set_index("id")
+    for r in before.itertuples(index=False):
+        if r.id not in a.index:
+            continue
+        new = a.loc[r.id]
+        change = {}
+
+        pin = "" if pd.isna(new["team_pin"]) else str(new["team_pin"]).strip()
+        if (pin or "1234") != r.team_pin:
+            change["team_pin"] = pin or "1234"
+
+        no = None if pd.isna(new["team_no"]) else int(new["team_no"])
+        old_no = None if pd.isna(r.team_no) else int(r.team_no)
+        if no != old_no:
+            change["team_no"] = no
+
+        cls = None if pd.isna(new["car_class"]) else str(new["car_class"])
+        if cls and cls != r.car_class:
+            change["car_class"] = cls
+
+        if change:
+            changes.append({"team_id": int(r.id), **change})
+    return changes
+
+
+def roster_edit_diff(team_id: int, before: pd.DataFrame, after: pd.DataFrame,
+                     team_ids_by_name: dict) -> list[dict]:
+    """
+    Oversæt en redigeret roster-tabel til operationer for apply_roster_changes().
+    before: team_drivers(team_id). after: kolonnerne driver_id, name, active, team, remove
+    (nye rækker har driver_id = NaN; slettede rækker fjernes fra holdet).
+    """
+    ops = []
+    old = {int(r.driver_id): r for r in before.itertuples(index=False)}
+    seen = set()
+    for r in after.itertuples(index=False):
+        name = "" if pd.isna(r.name) else str(r.name).strip()
+        target = team_ids_by_name.get(r.team, team_id) if isinstance(r.team, str) else team_id
+        active = bool(r.active) if not pd.isna(r.active) else True
+
+        if pd.isna(r.driver_id):
+            if name and not bool(r.remove):
+                ops.append({"op": "add", "team_id": target, "name": name, "is_active": int(active)})
+            continue
+
+        driver_id = int(r.driver_id)
+        seen.add(driver_id)
+        prev = old.get(driver_id)
+        if prev is None:
+            continue
+        if bool(r.remove):
+            ops.append({"op": "remove", "team_id": team_id, "driver_id": driver_id})
+            continue
+        if name and name != prev.name:
+            ops.append({"op": "rename", "driver_id": driver_id, "name": name})
+        # roster_bulk flytter før aktiv-status sættes: status gælder på det hold køreren ender på
+        if active != (prev.is_active == 1):
+            ops.append({"op": "active", "team_id": target, "driver_id": driver_id, "is_active": int(active)})
+        if target != team_id:
+            ops.append({"op": "move", "from_team_id": team_id, "team_id": target, "driver_id": driver_id})
+
+    # Rækker slettet direkte i editoren
+    for driver_id in old.keys() - seen:
+        ops.append({"op": "remove", "team_id": team_id, "driver_id": driver_id})
+    return ops
+
+
+def _fts_query(query: str) -> str:
+    """
+    Brugertekst → FTS5-udtryk: hvert ord skal matche som præfiks; hele-ords-træf
+    (fx bilnummer 12 frem for 120) tæller dobbelt i rangeringen.
+    """
+    return " AND ".join(f'("{tok}" OR "{tok}"*)' for tok in re.findall(r"\w+", query))
+
+
+@cached
+def search(query: str, limit: int = 20, car_class: str | None = None) -> pd.DataFrame:
+    """
+    Søg teams på teamnavn, bilnummer, klasse og kørernavne (search-as-you-type).
+    Én række pr. team, bedst rangeret først:
+      team_id, team_name, team_no, car_class, matched_drivers, rank
+    Tom søgning giver de første teams i nummerorden.
+    """
+    cols = ["team_id", "team_name", "team_no", "car_class", "matched_drivers", "rank"]
+    match = _fts_query(query or "")
+    with read_conn() as conn:
+        if not match:
+            df = pd.read_sql_query(
+                "SELECT t.id AS team_id, t.name AS team_name, t.team_no, c.name AS car_class, "
+                "NULL AS matched_drivers, 0.0 AS rank "
+                "FROM team t LEFT JOIN car_class c ON c.id = t.class_id "
+                "WHERE (? IS NULL OR c.name = ?) "
+                "ORDER BY t.team_no IS NULL, t.team_no, t.name LIMIT ?;",
+                conn, params=(car_class, car_class, limit)
+            )
+        else:
+            try:
+                df = pd.read_sql_query(
+                    """
+                    WITH hits AS (
+                      SELECT kind, team_id, label, rank
+                      FROM search_idx WHERE search_idx MATCH ?
+                      ORDER BY rank LIMIT ?
+                    )
+                    SELECT t.id AS team_id, t.name AS team_name, t.team_no, c.name AS car_class,
+                           GROUP_CONCAT(CASE WHEN h.kind = 'driver' THEN h.label END, ', ') AS matched_drivers,
+                           MIN(h.rank) AS rank
+                    FROM hits h JOIN team t ON t.id = h.team_id
+                    LEFT JOIN car_class c ON c.id = t.class_id
+                    WHERE (? IS NULL OR c.name = ?)
+                    GROUP BY t.id
+                    ORDER BY rank, t.team_no
+                    LIMIT ?;
+                    """,
+                    conn, params=(match, limit * 10, car_class, car_class, limit)
+                )
+            except (sqlite3.OperationalError, pd.errors.DatabaseError):
+                # SQLite uden FTS5: simpel LIKE-søgning på team og kører
+                like = f"%{query.strip()}%"
+                df = pd.read_sql_query(
+                    """
+                    SELECT t.id AS team_id, t.name AS team_name, t.team_no, c.name AS car_class,
+                           GROUP_CONCAT(CASE WHEN d.name LIKE ? THEN d.name END, ', ') AS matched_drivers,
+                           0.0 AS rank
+                    FROM team t
+                    LEFT JOIN car_class c ON c.id = t.class_id
+                    LEFT JOIN team_driver td ON td.team_id = t.id
+                    LEFT JOIN driver d ON d.id = td.driver_id
+                    WHERE (t.name LIKE ? OR CAST(t.team_no AS TEXT) LIKE ? OR d.name LIKE ?)
+                      AND (? IS NULL OR c.name = ?)
+                    GROUP BY t.id
+                    ORDER BY t.team_no IS NULL, t.team_no, t.name
+                    LIMIT ?;
+                    """,
+                    conn, params=(like, like, like, like, car_class, car_class, limit)
+                )
+    df = df[cols]
+    df["team_no"] = df["team_no"].astype("Int64")
+    return df
+
+
+@cached
+def get_meta(key: str, default=None):
+    with read_conn() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key=?;", (key,)).fetchone()
+    return row[0] if row else default
 
 
 # ---------- Skrivninger ----------
+# Alle skrivninger går gennem hændelsesloggen (core.eventlog.record), så de kan revideres/afspilles.
 def start_stint(team_id: int, driver_id: int):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        # Slut evt. eksisterende aktiv stint for teamet
-        cur.execute("UPDATE stint SET end_ts=datetime('now') WHERE team_id=? AND end_ts IS NULL;", (team_id,))
-        # Start ny
-        cur.execute(
-            "INSERT INTO stint (team_id, driver_id, start_ts, end_ts) VALUES (?, ?, datetime('now'), NULL);",
-            (team_id, driver_id)
-        )
-        conn.commit()
+    with write_conn() as conn:
+        record(conn, "stint_start", team_id=team_id, driver_id=driver_id)
 
 
 def set_driver_active(team_id: int, driver_id: int, is_active: bool):
-    with get_conn() as conn:
-        conn.execute(
-            "UPDATE team_driver SET is_active=? WHERE team_id=? AND driver_id=?;",
-            (1 if is_active else 0, team_id, driver_id)
-        )
-        conn.commit()
+    with write_conn() as conn:
+        record(conn, "driver_active", team_id=team_id, driver_id=driver_id, is_active=1 if is_active else 0)
 
 
 def set_team_pin(team_id: int, new_pin: str):
-    with get_conn() as conn:
-        conn.execute("UPDATE team SET team_pin=? WHERE id=?;", (new_pin, team_id))
-        conn.commit()
+    with write_conn() as conn:
+        record(conn, "team_set", team_id=team_id, team_pin=new_pin)
 
 def set_team_number(team_id: int, team_no: int | None):
-    with get_conn() as conn:
-        conn.execute("UPDATE team SET team_no=? WHERE id=?;", (team_no, team_id))
-        conn.commit()
+    with write_conn() as conn:
+        record(conn, "team_set", team_id=team_id, team_no=team_no)
 
 def set_team_class(team_id: int, car_class: str):
-    with get_conn() as conn:
-        conn.execute("UPDATE team SET car_class=? WHERE id=?;", (car_class, team_id))
-        conn.commit()
+    with write_conn() as conn:
+        record(conn, "team_set", team_id=team_id, car_class=car_class)
+
+def apply_team_edits(changes: list[dict]) -> int:
+    """Skriv PIN/nummer/klasse-ændringer fra team_edit_diff() i én transaktion."""
+    if not changes:
+        return 0
+    with write_conn() as conn:
+        record_many(conn, "team_set", [dict(c) for c in changes])
+    return len(changes)
+
+def roster_bulk(conn, ops: list[dict]) -> dict:
+    """
+    Anvend roster-operationer i den åbne transaktion på conn (fælles for admin og importers):
+      {"op": "add",    "team_id", "name" | "driver_id", "is_active"=1, "iracing_id"=None, "name_key"=None}
+      {"op": "rename", "driver_id", "name"}
+      {"op": "active", "team_id", "driver_id", "is_active"}
+      {"op": "move",   "from_team_id", "team_id", "driver_id"}
+      {"op": "remove", "team_id", "driver_id"}
+    Nye kørere oprettes først, derefter add → rename → move → active → remove, hver som én
+    batch. Eksisterende kørere genbruges på iracing_id og ellers på normaliseret navn
+    (driver.name_key, se core.dedupe; kan gives færdigberegnet), så "mads kjeldsen " ikke
+    bliver en ny kører; eksisterende hold-tilknytninger springes over. Returnerer antal pr. operation.
+    """
+    drivers_by_irid, drivers_by_key, missing_irid = {}, {}, set()
+    for driver_id, key, irid in conn.execute("SELECT id, name_key, NULLIF(TRIM(iracing_id), '') FROM driver ORDER BY id;"):
+        if irid:
+            drivers_by_irid.setdefault(irid, driver_id)
+        else:
+            missing_irid.add(driver_id)
+        if key:
+            drivers_by_key.setdefault(key, driver_id)
+    links = set(conn.execute("SELECT team_id, driver_id FROM team_driver;").fetchall())
+
+    groups = {"add": [], "rename": [], "move": [], "active": [], "remove": []}
+    set_irid = []
+    created = 0
+    for op in ops:
+        kind = op["op"]
+        if kind == "add":
+            driver_id = op.get("driver_id")
+            irid = str(op.get("iracing_id") or "").strip() or None
+            if driver_id is None:
+                key = op.get("name_key") or name_key(op["name"])
+                driver_id = drivers_by_irid.get(irid) if irid else None
+                if driver_id is None:
+                    driver_id = drivers_by_key.get(key)
+                    # Samme navn men andet iracing_id er en anden person
+                    if driver_id is not None and irid and driver_id not in missing_irid:
+                        driver_id = None
+                if driver_id is None:
+                    driver_id = record(conn, "driver_create", name=op["name"], iracing_id=irid)["driver_id"]
+                    created += 1
+                    drivers_by_key.setdefault(key, driver_id)
+                    if not irid:
+                        missing_irid.add(driver_id)
+                elif irid and driver_id in missing_irid:
+                    set_irid.append({"driver_id": driver_id, "iracing_id": irid})
+                    missing_irid.discard(driver_id)
+                if irid:
+                    drivers_by_irid.setdefault(irid, driver_id)
+            key = (op["team_id"], driver_id)
+            if key not in links:
+                links.add(key)
+                groups["add"].append({"team_id": op["team_id"], "driver_id": driver_id,
+                                      "is_active": int(op.get("is_active", 1))})
+        elif kind == "rename":
+            groups["rename"].append({"driver_id": op["driver_id"], "name": op["name"]})
+        elif kind == "move":
+            groups["move"].append({k: op[k] for k in ("from_team_id", "team_id", "driver_id")})
+            if (op["from_team_id"], op["driver_id"]) in links:
+                links.discard((op["from_team_id"], op["driver_id"]))
+                links.add((op["team_id"], op["driver_id"]))
+        elif kind == "active":
+            groups["active"].append({k: op[k] for k in ("team_id", "driver_id", "is_active")})
+        elif kind == "remove":
+            groups["remove"].append({k: op[k] for k in ("team_id", "driver_id")})
+        else:
+            raise ValueError(f"Ukendt roster-operation: {kind}")
+
+    # Aktiv-status sættes efter add og move; en tilknytning der ikke findes da, rammer ingen række
+    groups["active"] = [p for p in groups["active"] if (p["team_id"], p["driver_id"]) in links]
+
+    kinds = {"add": "team_driver_add", "rename": "driver_set", "move": "team_driver_move",
+             "active": "driver_active", "remove": "team_driver_remove"}
+    if set_irid:
+        record_many(conn, "driver_set", set_irid)
+    for op, payloads in groups.items():
+        if payloads:
+            record_many(conn, kinds[op], payloads)
+    return {"created": created, **{op: len(p) for op, p in groups.items()}}
+
+
+def apply_roster_changes(ops: list[dict]) -> dict:
+    """Skriv en samlet roster-redigering (se roster_bulk) i én transaktion."""
+    if not ops:
+        return {}
+    with write_conn() as conn:
+        return roster_bulk(conn, ops)
+
+def repair_encoding() -> int:
+    """
+    Ret mojibake (fx "Ã¦" → "æ") i team-, klasse- og kørernavne gennem hændelsesloggen.
+    Returnerer antal rettede rækker.
+    """
+    from core.importers import fix_mojibake  # lazy: importers → repo
+
+    fixed = 0
+    with write_conn() as conn:
+        team = pd.read_sql_query("SELECT id, name, car_class FROM team;", conn)
+        for r in team.itertuples():
+            new_name = fix_mojibake(r.name)
+            new_class = fix_mojibake(r.car_class)
+            if new_name != r.name or new_class != r.car_class:
+                record(conn, "team_set", team_id=int(r.id), name=new_name, car_class=new_class)
+                fixed += 1
+        drv = pd.read_sql_query("SELECT id, name FROM driver;", conn)
+        for r in drv.itertuples():
+            new_name = fix_mojibake(r.name)
+            if new_name != r.name:
+                record(conn, "driver_set", driver_id=int(r.id), name=new_name)
+                fixed += 1
+    return fixed
+
+
+# ---------- Løbsstyring ----------
+# Hver operation er én hændelse der rammer alle teams i én transaktion (core.eventlog).
+def _race_ts(ts: str | None) -> str:
+    if not ts:
+        return utc_now()
+    try:
+        return datetime.strptime(ts.strip(), "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ValueError(f"Ugyldigt tidspunkt: {ts} (brug YYYY-MM-DD HH:MM:SS, UTC)") from None
+
+
+def race_green(starters: dict[int, int] | None = None, ts: str | None = None) -> int:
+    """
+    Grønt flag: start alle teams uden aktiv stint. starters = {team_id: driver_id} overstyrer
+    default_starters(); teams uden kører springes over. Returnerer antal startede teams.
+    """
+    chosen = {
+        int(r.team_id): int(r.driver_id)
+        for r in default_starters().itertuples() if not pd.isna(r.driver_id)
+    }
+    chosen.update({int(t): int(d) for t, d in (starters or {}).items()})
+    if not chosen:
+        return 0
+    with write_conn() as conn:
+        p = record(conn, "race_green", ts=_race_ts(ts),
+                   starters=[{"team_id": t, "driver_id": d} for t, d in sorted(chosen.items())])
+    return len(p["starters"])
+
+
+def race_freeze(ts: str | None = None) -> int:
+    """Rødt flag: frys alle aktive stints (pausen tæller ikke som køretid). Returnerer antal stints."""
+    with write_conn() as conn:
+        return record(conn, "race_freeze", ts=_race_ts(ts))["stints"]
+
+
+def race_unfreeze(ts: str | None = None) -> int:
+    """Genstart efter rødt flag: afslut alle igangværende pauser. Returnerer antal stints."""
+    with write_conn() as conn:
+        return record(conn, "race_unfreeze", ts=_race_ts(ts))["stints"]
+
+
+def race_finish(ts: str | None = None) -> int:
+    """Målflag: luk alle åbne stints (og pauser) på præcis ts (UTC). Returnerer antal stints."""
+    with write_conn() as conn:
+        return record(conn, "race_finish", ts=_race_ts(ts))["stints"]
+
+
+def save_class_catalog(df: pd.DataFrame) -> dict:
+    """
+    Gem kataloget fra admin-editoren (kolonner som list_class_catalog; rækker uden id er nye).
+    Klasser der ikke længere er med slettes – men kun hvis ingen teams bruger dem.
+    Aliaser er kommasepareret fri tekst; klassens eget navn er altid et alias.
+    """
+    rows = []
+    for r in df.to_dict("records"):
+        name = " ".join(str(r.get("name") or "").split())
+        if not name:
+            continue
+        rank = r.get("sort_rank")
+        rank = int(rank) if rank is not None and not pd.isna(rank) else None
+        colour = str(r.get("colour") or "").strip() or None
+        if colour and not re.fullmatch(r"#[0-9A-Fa-f]{6}", colour):
+            raise ValueError(f"Ugyldig farve for {name}: {colour} (brug #rrggbb)")
+        aliases = {" ".join(a.upper().split()) for a in str(r.get("aliases") or "").split(",")}
+        rid = r.get("id")
+        rows.append({
+            "id": int(rid) if rid is not None and not pd.isna(rid) else None,
+            "name": name,
+            "sort_rank": rank,
+            "colour": colour,
+            "aliases": (aliases - {""}) | {name.upper()},
+            "is_default": bool(r.get("is_default")),
+        })
+    if not rows:
+        raise ValueError("Kataloget skal have mindst én klasse")
+    names = [r["name"].upper() for r in rows]
+    if len(set(names)) != len(names):
+        raise ValueError("Klassenavne skal være unikke")
+    owner = {}
+    for r in rows:
+        for a in r["aliases"]:
+            if owner.setdefault(a, r["name"]) != r["name"]:
+                raise ValueError(f"Aliaset {a} bruges af både {owner[a]} og {r['name']}")
+    # Manglende sort_rank: efter de øvrige, i editorens rækkefølge
+    next_rank = max((r["sort_rank"] for r in rows if r["sort_rank"] is not None), default=-1) + 1
+    for r in rows:
+        if r["sort_rank"] is None:
+            r["sort_rank"], next_rank = next_rank, next_rank + 1
+    if sum(r["is_default"] for r in rows) != 1:
+        raise ValueError("Præcis én klasse skal være standardklasse")
+
+    with write_conn() as conn:
+        keep = {r["id"] for r in rows if r["id"] is not None}
+        existing = {i for (i,) in conn.execute("SELECT id FROM car_class;")}
+        gone = existing - keep
+        if gone:
+            marks = ",".join("?" for _ in gone)
+            used = conn.execute(
+                f"SELECT c.name FROM car_class c WHERE c.id IN ({marks}) "
+                "AND EXISTS (SELECT 1 FROM team t WHERE t.class_id = c.id) ORDER BY c.sort_rank;",
+                tuple(gone),
+            ).fetchall()
+            if used:
+                raise ValueError("Klassen bruges stadig af teams: " + ", ".join(n for (n,) in used))
+            conn.execute(f"DELETE FROM car_class_alias WHERE class_id IN ({marks});", tuple(gone))
+            conn.execute(f"DELETE FROM car_class WHERE id IN ({marks});", tuple(gone))
+        # sort_rank er unik sammen med id; flyt midlertidigt væk så byttede rækkefølger ikke kolliderer
+        conn.execute("UPDATE car_class SET sort_rank = -1 - sort_rank - 1000000;")
+        for r in rows:
+            values = (r["name"], r["sort_rank"], r["colour"], int(r["is_default"]))
+            if r["id"] in existing:
+                conn.execute(
+                    "UPDATE car_class SET name=?, sort_rank=?, colour=?, is_default=? WHERE id=?;",
+                    (*values, r["id"]),
+                )
+            else:
+                r["id"] = conn.execute(
+                    "INSERT INTO car_class (name, sort_rank, colour, is_default) VALUES (?, ?, ?, ?);",
+                    values,
+                ).lastrowid
+        conn.execute("DELETE FROM car_class_alias;")
+        conn.executemany(
+            "INSERT INTO car_class_alias (alias, class_id) VALUES (?, ?);",
+            [(a, r["id"]) for r in rows for a in sorted(r["aliases"])],
+        )
+    return {"classes": len(rows), "deleted": len(gone)}
+
+
+def set_meta(key: str, value):
+    with write_conn() as conn:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value;",
+            (key, None if value is None else str(value))
+        )
@@ -0,0 +1,250 @@
+# core/snapshots.py
+"""
+Online snapshots af race-databasen og point-in-time gendannelse.
+
+Kopien laves med sqlite3.Connection.backup i små trin (STEP_PAGES sider ad gangen med
+en kort pause imellem), så skrivere under et live løb aldrig blokeres ret længe.
+Hver snapshot gzip'es og registreres i manifest.jsonl (tid, version, varighed, størrelse).
+Planlagte snapshots springes over hvis DB-versionen ikke har flyttet sig siden sidst,
+så kun ændringer koster plads; de ældste ud over RETENTION slettes. Manifestet læses og
+skrives under en fil-lås (admin, CLI og planlæggeren kan ramme det samtidig), og kun én
+replika kører planlæggeren.
+"""
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from core import db
+from core.coherence import change_version
+
+STEP_PAGES = 64          # sider pr. backup-trin
+STEP_SLEEP = 0.002       # pause mellem trin (sek.) så skrivere kan komme til
+RETENTION = int(os.environ.get("RACE_SNAPSHOT_RETENTION", "48"))
+INTERVAL_SEC = int(os.environ.get("RACE_SNAPSHOT_INTERVAL", "300"))
+
+
+def snapshot_dir() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(db.DB_PATH)), "snapshots")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _manifest_path() -> str:
+    return os.path.join(snapshot_dir(), "manifest.jsonl")
+
+
+def _manifest_lock():
+    return db.file_lock(os.path.join(snapshot_dir(), "manifest.lock"))
+
+
+def _read_manifest() -> list[dict]:
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _write_manifest(entries: list[dict]):
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for e in entries:
+            fh.write(json.dumps(e) + "\n")
+    os.replace(tmp, _manifest_path())
+
+
+def _backup(src: sqlite3.Connection, dst: sqlite3.Connection):
+    src.backup(dst, pages=STEP_PAGES, sleep=STEP_SLEEP)
+
+
+# ---------- Snapshot ----------
+def take_snapshot(label: str = "", only_if_changed: bool = False) -> dict | None:
+    """
+    Tag en komprimeret snapshot af den levende DB. Returnerer manifest-posten,
+    eller None hvis only_if_changed og intet er ændret siden seneste snapshot.
+    """
+    with _manifest_lock():
+        return _take_snapshot(label, only_if_changed)
+
+
+def _take_snapshot(label: str, only_if_changed: bool) -> dict | None:
+    entries = _read_manifest()
+    version = change_version()
+    if only_if_changed and entries and entries[-1]["version"] == version:
+        return None
+
+    t0 = time.perf_counter()
+    name = datetime.now().strftime("iracing-%Y%m%d-%H%M%S-%f") + ".db.gz"
+    tmp = os.path.join(snapshot_dir(), name[:-3] + ".tmp")
+    src = db.get_conn()
+    dst = sqlite3.connect(tmp)
+    try:
+        _backup(src, dst)
+    finally:
+        dst.close()
+        src.close()
+    raw_bytes = os.path.getsize(tmp)
+    path = os.path.join(snapshot_dir(), name)
+    with open(tmp, "rb") as fin, gzip.open(path, "wb", compresslevel=6) as fout:
+        shutil.copyfileobj(fin, fout)
+    os.remove(tmp)
+
+    entry = {
+        "name": name,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "label": label,
+        "version": version,
+        "duration_ms": round((time.perf_counter() - t0) * 1000, 1),
+        "raw_bytes": raw_bytes,
+        "bytes": os.path.getsize(path),
+    }
+    entries.append(entry)
+    _prune(entries)
+    return entry
+
+
+def _prune(entries: list[dict]):
+    """Behold de nyeste RETENTION snapshots."""
+    keep = entries[-RETENTION:] if RETENTION > 0 else entries
+    for e in entries[: len(entries) - len(keep)]:
+        path = os.path.join(snapshot_dir(), e["name"])
+        if os.path.exists(path):
+            os.remove(path)
+    _write_manifest(keep)
+
+
+def list_snapshots() -> pd.DataFrame:
+    """Snapshots (nyeste først) der stadig findes på disken."""
+    rows = [e for e in _read_manifest() if os.path.exists(os.path.join(snapshot_dir(), e["name"]))]
+    cols = ["name", "created", "label", "version", "duration_ms", "raw_bytes", "bytes"]
+    return pd.DataFrame(rows[::-1], columns=cols)
+
+
+@contextmanager
+def _opened_snapshot(name: str):
+    """Pak en snapshot ud til en midlertidig fil og giv stien."""
+    path = os.path.join(snapshot_dir(), os.path.basename(name))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Snapshot findes ikke: {name}")
+    # Egen fil pr. kald: admin (diff) og gendannelse kan åbne samme snapshot samtidig
+    fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path)[:-6] + "-", suffix=".open", dir=snapshot_dir())
+    try:
+        with gzip.open(path, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            shutil.copyfileobj(fin, fout)
+        yield tmp
+    finally:
+        os.remove(tmp)
+
+
+# ---------- Gendannelse ----------
+def restore_snapshot(name: str) -> dict:
+    """
+    Gendan den levende DB fra en snapshot. Der tages først en sikkerheds-snapshot,
+    så gendannelsen selv kan fortrydes. Kopien skrives ind via backup-API'et, så
+    andre forbindelser og replikaer ser et konsistent skift.
+    """
+    safety = take_snapshot(label=f"før gendannelse af {name}")
+    before = change_version()
+    with _opened_snapshot(name) as tmp:
+        src = sqlite3.connect(tmp)
+        dst = db.get_conn()
+        try:
+            _backup(src, dst)
+        finally:
+            src.close()
+            dst.close()
+    db.ensure_schema()
+    # Versionen må ikke gå baglæns, ellers kan caches i replikaerne tro de er friske
+    with db.write_conn() as conn:
+        conn.execute("UPDATE change_seq SET seq = MAX(seq, ?) + 1 WHERE id = 1;", (before,))
+    return {"restored": name, "safety_snapshot": safety["name"]}
+
+
+def diff_snapshot(name: str) -> dict:
+    """
+    Sammenlign den levende DB med en snapshot pr. tabel.
+    Returnerer {tabel: DataFrame} med kolonnen 'diff' = 'nu' (tilføjet/ændret siden)
+    eller 'snapshot' (fjernet/før ændring). Kun tabeller med forskelle er med.
+    """
+    out = {}
+    with _opened_snapshot(name) as tmp:
+        conn = db.get_conn()
+        try:
+            conn.execute("ATTACH DATABASE ? AS snap;", (tmp,))
+            for table in db.VERSIONED_TABLES:
+                live_cols = [r[1] for r in conn.execute(f"PRAGMA main.table_info({table});")]
+                snap_cols = [r[1] for r in conn.execute(f"PRAGMA snap.table_info({table});")]
+                cols = ", ".join(c for c in live_cols if c in snap_cols)
+                if not cols:
+                    continue
+                sql = f"""
+                SELECT 'nu' AS diff, * FROM (
+                  SELECT {cols} FROM main.{table} EXCEPT SELECT {cols} FROM snap.{table})
+                UNION ALL
+                SELECT 'snapshot' AS diff, * FROM (
+                  SELECT {cols} FROM snap.{table} EXCEPT SELECT {cols} FROM main.{table})
+                ORDER BY 2, 1;
+                """
+                df = pd.read_sql_query(sql, conn)
+                if not df.empty:
+                    out[table] = df
+            conn.execute("DETACH DATABASE snap;")
+        finally:
+            conn.close()
+    return out
+
+
+# ---------- Planlægning ----------
+class SnapshotScheduler:
+    """
+    Baggrundstråd der tager en snapshot hvert INTERVAL_SEC hvis DB'en er ændret – kun i den
+    replika der har rollen db.lead("snapshots"); de andre ser efter om den er blevet ledig.
+    """
+
+    def __init__(self, interval: float = INTERVAL_SEC):
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not db.lead("snapshots"):
+                continue
+            try:
+                take_snapshot(label="planlagt", only_if_changed=True)
+                self.last_error = None
+            except Exception as e:  # snapshot må aldrig vælte serveren
+                self.last_error = str(e)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler() -> SnapshotScheduler | None:
+    """Start planlagte snapshots én gang pr. proces (INTERVAL_SEC=0 slår dem fra)."""
+    global _scheduler
+    if INTERVAL_SEC <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SnapshotScheduler()
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,111 @@
+# core/stats.py
+"""
+Statistik-tavle til spectate: pr. team og pr. klasse.
+
+Tallene ligger færdigberegnet i team_stats og class_stats (db._ensure_race_stats). Triggers
+genberegner kun det team en stint, pause eller klasseændring rører, og fører forskellen
+videre til klassens række, så en visning er et opslag i ~60 + ~5 rækker i stedet for en
+aggregering over alle stints og pauser – uanset hvor mange storskærme der kigger med.
+
+Det der ændrer sig hvert sekund (tid siden sidste skift, den kørende stints længde) gemmes
+ikke; rækkerne har ankre (last_change_ts, open_start_ts, open_paused_sec, open_pause_ts), og
+live_columns() regner urene ud ved visning. Derfor kan board-funktionerne caches (@cached)
+indtil næste skrivning, mens urene stadig går.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.coherence import cached
+from core.db import read_conn
+
+TEAM_BOARD_COLUMNS = [
+    "team_id", "team_no", "team_name", "car_class", "class_colour", "stints", "closed_stints",
+    "closed_sec", "drivers_used", "open_stints", "last_change_ts", "open_start_ts",
+    "open_paused_sec", "open_pause_ts",
+]
+
+
+def refresh(conn):
+    """Genberegn alle rækker fra bunden (efter eventlog.rebuild, eller ved manglende rækker)."""
+    conn.execute("DELETE FROM team_stats;")
+    conn.execute("DELETE FROM class_stats;")
+    conn.execute("INSERT INTO team_stats SELECT * FROM team_stats_calc;")
+
+
+# ---------- Læsninger ----------
+@cached
+def team_board(car_class: str | None = None) -> pd.DataFrame:
+    """Team-rækkerne (TEAM_BOARD_COLUMNS) i gridets rækkefølge; uden ure – se live_columns()."""
+    where = "WHERE c.name = ?" if car_class else ""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT ts.team_id, t.team_no, t.name AS team_name, c.name AS car_class,
+                   c.colour AS class_colour, ts.stints, ts.closed_stints, ts.closed_sec,
+                   ts.drivers_used, ts.open_stints, ts.last_change_ts, ts.open_start_ts,
+                   ts.open_paused_sec, ts.open_pause_ts
+            FROM team_stats ts
+            JOIN team t ON t.id = ts.team_id
+            LEFT JOIN car_class c ON c.id = ts.class_id
+            {where}
+            ORDER BY c.sort_rank IS NULL, c.sort_rank, c.id, t.team_no IS NULL, t.team_no, t.name;
+            """,
+            conn,
+            params=(car_class,) if car_class else (),
+        )
+    df["team_no"] = df["team_no"].astype("Int64")
+    return df[TEAM_BOARD_COLUMNS]
+
+
+@cached
+def class_board() -> pd.DataFrame:
+    """Klasse-rækkerne: car_class, class_colour, teams, running, stints, drivers_used, avg_stint_sec."""
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            """
+            SELECT COALESCE(c.name, '-') AS car_class, c.colour AS class_colour, cs.teams,
+                   cs.open_stints AS running, cs.stints, cs.closed_stints, cs.closed_sec,
+                   cs.drivers_used
+            FROM class_stats cs
+            LEFT JOIN car_class c ON c.id = cs.class_id
+            WHERE cs.teams > 0
+            ORDER BY c.sort_rank IS NULL, c.sort_rank, c.id;
+            """,
+            conn,
+        )
+    df["avg_stint_sec"] = df["closed_sec"] / df["closed_stints"].where(df["closed_stints"] > 0)
+    return df.drop(columns=["closed_stints", "closed_sec"])
+
+
+# ---------- Ure ----------
+_EPOCH = pd.Timestamp(0, tz="UTC")
+
+
+def _epoch(col: pd.Series) -> np.ndarray:
+    """UTC-tidsstempler ('YYYY-MM-DD HH:MM:SS') som epoch-sek.; NaN for NULL."""
+    return (pd.to_datetime(col, utc=True, errors="coerce") - _EPOCH).dt.total_seconds().to_numpy(dtype=float)
+
+
+def live_columns(board: pd.DataFrame, now: float | None = None) -> pd.DataFrame:
+    """
+    Ren beregning (ingen DB) på team_board(): tilføjer
+      - since_change_sec  tid siden teamets seneste stintskift
+      - stint_sec         den kørende stints køretid (står stille under rødt flag)
+      - driven_sec        samlet køretid inkl. den kørende stint
+      - avg_stint_sec     gennemsnitlig længde af de afsluttede stints
+    """
+    now = time.time() if now is None else now
+    last = _epoch(board["last_change_ts"])
+    start = _epoch(board["open_start_ts"])
+    paused_at = _epoch(board["open_pause_ts"])
+    stint = np.where(np.isnan(paused_at), now, paused_at) - start - board["open_paused_sec"].to_numpy(dtype=float)
+    stint = np.clip(stint, 0, None)
+    closed = board["closed_sec"].to_numpy(dtype=float)
+    return board.assign(
+        since_change_sec=now - last,
+        stint_sec=stint,
+        driven_sec=closed + np.nan_to_num(stint),
+        avg_stint_sec=closed / board["closed_stints"].where(board["closed_stints"] > 0),
+    )
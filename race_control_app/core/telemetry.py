@@ -0,0 +1,238 @@
+# core/telemetry.py
+"""
+Ressource-telemetri til servere der kører uovervåget i 24+ timer.
+
+En baggrundstråd tager hvert INTERVAL_SEC en måling af processen og lægger den i en
+ringbuffer (RING_SIZE målinger, standard 24 timer á 1 minut):
+
+  - rss_mb        processens resident memory (/proc/self/status, ellers ru_maxrss)
+  - fds           åbne filhåndtag (/proc/self/fd)
+  - sqlite_conns  åbne forbindelser til databasefilen (filhåndtag der peger på db.DB_PATH)
+  - sessions      Streamlit-sessioner set inden for SESSION_TTL_SEC (touch_session fra app.py)
+  - threads, gc_objects
+
+Med tracemalloc slået til (RACE_TRACEMALLOC=1 eller set_tracing(True)) gemmer hver måling
+også de TOP_N kodelinjer hvis allokeringer er vokset mest siden forrige måling – det er
+dem man kigger på, hvis rss_mb kryber opad kl. 3 om natten.
+"""
+import gc
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from core import db
+
+INTERVAL_SEC = float(os.environ.get("RACE_TELEMETRY_SEC", "60"))
+RING_SIZE = int(os.environ.get("RACE_TELEMETRY_RING", "1440"))
+SESSION_TTL_SEC = 90.0   # en spectate-session rerunner hvert sekund; 90 sek. uden = væk
+TOP_N = 10
+
+_ring = deque(maxlen=RING_SIZE)
+_ring_lock = threading.Lock()
+_sessions: dict = {}
+_trace_state = {"snapshot": None}
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ---------- Målinger ----------
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource  # fallback uden /proc: højeste RSS (KB på Linux)
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _open_files() -> tuple[int | None, int | None]:
+    """(åbne filhåndtag, heraf forbindelser til databasefilen); None uden /proc."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None, None
+    path = os.path.realpath(db.DB_PATH)
+    conns = 0
+    for fd in fds:
+        try:
+            if os.readlink(f"/proc/self/fd/{fd}") == path:
+                conns += 1
+        except OSError:  # lukket mens vi kiggede
+            continue
+    return len(fds), conns
+
+
+def touch_session(session_id: str):
+    """Kaldes af app.py ved hver rerun; tæller aktive sessioner."""
+    now = time.monotonic()
+    with _ring_lock:
+        _sessions[session_id] = now
+        for sid in [s for s, seen in _sessions.items() if now - seen > SESSION_TTL_SEC]:
+            del _sessions[sid]
+
+
+def active_sessions() -> int:
+    now = time.monotonic()
+    with _ring_lock:
+        return sum(1 for seen in _sessions.values() if now - seen <= SESSION_TTL_SEC)
+
+
+def tracing() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def set_tracing(enabled: bool):
+    """Slå tracemalloc til/fra (koster ca. 10-30 % CPU på allokeringer mens det er slået til)."""
+    if enabled and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_state["snapshot"] = None
+
+
+def _short_path(filename: str) -> str:
+    """Sti fra appens rod eller fra site-packages, så tabellen kan læses."""
+    for marker in (os.sep + "site-packages" + os.sep, _APP_ROOT + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+def _top_growth() -> list[dict]:
+    """De TOP_N linjer der er vokset mest siden forrige måling (tom ved første måling)."""
+    if not tracemalloc.is_tracing():
+        return []
+    snap = tracemalloc.take_snapshot()
+    prev, _trace_state["snapshot"] = _trace_state["snapshot"], snap
+    if prev is None:
+        return []
+    # compare_to sorterer efter |size_diff|, så store fald kan ligge foran vækst: filtrér og sortér selv
+    grown = sorted((s for s in snap.compare_to(prev, "lineno") if s.size_diff > 0),
+                   key=lambda s: s.size_diff, reverse=True)
+    out = []
+    for stat in grown:
+        frame = stat.traceback[0]
+        if len(out) >= TOP_N:
+            break
+        if frame.filename == tracemalloc.__file__:
+            continue
+        out.append({
+            "where": f"{_short_path(frame.filename)}:{frame.lineno}",
+            "growth_kb": round(stat.size_diff / 1024, 1),
+            "size_kb": round(stat.size / 1024, 1),
+            "blocks": stat.count_diff,
+        })
+    return out
+
+
+def sample(allocations: bool = True) -> dict:
+    """
+    Tag én måling nu og læg den i ringbufferen. allocations=False springer tracemalloc-
+    sammenligningen over (den gennemløber alle sporede allokeringer og tager op til et sekund).
+    """
+    fds, conns = _open_files()
+    row = {
+        "ts": time.time(),
+        "rss_mb": round(_rss_mb(), 1),
+        "fds": fds,
+        "sqlite_conns": conns,
+        "sessions": active_sessions(),
+        "threads": threading.active_count(),
+        "gc_objects": len(gc.get_objects()),
+        "traced_mb": round(tracemalloc.get_traced_memory()[0] / 2**20, 1) if tracemalloc.is_tracing() else None,
+        "top_growth": _top_growth() if allocations else [],
+    }
+    with _ring_lock:
+        _ring.append(row)
+    return row
+
+
+# ---------- Læsninger ----------
+def history() -> pd.DataFrame:
+    """Ringbufferen som DataFrame (ældste først); ts som UTC-datetime, uden top_growth."""
+    with _ring_lock:
+        rows = list(_ring)
+    df = pd.DataFrame(rows, columns=[
+        "ts", "rss_mb", "fds", "sqlite_conns", "sessions", "threads", "gc_objects", "traced_mb", "top_growth",
+    ])
+    df["ts"] = pd.to_datetime(df["ts"], unit="s")
+    return df.drop(columns="top_growth")
+
+
+def latest() -> dict | None:
+    with _ring_lock:
+        return _ring[-1] if _ring else None
+
+
+def trend(metric: str = "rss_mb", skip: float = 0.25) -> float:
+    """
+    Hældning for metric pr. time over ringbufferen (mindste kvadraters metode), efter at de
+    første `skip` af målingerne (opvarmning: imports, caches) er sprunget over.
+    """
+    with _ring_lock:
+        pts = [(r["ts"], r[metric]) for r in _ring if r[metric] is not None]
+    pts = pts[int(len(pts) * skip):]
+    if len(pts) < 3 or pts[-1][0] <= pts[0][0]:
+        return 0.0
+    t, v = np.array(pts, dtype=float).T
+    return float(np.polyfit((t - t[0]) / 3600, v, 1)[0])
+
+
+def clear():
+    with _ring_lock:
+        _ring.clear()
+    _trace_state["snapshot"] = None
+
+
+# ---------- Baggrundstråd ----------
+class TelemetrySampler:
+    """Tager en måling hvert INTERVAL_SEC."""
+
+    def __init__(self, interval: float = INTERVAL_SEC):
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                sample()
+                self.last_error = None
+            except Exception as e:  # telemetrien må aldrig vælte serveren
+                self.last_error = str(e)
+            if self._stop.wait(self.interval):
+                return
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def start_sampler() -> TelemetrySampler | None:
+    """Start målingerne én gang pr. proces (RACE_TELEMETRY_SEC=0 slår dem fra)."""
+    global _sampler
+    if INTERVAL_SEC <= 0:
+        return None
+    with _sampler_lock:
+        if _sampler is None:
+            if os.environ.get("RACE_TRACEMALLOC", "").lower() in ("1", "true", "yes"):
+                set_tracing(True)
+            _sampler = TelemetrySampler().start()
+        return _sampler
@@ -0,0 +1,164 @@
+# core/timeline.py
+"""
+Stint-tidslinje (Gantt) for hele feltet.
+
+stint_timeline() returnerer stints pr. team klippet til et tidsvindue, allerede reduceret
+til det der kan ses i den ønskede bredde: stints kortere end MIN_BAR_PX pixels (fx
+flimmer-skift eller korte pit-stints når hele 24t vises) lægges sammen med naboerne til én
+"bin" pr. team, så antallet af rækker er begrænset af bredden – ikke af antal stints.
+Zoomer man ind, bliver de samme stints igen til enkelte barer.
+
+Resultatet caches pr. (vindue, bredde, klasse, minut) og DB-version (@cached); åbne stints
+klippes ved "nu" rundet ned til hele minutter, så et vindue kan genbruges inden for samme
+minut. Minuttet afgøres uden for cachen og gives med som argument (som planner.team_plan),
+ellers ville et cachet vindue blive stående på det minut det først blev beregnet i.
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from core.coherence import cached
+from core.db import read_conn
+
+DEFAULT_WIDTH_PX = 1200
+MIN_BAR_PX = 2.0          # smallere stints samles i bins
+
+TIMELINE_COLUMNS = [
+    "team_id", "team_no", "team_name", "car_class", "class_colour", "lane",
+    "start", "end", "driver", "stints", "is_open",
+]
+
+
+def _epoch(ts: str) -> float:
+    return datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+def _ts(epoch) -> str:
+    return datetime.fromtimestamp(float(epoch), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _now_minute() -> float:
+    return float(int(time.time()) // 60 * 60)
+
+
+# ---------- Vindue ----------
+def race_window(now_minute: float | None = None) -> tuple[float, float]:
+    """(start, slut) i epoch-sek. for hele løbet: planens løbsstart/-længde, ellers stint-historikken."""
+    return _race_window(_now_minute() if now_minute is None else now_minute)
+
+
+@cached
+def _race_window(now: float) -> tuple[float, float]:
+    from core.planner import get_plan_config  # lazy: planner → repo
+
+    cfg = get_plan_config()
+    with read_conn() as conn:
+        first, last, open_ = conn.execute(
+            "SELECT MIN(start_ts), MAX(COALESCE(end_ts, start_ts)), MAX(end_ts IS NULL) FROM stint;"
+        ).fetchone()
+    if cfg["race_start"]:
+        start = _epoch(cfg["race_start"])
+        return start, start + float(cfg["race_hours"]) * 3600
+    if first is None:
+        return now - 3600, now
+    # Kører der stadig nogen, går løbet frem til nu
+    return _epoch(first), max(_epoch(last), now) if open_ else _epoch(last)
+
+
+# ---------- Binning ----------
+def bin_stints(df: pd.DataFrame, start: float, end: float, width_px: int) -> pd.DataFrame:
+    """
+    Ren beregning (ingen DB): klip stints (team_id, lane, start, end, driver, is_open; epoch)
+    til [start, end] og saml stints under MIN_BAR_PX pixels der ligger op ad hinanden
+    (mellemrum under én pixel) i samme team til én bin.
+    """
+    if df.empty:
+        return df.assign(stints=pd.Series(dtype="int64"))
+    px_sec = (end - start) / max(int(width_px), 1)
+    df = df.assign(start=df["start"].clip(lower=start), end=df["end"].clip(upper=end))
+    df = df[df["end"] > df["start"]].sort_values(["lane", "start"], kind="stable")
+
+    lane = df["lane"].to_numpy()
+    s, e = df["start"].to_numpy(), df["end"].to_numpy()
+    small = (e - s) < MIN_BAR_PX * px_sec
+    new_bin = np.ones(len(df), dtype=bool)
+    if len(df) > 1:
+        # Fortsæt en bin når både denne og forrige stint er små, samme team og uden synligt hul
+        joins = small[1:] & small[:-1] & (lane[1:] == lane[:-1]) & (s[1:] - e[:-1] < px_sec)
+        new_bin[1:] = ~joins
+    group = np.cumsum(new_bin)
+
+    out = df.assign(_bin=group, stints=1).groupby("_bin", sort=False).agg({
+        **{c: "first" for c in df.columns if c not in ("start", "end", "driver", "is_open")},
+        "start": "min",
+        "end": "max",
+        "driver": "first",
+        "is_open": "max",
+        "stints": "sum",
+    })
+    many = out["stints"] > 1
+    out.loc[many, "driver"] = out.loc[many, "stints"].map(lambda n: f"{n} korte stints")
+    return out.reset_index(drop=True)
+
+
+# ---------- API ----------
+def stint_timeline(
+    start: float | None = None,
+    end: float | None = None,
+    width_px: int = DEFAULT_WIDTH_PX,
+    car_class: str | None = None,
+    now_minute: float | None = None,
+) -> pd.DataFrame:
+    """
+    Stints pr. team i vinduet [start, end] (epoch-sek., standard hele løbet) til en
+    tidslinje width_px pixels bred. Kolonner: TIMELINE_COLUMNS; start/end er UTC-datetimes,
+    lane er teamets plads i rækkefølgen (klasse → nummer → navn) som i Spectate.
+    Åbne stints slutter ved now_minute (standard: nu rundet ned til hele minutter).
+    """
+    now = _now_minute() if now_minute is None else now_minute
+    if start is None or end is None:
+        race_start, race_end = race_window(now)
+        start = race_start if start is None else start
+        end = race_end if end is None else end
+    return _stint_timeline(start, end, width_px, car_class, now)
+
+
+@cached
+def _stint_timeline(start: float, end: float, width_px: int, car_class: str | None, now: float) -> pd.DataFrame:
+    now_ts = _ts(now)
+    where = "AND c.name = ?" if car_class else ""
+    params = (now_ts, _ts(end), now_ts, _ts(start), *((car_class,) if car_class else ()))
+    with read_conn() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT s.team_id, t.team_no, t.name AS team_name, c.name AS car_class,
+                   c.colour AS class_colour, c.sort_rank,
+                   CAST(strftime('%s', s.start_ts) AS REAL) AS start,
+                   CAST(strftime('%s', COALESCE(s.end_ts, ?)) AS REAL) AS end,
+                   d.name AS driver, s.end_ts IS NULL AS is_open
+            FROM stint s
+            JOIN team t ON t.id = s.team_id
+            LEFT JOIN car_class c ON c.id = t.class_id
+            LEFT JOIN driver d ON d.id = s.driver_id
+            WHERE s.start_ts < ? AND COALESCE(s.end_ts, ?) > ? {where};
+            """,
+            conn,
+            params=params,
+        )
+    if df.empty:
+        return pd.DataFrame(columns=TIMELINE_COLUMNS)
+
+    teams = (df[["team_id", "sort_rank", "team_no", "team_name"]].drop_duplicates("team_id")
+             .assign(_no_missing=lambda x: x["team_no"].isna())
+             .sort_values(["sort_rank", "_no_missing", "team_no", "team_name"], na_position="last"))
+    df["lane"] = df["team_id"].map(dict(zip(teams["team_id"], range(len(teams)))))
+    df["driver"] = df["driver"].fillna("-")
+
+    out = bin_stints(df.drop(columns="sort_rank"), start, end, width_px)
+    out["start"] = pd.to_datetime(out["start"], unit="s")
+    out["end"] = pd.to_datetime(out["end"], unit="s")
+    out["team_no"] = out["team_no"].astype("Int64")
+    out["is_open"] = out["is_open"].astype(bool)
+    return out[TIMELINE_COLUMNS].sort_values(["lane", "start"]).reset_index(drop=True)
@@ -1,36 +1,53 @@
 # ui/admin.py — alt UI er indkapslet i admin_panel()
-import os
+import math
 import pandas as pd
 import streamlit as st
 
-from core.db import DB_PATH, ensure_schema, get_conn
+from core.db import reset_db
 from core.importers import (
     import_wide_csv, import_csv_to_db,
-    fetch_public_sheet_as_df, guess_column
+    fetch_sheets, import_tabs, guess_column, guess_tab, stage_batch, import_staging,
+    CANDIDATE_TEAM, CANDIDATE_CLASS, CANDIDATE_TEAM_NO,
+)
+from core.archive import (
+    archive_current_event, current_event_name, list_archives, cross_event_driver_stats
+)
+from core.dedupe import DEFAULT_THRESHOLD, apply_merges, suggest_merges
+from core.eventlog import event_history, rebuild, utc_now
+from core.planner import get_plan_config, set_plan_config, plan_field
+from core.feed import get_runner
+from core import admission, integrity, laps, telemetry
+from ui.timeline import timeline_section
+from core.snapshots import (
+    take_snapshot, list_snapshots, restore_snapshot, diff_snapshot
 )
 from core.repo import (
     list_car_classes, list_teams, team_drivers, current_stint,
-    stint_history, start_stint, set_driver_active, set_team_pin
+    stint_history, start_stint, set_meta,
+    count_teams, teams_page, team_edit_diff, apply_team_edits,
+    roster_edit_diff, apply_roster_changes, search,
+    list_class_catalog, save_class_catalog,
+    race_status, default_starters, active_roster, race_green, race_freeze, race_unfreeze, race_finish,
+    repair_encoding,
 )
 
-# Kolonne-heuristikker
-CANDIDATE_TEAM    = ["team", "team name", "team_name", "hold", "holdnavn"]
-CANDIDATE_CLASS   = ["class", "car_class", "klasse", "bilklasse", "car category"]
-CANDIDATE_DRIVER  = ["driver", "driver name", "driver_name", "kører", "koerer"]
-CANDIDATE_TEAM_NO = ["car no", "car no.", "number", "start no", "start nr", "team no", "team nr"]
+# Rækker pr. side i team-editoren (PIN/nummer/klasse)
+TEAM_EDIT_PAGE_SIZE = 50
 
-
-def _teams_with_pins_df() -> pd.DataFrame:
-    with get_conn() as conn:
-        return pd.read_sql_query(
-            "SELECT id, name, car_class, COALESCE(team_pin,'1234') AS team_pin "
-            "FROM team ORDER BY name;", conn
-        )
+# Maks. antal søgeresultater i team-vælgeren
+TEAM_PICK_LIMIT = 50
 
 
 def admin_panel():
     st.header("ADMIN")
 
+    # Integritets-badge (tallene fra seneste tjek; baggrundstjekket holder dem ajour)
+    health = integrity.status()
+    if health["issues"]:
+        st.error(f"🔴 Integritet: {health['issues']} problem(er) – se \"🩺 Dataintegritet\" nedenfor")
+    else:
+        st.caption(f"🟢 Integritet OK · tjekket {health['last_run'] or 'aldrig'} ({health['last_ms']:.0f} ms)")
+
     # ─────────────────────────────────────────────────────────────────────────────
     # 1) Importér database (lokal CSV)
     # ─────────────────────────────────────────────────────────────────────────────
@@ -99,9 +116,10 @@ def admin_panel():
     # 1b) Importér fra Google Sheets (offentlig)
     # ─────────────────────────────────────────────────────────────────────────────
     with st.expander("📄 Importér fra Google Sheets (offentlig læsning)", expanded=False):
-        st.caption("Gør arket sharebart (Viewer). Indsæt **kun** Spreadsheet ID og **gid** (fanebladstal).")
+        st.caption("Gør arket sharebart (Viewer). Indsæt **kun** Spreadsheet ID og **gid** (fanebladstal). "
+                   "Flere faner (fx én pr. klasse) hentes samtidigt og importeres samlet.")
         gs_id = st.text_input("Spreadsheet ID (fra URL: .../d/<ID>/edit#gid=...)", key="gs_id").strip()
-        gid   = st.text_input("gid (fra URL: ...gid=<gid>)", value="0", key="gs_gid").strip()
+        gids  = st.text_input("gid'er, kommasepareret (fra URL: ...gid=<gid>)", value="0", key="gs_gid").strip()
 
         mode2 = st.radio(
             "CSV-format",
@@ -110,32 +128,78 @@ def admin_panel():
         )
 
         if st.button("Hent & importér fra Google Sheets", key="gs_fetch_btn"):
-            try:
-                df = fetch_public_sheet_as_df(gs_id, gid)
-                st.write("Forhåndsvisning:", df.head())
-                cols = df.columns.tolist()
-
-                guess_team     = guess_column(cols, CANDIDATE_TEAM)  or cols[0]
-                guess_class    = guess_column(cols, CANDIDATE_CLASS) or cols[1]
-                guess_team_no  = guess_column(cols, CANDIDATE_TEAM_NO)
-                driver_candidates = [c for c in cols if any(k in c.lower() for k in ["driver","kører","koerer"])] or cols[2:]
-
-                if mode2.startswith("Bredt"):
-                    import_wide_csv(
-                        df, col_team=guess_team, col_class=guess_class,
-                        driver_cols=driver_candidates, col_team_no=guess_team_no
-                    )
-                else:
-                    col_driver = guess_column(cols, CANDIDATE_DRIVER) or driver_candidates[0]
-                    import_csv_to_db(
-                        df, col_team=guess_team, col_driver=col_driver,
-                        col_class=guess_class, col_irid=None, col_team_no=guess_team_no
-                    )
+            sources = [(gs_id, g.strip()) for g in gids.split(",") if g.strip()]
+            results = fetch_sheets(sources)
+            st.dataframe(
+                pd.DataFrame([{
+                    "gid": r["gid"], "status": r["status"], "kb": round(r["bytes"] / 1024, 1), "ms": r["ms"],
+                    "rækker": 0 if r["df"] is None else len(r["df"]), "fejl": "" if r["error"] is None else str(r["error"]),
+                } for r in results]),
+                use_container_width=True, hide_index=True,
+            )
+            failed = [r for r in results if r["error"] is not None]
+            if not results:
+                st.error("Angiv mindst én gid.")
+            elif failed:
+                st.error("Ingen faner importeret – ret fejlene ovenfor og prøv igen.")
+            else:
+                try:
+                    tabs = [guess_tab(r["df"], "wide" if mode2.startswith("Bredt") else "long") for r in results]
+                    n = import_tabs(tabs)
+                    st.success(f"Import fra Google Sheets fuldført ✅ ({n} faner i én transaktion)")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Kunne ikke importere fra Google Sheets: {e}")
 
-                st.success("Import fra Google Sheets fuldført ✅")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Kunne ikke importere fra Google Sheets: {e}")
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 1c) Batch-import (mange filer eller zip, fx én fil pr. team/klasse i en afdeling)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("📚 Batch-import (mange CSV-filer eller zip)", expanded=False):
+        st.caption("Filerne læses og valideres parallelt; kolonnerne gættes pr. fil. Gennemse "
+                   "fejl og dubletter, og importér derefter alt i én transaktion.")
+        batch_files = st.file_uploader("Vælg CSV- eller zip-filer", type=["csv", "zip"],
+                                       accept_multiple_files=True, key="batch_files")
+        batch_mode = st.radio(
+            "CSV-format",
+            ["Bredt ark (Driver name 1..N)", "Langt ark (én driver pr. række)"],
+            index=0, key="batch_mode"
+        )
+        if batch_files and st.button("🔎 Læs og valider", key="batch_stage_btn"):
+            st.session_state.batch_stage = stage_batch(
+                [(f.name, f.getvalue()) for f in batch_files],
+                "wide" if batch_mode.startswith("Bredt") else "long",
+            )
+        staged = st.session_state.get("batch_stage")
+        if staged:
+            st.dataframe(
+                pd.DataFrame([{
+                    "fil": r["file"], "rækker": r["rows"], "staged": r["staged"], "ms": r["ms"],
+                    "fejl": r["error_count"], "første fejl": "; ".join(r["errors"][:3]),
+                } for r in staged["files"]]),
+                use_container_width=True, hide_index=True,
+            )
+            st.caption(f"{len(staged['files'])} filer på {staged['ms']:.0f} ms ({staged['workers']} processer) · "
+                       f"{len(staged['staging'])} rækker · {staged['duplicates']} dubletter fjernet")
+            if staged["conflicts"]:
+                st.warning("Samme team med forskellige værdier – første fil vinder:\n" + "\n".join(
+                    f"- {c['team']} ({c['field']}): {', '.join(c['values'])}" for c in staged["conflicts"]
+                ))
+            st.dataframe(staged["staging"].drop(columns=["team_key", "driver_key"]).head(200),
+                         use_container_width=True, hide_index=True)
+            c1, c2 = st.columns(2)
+            with c1:
+                if st.button("📥 Importér alt i én transaktion", type="primary", key="batch_import_btn",
+                             disabled=staged["staging"].empty):
+                    try:
+                        res = import_staging(staged["staging"])
+                        st.session_state.pop("batch_stage", None)
+                        st.success(f"Importeret ✅ {res['teams']} teams, {res['roster']['created']} nye kørere")
+                    except Exception as e:
+                        st.error(f"Import fejl: {e}")
+            with c2:
+                if st.button("Kassér", key="batch_discard_btn"):
+                    st.session_state.pop("batch_stage", None)
+                    st.rerun()
 
     # ─────────────────────────────────────────────────────────────────────────────
     # 2) Slet hele databasen (danger zone)
@@ -153,10 +217,9 @@ def admin_panel():
                 st.error("Bekræft ved at skrive **DELETE**.")
             else:
                 try:
-                    if os.path.exists(DB_PATH):
-                        os.remove(DB_PATH)
-                    ensure_schema()
-                    st.success("Databasen er slettet og genskabt tom ✅")
+                    snap = take_snapshot(label="før sletning")
+                    reset_db()
+                    st.success(f"Databasen er slettet og genskabt tom ✅ (snapshot: {snap['name']})")
                     st.rerun()
                 except Exception as e:
                     st.error(f"Kunne ikke slette databasen: {e}")
@@ -164,6 +227,391 @@ def admin_panel():
                     df = pd.read_csv(file, encoding="utf-8-sig")
 
 
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2b) Snapshots og gendannelse
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("💾 Snapshots og gendannelse", expanded=False):
+        st.caption("Snapshots tages online i små trin og blokerer ikke holdenes skrivninger. "
+                   "Planlagte snapshots tages kun når databasen er ændret.")
+        if st.button("📸 Tag snapshot nu", key="snap_take_btn"):
+            try:
+                snap = take_snapshot(label="manuel")
+                st.success(f"Snapshot {snap['name']} – {snap['duration_ms']} ms, "
+                           f"{snap['bytes'] / 1024:.1f} KB (rå {snap['raw_bytes'] / 1024:.1f} KB)")
+            except Exception as e:
+                st.error(f"Snapshot fejlede: {e}")
+
+        snaps = list_snapshots()
+        if snaps.empty:
+            st.info("Ingen snapshots endnu.")
+        else:
+            view = snaps.assign(
+                kb=(snaps["bytes"] / 1024).round(1),
+                raw_kb=(snaps["raw_bytes"] / 1024).round(1),
+            )[["created", "label", "duration_ms", "kb", "raw_kb", "name"]]
+            st.dataframe(view, use_container_width=True, hide_index=True)
+
+            chosen = st.selectbox("Vælg snapshot", snaps["name"].tolist(), key="snap_select")
+            colA, colB = st.columns(2)
+            with colA:
+                if st.button("🔍 Diff mod nu", key="snap_diff_btn"):
+                    try:
+                        diff = diff_snapshot(chosen)
+                        if not diff:
+                            st.success("Ingen forskelle.")
+                        for table, df_diff in diff.items():
+                            st.markdown(f"**{table}** – {len(df_diff)} rækker "
+                                        "('nu' = tilføjet/ændret, 'snapshot' = før/fjernet)")
+                            st.dataframe(df_diff, use_container_width=True, hide_index=True)
+                    except Exception as e:
+                        st.error(f"Diff fejlede: {e}")
+            with colB:
+                confirm_restore = st.checkbox("Jeg vil overskrive den levende database", key="snap_restore_confirm")
+                if st.button("⏪ Gendan snapshot", disabled=not confirm_restore, key="snap_restore_btn"):
+                    try:
+                        res = restore_snapshot(chosen)
+                        st.success(f"Gendannet ✅ (sikkerheds-snapshot: {res['safety_snapshot']})")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Gendannelse fejlede: {e}")
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2c) Events og arkiv
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🏁 Events og arkiv", expanded=False):
+        event_name = st.text_input("Navn på aktuelt event", value=current_event_name(), key="event_name")
+        if st.button("Gem eventnavn", key="event_name_btn"):
+            set_meta("event_name", event_name.strip())
+            st.success("Eventnavn gemt.")
+
+        st.caption("Arkivering flytter teams, kørere og stints til en arkivfil og giver et tomt event. "
+                   "Historikken kan stadig ses nedenfor.")
+        confirm_archive = st.checkbox("Eventet er slut – arkivér det", key="event_archive_confirm")
+        if st.button("📦 Afslut og arkivér event", disabled=not confirm_archive, key="event_archive_btn"):
+            try:
+                info = archive_current_event(event_name.strip() or None)
+                st.success(f"Arkiveret som {info['file']} ({info['team']} teams, {info['stint']} stints) ✅")
+                st.rerun()
+            except Exception as e:
+                st.error(f"Arkivering fejlede: {e}")
+
+        archives = list_archives()
+        if archives.empty:
+            st.info("Ingen arkiverede events endnu.")
+        else:
+            st.dataframe(archives, use_container_width=True, hide_index=True)
+        if st.button("📊 Kørerstatistik på tværs af events", key="event_stats_btn"):
+            stats = cross_event_driver_stats()
+            if stats.empty:
+                st.info("Ingen stints registreret endnu.")
+            else:
+                st.dataframe(stats, use_container_width=True, hide_index=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2d) Dubletter blandt kørere
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🧬 Dubletter blandt kørere", expanded=False):
+        st.caption("Finder kørere der sandsynligvis er samme person (samme iRacing-id, samme navn "
+                   "uden accenter/mellemrum, eller meget ens navn). Sammenlægning flytter hold og "
+                   "stints over på den beholdte kører.")
+        threshold = st.slider("Lighedsgrænse", 0.75, 1.0, DEFAULT_THRESHOLD, 0.01, key="dedupe_threshold")
+        if st.button("🔎 Find dubletter", key="dedupe_find_btn"):
+            st.session_state["dedupe_suggestions"] = suggest_merges(threshold).assign(merge=True)
+
+        suggestions = st.session_state.get("dedupe_suggestions")
+        if suggestions is not None:
+            if suggestions.empty:
+                st.success("Ingen dubletter fundet.")
+            else:
+                with st.form("dedupe_form"):
+                    edited = st.data_editor(
+                        suggestions,
+                        use_container_width=True,
+                        hide_index=True,
+                        disabled=["keep_id", "keep_name", "drop_id", "drop_name", "score", "reason"],
+                        column_config={"merge": st.column_config.CheckboxColumn("Læg sammen")},
+                        key="dedupe_editor",
+                    )
+                    if st.form_submit_button("🔗 Læg valgte sammen"):
+                        try:
+                            n = apply_merges(edited[edited["merge"]])
+                            st.session_state.pop("dedupe_suggestions", None)
+                            st.success(f"{n} kørere lagt sammen ✅")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Sammenlægning fejlede: {e}")
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2e) Stint-planlægning
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🗓️ Stint-planlægning (rotation)", expanded=False):
+        st.caption("Planen fordeler resten af løbet mellem holdets aktive kørere ud fra den faktiske "
+                   "køretid og lægges automatisk om når der startes nye stints.")
+        cfg = get_plan_config()
+        with st.form("plan_config_form"):
+            c1, c2, c3 = st.columns(3)
+            race_start = c1.text_input("Løbsstart (UTC, tom = første stint)", value=cfg["race_start"] or "")
+            race_hours = c2.number_input("Løbslængde (timer)", min_value=0.5, value=float(cfg["race_hours"]), step=0.5)
+            stint_minutes = c3.number_input("Stintlængde (min, brændstof)", min_value=1.0,
+                                            value=float(cfg["stint_minutes"]), step=1.0)
+            c4, c5, c6 = st.columns(3)
+            stints_per_turn = c4.number_input("Stints pr. tur", min_value=1, value=int(cfg["stints_per_turn"]), step=1)
+            min_drive = c5.number_input("Min. køretid pr. kører (timer)", min_value=0.0,
+                                        value=float(cfg["min_drive_hours"]), step=0.5)
+            max_drive = c6.number_input("Maks. køretid pr. kører (timer, 0 = ingen)", min_value=0.0,
+                                        value=float(cfg["max_drive_hours"]), step=0.5)
+            if st.form_submit_button("💾 Gem planindstillinger"):
+                try:
+                    set_plan_config(
+                        race_start=race_start.strip() or None, race_hours=race_hours,
+                        stint_minutes=stint_minutes, stints_per_turn=int(stints_per_turn),
+                        min_drive_hours=min_drive, max_drive_hours=max_drive,
+                    )
+                    st.success("Planindstillinger gemt ✅")
+                except ValueError as e:
+                    st.error(str(e))
+        if st.button("📋 Vis næste planlagte skift for alle teams", key="plan_field_btn"):
+            plan = plan_field()
+            if plan.empty:
+                st.info("Ingen aktive kørere at planlægge.")
+            else:
+                st.dataframe(plan[plan["slot"] == 1].drop(columns=["slot", "driver_id"]),
+                             use_container_width=True, hide_index=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2f) Session-feed (automatiske kørerskift, startes med RACE_FEED)
+    # ─────────────────────────────────────────────────────────────────────────────
+    runner = get_runner()
+    if runner is not None:
+        with st.expander("📡 Session-feed", expanded=False):
+            st.caption(f"Kilde: {runner.spec}")
+            if not runner.leading:
+                st.info("En anden replika læser feedet; denne overtager hvis den stopper.")
+            if runner.last_error:
+                st.error(f"Seneste fejl: {runner.last_error}")
+            st.json(runner.ingestor.metrics())
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2g) Stint-tidslinje (Gantt over hele løbet)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("📊 Stint-tidslinje", expanded=False):
+        timeline_section("admin_timeline")
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2h) Bilklasser (katalog: rækkefølge, farve, aliaser til import)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🏷️ Bilklasser", expanded=False):
+        st.caption("Rækkefølgen (sort_rank) styrer Spectate og klasselister. Aliaser (kommasepareret) "
+                   "bruges når klassefelter importeres; ukendte værdier får standardklassen. "
+                   "Klasser med teams kan ikke slettes.")
+        catalog = list_class_catalog()
+        with st.form("class_catalog_form"):
+            edited_catalog = st.data_editor(
+                catalog,
+                key="class_catalog_editor",
+                hide_index=True,
+                use_container_width=True,
+                num_rows="dynamic",
+                disabled=["id", "teams"],
+                column_config={
+                    "id": None,
+                    "name": st.column_config.TextColumn("Klasse", required=True),
+                    "sort_rank": st.column_config.NumberColumn("Rækkefølge", step=1),
+                    "colour": st.column_config.TextColumn("Farve (#rrggbb)"),
+                    "aliases": st.column_config.TextColumn("Aliaser"),
+                    "is_default": st.column_config.CheckboxColumn("Standard"),
+                    "teams": st.column_config.NumberColumn("Teams"),
+                },
+            )
+            if st.form_submit_button("💾 Gem bilklasser"):
+                try:
+                    res = save_class_catalog(edited_catalog)
+                    st.success(f"{res['classes']} klasser gemt ({res['deleted']} slettet) ✅")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(str(e))
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2i) Løbsstyring (grønt flag, rødt flag, målflag for alle teams på én gang)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🚦 Løbsstyring", expanded=False):
+        status = race_status()
+        st.caption(f"Status: **{status['phase']}** · {status['running']} kørende stints"
+                   + (f" · {status['frozen']} frosset" if status["frozen"] else ""))
+
+        starters = default_starters()
+        if not starters.empty:
+            st.markdown("**🟢 Grønt flag** – starter alle teams uden aktiv stint")
+            roster = active_roster()
+            roster = roster[roster["team_id"].isin(starters["team_id"])]
+            # Kørerne vælges på id (navne kan gå igen på samme team); etiketten viser begge
+            label = lambda name, driver_id: f"{name} (id {int(driver_id)})"
+            ids = {(int(t), label(n, d)): int(d)
+                   for t, d, n in roster[["team_id", "driver_id", "name"]].itertuples(index=False)}
+            starters = starters.assign(driver=[
+                None if pd.isna(d) else label(n, d) for d, n in zip(starters["driver_id"], starters["driver"])
+            ])
+            with st.form("race_green_form"):
+                edited_starters = st.data_editor(
+                    starters,
+                    key="race_green_editor",
+                    hide_index=True,
+                    use_container_width=True,
+                    disabled=["team_no", "team_name"],
+                    column_config={
+                        "team_id": None,
+                        "driver_id": None,
+                        "team_no": st.column_config.NumberColumn("Nr."),
+                        "team_name": st.column_config.TextColumn("Team"),
+                        "driver": st.column_config.SelectboxColumn("Startkører", options=sorted({k for _, k in ids})),
+                    },
+                )
+                if st.form_submit_button("🟢 Start løbet"):
+                    # Valget slås op i teamets egne aktive kørere; listen i kolonnen er fælles for alle teams
+                    picked = [r for r in edited_starters.itertuples() if isinstance(r.driver, str) and r.driver]
+                    wrong = [r.team_name for r in picked if (int(r.team_id), r.driver) not in ids]
+                    if wrong:
+                        st.error("Startkøreren er ikke aktiv på teamet: " + ", ".join(wrong))
+                    else:
+                        n = race_green({int(r.team_id): ids[(int(r.team_id), r.driver)] for r in picked})
+                        st.success(f"{n} teams startet ✅")
+                        st.rerun()
+
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("🔴 Rødt flag (frys alle stints)", key="race_freeze_btn", disabled=not status["running"]):
+                st.success(f"{race_freeze()} stints frosset")
+                st.rerun()
+        with c2:
+            if st.button("▶️ Genstart efter rødt flag", key="race_unfreeze_btn", disabled=not status["frozen"]):
+                st.success(f"{race_unfreeze()} stints kører igen")
+                st.rerun()
+
+        # Standard sættes én gang; ellers ville feltet springe til et nyt tidspunkt ved hver rerun
+        st.session_state.setdefault("race_finish_ts", utc_now())
+        if st.button("⏱️ Sæt sluttidspunkt til nu", key="race_finish_now_btn"):
+            st.session_state["race_finish_ts"] = utc_now()
+        with st.form("race_finish_form"):
+            finish_ts = st.text_input("🏁 Målflag – sluttidspunkt (UTC, YYYY-MM-DD HH:MM:SS)", key="race_finish_ts")
+            if st.form_submit_button("🏁 Luk alle åbne stints", disabled=not status["running"]):
+                try:
+                    st.success(f"{race_finish(finish_ts)} stints lukket ✅")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(str(e))
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2j) Dataintegritet (åbne stints, overlap, forældreløse rækker, dublet-navne)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🩺 Dataintegritet", expanded=bool(health["issues"])):
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("🔎 Tjek ændringer nu", key="integrity_check_btn"):
+                st.json(integrity.check())
+        with c2:
+            if st.button("🧮 Fuldt tjek", key="integrity_full_btn"):
+                st.json(integrity.check(full=True))
+        if not health["unique_active_index"]:
+            st.warning("Indekset der sikrer én aktiv stint pr. team mangler (der findes teams med flere "
+                       "åbne stints). Det oprettes når de er rettet.")
+        found = integrity.issues()
+        if found.empty:
+            st.success("Ingen kendte problemer.")
+        else:
+            with st.form("integrity_repair_form"):
+                edited_issues = st.data_editor(
+                    found.assign(repair=found["repairable"]),
+                    key="integrity_editor",
+                    hide_index=True,
+                    use_container_width=True,
+                    disabled=["id", "check_name", "scope_key", "team", "ref", "detail", "found_at", "suggestion", "repairable"],
+                    column_config={
+                        "id": None,
+                        "repairable": None,
+                        "check_name": st.column_config.TextColumn("Tjek"),
+                        "scope_key": None,
+                        "team": st.column_config.TextColumn("Team"),
+                        "ref": st.column_config.TextColumn("Rækker"),
+                        "detail": st.column_config.TextColumn("Problem"),
+                        "suggestion": st.column_config.TextColumn("Forslag"),
+                        "repair": st.column_config.CheckboxColumn("Ret"),
+                    },
+                )
+                if st.form_submit_button("🛠️ Ret valgte"):
+                    res = integrity.repair(edited_issues.loc[edited_issues["repair"], "id"].tolist())
+                    st.success(f"{res['repairs']} rettelser skrevet · {res['issues']} problem(er) tilbage")
+                    st.rerun()
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2k) Belastning (adgangsport: kødybde, shed, ventetider)
+    # ─────────────────────────────────────────────────────────────────────────────
+    load = admission.stats()
+    with st.expander("🚥 Belastning", expanded=load["degraded"]):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("I kø nu", load["queued_reads"] + load["queued_writes"], help=f"Maks. {load['max_queue']}")
+        c2.metric("Shed (gamle svar)", load["shed"])
+        c3.metric("Skriv-vent p95", f"{load['write_wait_p95_ms']:.0f} ms")
+        c4.metric("Læs-vent p95", f"{load['read_wait_p95_ms']:.0f} ms")
+        if load["degraded"]:
+            st.warning("Porten er fuld: læsninger får senest kendte data, skrivninger går forrest.")
+        st.json(load)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2l) Omgangstider (resultatfil → tempo pr. stint/kører) og eksport
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("⏱️ Omgangstider og eksport", expanded=False):
+        st.caption("CSV fra resultatfilen: bilnummer, omgang, omgangstid og tidsstempel. Omgangene "
+                   "fordeles på stints efter tidsstemplet; en ny fil erstatter tallene for de stints den dækker.")
+        lap_file = st.file_uploader("Omgangsfil (CSV)", type=["csv"], key="laps_csv")
+        if lap_file is not None and st.button("📥 Importér omgangstider", key="laps_import_btn"):
+            try:
+                res = laps.import_laps(lap_file)
+                st.success(f"{res['matched']} af {res['laps']} omgange fordelt på {res['stints']} stints ✅")
+                if res["unknown_car"] or res["outside_stints"]:
+                    st.warning(f"{res['unknown_car']} omgange med ukendt bilnummer, "
+                               f"{res['outside_stints']} uden stint på tidspunktet.")
+            except ValueError as e:
+                st.error(str(e))
+        pace = laps.driver_pace()
+        if pace.empty:
+            st.info("Ingen omgangstider importeret endnu.")
+        else:
+            st.markdown("**Tempo pr. kører** (gennemsnit og spredning over rene omgange)")
+            st.dataframe(pace, hide_index=True, use_container_width=True)
+        if st.button("📦 Forbered eksport af alle stints (CSV)", key="laps_export_btn"):
+            # download_button vil have str/bytes; bidderne samles først ved klik på knappen
+            data = "".join(laps.iter_stint_export()).encode("utf-8")
+            st.download_button("⬇️ Download stints (CSV)", data, file_name="stints.csv",
+                               mime="text/csv", key="laps_export_dl")
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # 2m) Diagnostik (hukommelse, filhåndtag, forbindelser, sessioner over tid)
+    # ─────────────────────────────────────────────────────────────────────────────
+    with st.expander("🔬 Diagnostik (ressourcer)", expanded=False):
+        c1, c2 = st.columns(2)
+        with c1:
+            if st.button("📏 Tag måling nu", key="telemetry_sample_btn"):
+                telemetry.sample()
+        with c2:
+            tracing = st.checkbox("tracemalloc (top-allokeringer)", value=telemetry.tracing(), key="telemetry_tracing")
+            if tracing != telemetry.tracing():
+                telemetry.set_tracing(tracing)
+        last = telemetry.latest()
+        if last is None:
+            st.info("Ingen målinger endnu.")
+        else:
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("RSS", f"{last['rss_mb']:.0f} MB", f"{telemetry.trend('rss_mb'):+.1f} MB/t")
+            m2.metric("Filhåndtag", last["fds"] if last["fds"] is not None else "–")
+            m3.metric("SQLite-forbindelser", last["sqlite_conns"] if last["sqlite_conns"] is not None else "–")
+            m4.metric("Sessioner", last["sessions"])
+            hist = telemetry.history().set_index("ts")
+            st.line_chart(hist[["rss_mb"]], height=160)
+            st.line_chart(hist[["fds", "sqlite_conns", "sessions", "threads"]], height=160)
+            if last["top_growth"]:
+                st.caption("Største vækst siden forrige måling (tracemalloc)")
+                st.dataframe(pd.DataFrame(last["top_growth"]), hide_index=True, use_container_width=True)
+
     # ─────────────────────────────────────────────────────────────────────────────
     # 3) Status og styring
     # ─────────────────────────────────────────────────────────────────────────────
@@ -173,15 +621,21 @@ def admin_panel():
     car_class = st.selectbox("Filtrér bilklasse", options=["(Alle)"] + classes, key="admin_class_filter")
     car_class = None if car_class == "(Alle)" else car_class
 
-    teams_df2 = list_teams(car_class)
+    team_query = st.text_input("Søg hold, bilnummer eller kører", key="admin_team_query")
+    teams_df2 = search(team_query, limit=TEAM_PICK_LIMIT, car_class=car_class)
     if teams_df2.empty:
-        st.info("Ingen teams i denne klasse.")
+        st.info("Ingen teams matcher." if team_query else "Ingen teams i denne klasse.")
         if st.button("↺ Opdater"): st.rerun()
         st.stop()
 
-    names = teams_df2["name"].tolist()
-    team_name = st.selectbox("Vælg team", options=names, key="admin_team_select")
-    team_id = int(teams_df2.loc[teams_df2["name"] == team_name, "id"].iloc[0])
+    team_labels = {
+        int(r.team_id): ("" if pd.isna(r.team_no) else f"#{int(r.team_no)} ") + r.team_name
+        + (f"  · {r.matched_drivers}" if isinstance(r.matched_drivers, str) and r.matched_drivers else "")
+        for r in teams_df2.itertuples()
+    }
+    team_id = st.selectbox("Vælg team", options=list(team_labels), format_func=team_labels.get,
+                           key="admin_team_select")
+    team_name = teams_df2.loc[teams_df2["team_id"] == team_id, "team_name"].iloc[0]
 
     st.markdown(f"**Hold:** {team_name}")
     curr = current_stint(team_id)
@@ -190,14 +644,45 @@ def admin_panel():
     else:
         st.warning("Ingen aktiv kører.")
 
-    st.markdown("**Kørere (toggle aktiv/inaktiv)**")
+    # Roster-ændringer samles i en form og gemmes som én batch med ét rerun
+    st.markdown("**Kørere (aktiv/inaktiv, tilføj, fjern, flyt hold)**")
     drivers = team_drivers(team_id)
-    for r in drivers.itertuples():
-        toggled = st.toggle(r.name, value=(r.is_active == 1), key=f"toggle_{team_id}_{r.driver_id}")
-        if toggled != (r.is_active == 1):
-            set_driver_active(team_id, r.driver_id, toggled)
-            st.toast(f"{r.name} sat til {'aktiv' if toggled else 'inaktiv'}.")
-            st.rerun()
+    all_teams = list_teams(None)
+    team_ids_by_name = dict(zip(all_teams["name"], all_teams["id"].astype(int)))
+    roster_df = pd.DataFrame({
+        "driver_id": drivers["driver_id"].astype("Int64"),
+        "name": drivers["name"],
+        "active": drivers["is_active"] == 1,
+        "team": team_name,
+        "remove": False,
+    })
+    with st.form(f"roster_form_{team_id}"):
+        edited_roster = st.data_editor(
+            roster_df,
+            key=f"roster_editor_{team_id}",
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "driver_id": None,
+                "name": st.column_config.TextColumn("Kører", required=True),
+                "active": st.column_config.CheckboxColumn("Aktiv", default=True),
+                "team": st.column_config.SelectboxColumn("Hold", options=list(team_ids_by_name), default=team_name),
+                "remove": st.column_config.CheckboxColumn("Fjern", default=False),
+            },
+        )
+        roster_submitted = st.form_submit_button("💾 Gem roster")
+    if roster_submitted:
+        ops = roster_edit_diff(team_id, drivers, edited_roster, team_ids_by_name)
+        if not ops:
+            st.info("Ingen ændringer.")
+        else:
+            try:
+                res = apply_roster_changes(ops)
+                st.toast("Roster gemt: " + ", ".join(f"{k} {v}" for k, v in res.items() if v))
+                st.rerun()
+            except Exception as e:
+                st.error(f"Kunne ikke gemme roster: {e}")
 
     active_drivers = drivers[drivers["is_active"] == 1]
     if not active_drivers.empty:
@@ -225,6 +710,20 @@ def admin_panel():
         st.download_button("⬇️ Download historik (CSV)", csv, file_name=f"{team_name}_stints.csv",
                            mime="text/csv", key="admin_hist_dl")
 
+    with st.expander("📜 Hændelseslog (revision)", expanded=False):
+        only_team = st.checkbox("Kun valgt hold", value=True, key="evlog_only_team")
+        log = event_history(team_id if only_team else None, limit=200)
+        if log.empty:
+            st.info("Ingen hændelser endnu.")
+        else:
+            st.dataframe(log, use_container_width=True, hide_index=True)
+        if st.button("♻️ Genopbyg stand fra log", key="evlog_rebuild_btn"):
+            try:
+                res = rebuild()
+                st.success(f"Genopbygget fra snapshot + {res['replayed']} hændelser ✅")
+            except Exception as e:
+                st.error(f"Genopbygning fejlede: {e}")
+
     # ←–––––––––––––––––––––––––––––––––––––––––––––––––––––
     # LOG UD – placeret lige efter “Status og styring”
     # ––––––––––––––––––––––––––––––––––––––––––––––––––––→
@@ -234,19 +733,49 @@ def admin_panel():
         st.rerun()
 
     # ─────────────────────────────────────────────────────────────────────────────
-    # 4) Team passwords (PINs) – nederst
+    # 4) Team passwords (PINs), numre og klasser – nederst
+    #    Én editor pr. side; kun ændrede celler skrives, samlet i én transaktion.
     # ─────────────────────────────────────────────────────────────────────────────
-    st.subheader("Team passwords (PINs)")
-    pins_df = _teams_with_pins_df()
-    if pins_df.empty:
+    st.subheader("Team passwords (PINs), numre og klasser")
+    total = count_teams()
+    if total == 0:
         st.info("Ingen teams i databasen.")
     else:
-        for r in pins_df.itertuples():
-            st.write(f"**{r.name}** ({r.car_class})")
-            new_pin = st.text_input("Team PIN", value=r.team_pin, key=f"pin_{r.id}")
-            if st.button("Gem PIN", key=f"savepin_{r.id}"):
-                set_team_pin(int(r.id), new_pin.strip() or "1234")
-                st.success("PIN opdateret")
+        pages = max(1, math.ceil(total / TEAM_EDIT_PAGE_SIZE))
+        page = 1
+        if pages > 1:
+            page = int(st.number_input(f"Side (af {pages})", min_value=1, max_value=pages,
+                                       value=1, step=1, key="team_edit_page"))
+        page_df = teams_page(offset=(page - 1) * TEAM_EDIT_PAGE_SIZE, limit=TEAM_EDIT_PAGE_SIZE)
+        class_options = list_class_catalog()["name"].tolist()
+
+        with st.form(f"team_edit_form_{page}"):
+            edited = st.data_editor(
+                page_df,
+                key=f"team_editor_{page}",
+                hide_index=True,
+                use_container_width=True,
+                disabled=["id", "name"],
+                column_config={
+                    "id": None,
+                    "name": st.column_config.TextColumn("Team"),
+                    "team_no": st.column_config.NumberColumn("Nr.", min_value=0, step=1),
+                    "car_class": st.column_config.SelectboxColumn("Klasse", options=class_options),
+                    "team_pin": st.column_config.TextColumn("PIN"),
+                },
+            )
+            submitted = st.form_submit_button("💾 Gem ændringer")
+        if submitted:
+            changes = team_edit_diff(page_df, edited)
+            if not changes:
+                st.info("Ingen ændringer.")
+            else:
+                try:
+                    n = apply_team_edits(changes)
+                    st.success(f"{n} team(s) opdateret ✅")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Kunne ikke gemme: {e}")
 
     # ─────────────────────────────────────────────────────────────────────────────
     # 5) Ret æ/ø/å i databasen (encoding-reparation) – absolut til sidst
@@ -257,28 +786,6 @@ def admin_panel():
             "Kører en simpel mojibake-rettelse på team- og drivernavne."
         )
         if st.button("Kør reparation nu", key="run_encoding_fix"):
-            from core.db import get_conn
-            from core.importers import _fix_mojibake
-            fixed = 0
-            with get_conn() as conn:
-                # Ret team
-                team = pd.read_sql_query("SELECT id, name, car_class FROM team;", conn)
-                for r in team.itertuples():
-                    new_name = _fix_mojibake(r.name)
-                    new_class = _fix_mojibake(r.car_class)
-                    if new_name != r.name or new_class != r.car_class:
-                        conn.execute(
-                            "UPDATE team SET name=?, car_class=? WHERE id=?;",
-                            (new_name, new_class, r.id)
-                        )
-                        fixed += 1
-                # Ret driver
-                drv = pd.read_sql_query("SELECT id, name FROM driver;", conn)
-                for r in drv.itertuples():
-                    new_name = _fix_mojibake(r.name)
-                    if new_name != r.name:
-                        conn.execute("UPDATE driver SET name=? WHERE id=?;", (new_name, r.id))
-                        fixed += 1
-                conn.commit()
+            fixed = repair_encoding()
             st.success(f"Færdig: Rettede {fixed} rækker.")
             st.rerun()
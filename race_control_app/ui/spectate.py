@@ -7,7 +7,11 @@ import streamlit as st
 import time
 from datetime import datetime
 
-from core.repo import spectate_grid
+from core import admission
+from core.coherence import current_version
+from core.repo import race_status, spectate_grid
+from ui.stats import stats_section
+from ui.timeline import timeline_section
 
 REFRESH_SEC = 30  # 30 sekunder
 
@@ -27,6 +31,12 @@ def spectate_view():
         st.session_state.spectate_last_update = time.time()
         st.session_state.spectate_force_refresh = False
     
+    # Push: ændringer fra andre sessioner/replikaer fanges ved hvert 1-sek. loop
+    version = current_version()
+    if st.session_state.get('spectate_version') != version:
+        st.session_state.spectate_version = version
+        st.session_state.spectate_last_update = time.time()
+
     # Check if it's time to refresh
     current_time = time.time()
     time_elapsed = current_time - st.session_state.spectate_last_update
@@ -40,7 +50,7 @@ def spectate_view():
     time_until_refresh = int(REFRESH_SEC - time_elapsed)
     last_updated = datetime.fromtimestamp(st.session_state.spectate_last_update).strftime("%H:%M:%S")
     
-    st.caption(f"⏱️ Opdaterer automatisk hvert {REFRESH_SEC} sek. | Sidst opdateret: {last_updated} | Næste opdatering om: {time_until_refresh} sek.")
+    st.caption(f"⏱️ Ændringer vises inden for ~1 sek. (fuld opdatering hvert {REFRESH_SEC} sek.) | Sidst opdateret: {last_updated} | Næste opdatering om: {time_until_refresh} sek.")
 
     try:
         df = spectate_grid()
@@ -64,8 +74,33 @@ def spectate_view():
         lambda x: "-" if (pd.isna(x) or x == "") else int(x)
     )
     display["Driver Name"] = display["Driver Name"].fillna("-")
+    display.loc[df["paused"].to_numpy(), "Driver Name"] += " ⏸"
+
+    if admission.degraded():
+        st.caption("⚠️ Mange forbindelser lige nu – viser senest kendte data, opdateres om lidt.")
+
+    phase = race_status()["phase"]
+    if phase == "rødt flag":
+        st.error("🔴 Rødt flag – alle stints er frosset")
+    elif phase == "afsluttet":
+        st.success("🏁 Løbet er afsluttet")
+
+    # Klassens farve fra kataloget (car_class.colour)
+    colours = df["class_colour"].fillna("").tolist()
+    styled = display.style.apply(
+        lambda col: [f"background-color: {c}; color: white" if c else "" for c in colours],
+        subset=["Class"],
+    )
 
-    st.dataframe(display, use_container_width=True, hide_index=True)
+    # Kun den valgte visning køres (st.tabs ville bygge alle tre – også Gantt'en – hvert sekund)
+    view = st.radio("Visning", ["Grid", "Tidslinje", "Statistik"], horizontal=True,
+                    key="spectate_tab", label_visibility="collapsed")
+    if view == "Grid":
+        st.dataframe(styled, use_container_width=True, hide_index=True)
+    elif view == "Tidslinje":
+        timeline_section("spectate_timeline")
+    else:
+        stats_section("spectate_stats")
 
     c1, c2 = st.columns(2)
     with c1:
@@ -77,11 +112,12 @@ def spectate_view():
             # Clean up session state when leaving
             if 'spectate_last_update' in st.session_state:
                 del st.session_state.spectate_last_update
+            st.session_state.pop('spectate_version', None)
             st.session_state.view = "LANDING"
             st.rerun()
     
-    # Sleep briefly and rerun to update the countdown timer
-    time.sleep(1)
+    # Sleep briefly and rerun to update the countdown timer (længere og spredt under overlast)
+    time.sleep(admission.refresh_delay(1.0))
     st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+# ui/stats.py
+import pandas as pd
+import streamlit as st
+
+from core.repo import list_car_classes
+from core.stats import class_board, live_columns, team_board
+
+
+def _clock(sec) -> str:
+    """Sekunder som t:mm:ss ("-" hvis ukendt)."""
+    if pd.isna(sec):
+        return "-"
+    sec = int(sec)
+    return f"{sec // 3600}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+
+
+def stats_section(key: str):
+    """
+    Statistik pr. klasse og pr. team. Læser kun de færdigberegnede rækker (core.stats);
+    urene (kørende stint, tid siden skift) regnes her ved hver visning, så de går hvert sekund
+    uden nye DB-kald.
+    """
+    classes = class_board()
+    if classes.empty:
+        st.info("Ingen teams i databasen endnu.")
+        return
+    st.dataframe(
+        classes.assign(avg_stint_sec=classes["avg_stint_sec"].map(_clock)).rename(columns={
+            "car_class": "Class", "teams": "Teams", "running": "Kører", "stints": "Stints",
+            "drivers_used": "Kørere brugt", "avg_stint_sec": "Gns. stint",
+        }).drop(columns="class_colour"),
+        use_container_width=True, hide_index=True,
+    )
+
+    car_class = st.selectbox("Klasse", ["(Alle)"] + list_car_classes(), key=f"{key}_class")
+    board = live_columns(team_board(None if car_class == "(Alle)" else car_class))
+    display = pd.DataFrame({
+        "Car no.": board["team_no"].map(lambda x: "-" if pd.isna(x) else int(x)),
+        "Class": board["car_class"].fillna("-"),
+        "Team Name": board["team_name"],
+        "Stints": board["stints"],
+        "Kørere": board["drivers_used"],
+        "Nuværende stint": board["stint_sec"].map(_clock),
+        "Siden skift": board["since_change_sec"].map(_clock),
+        "Gns. stint": board["avg_stint_sec"].map(_clock),
+        "Køretid i alt": board["driven_sec"].map(_clock),
+    })
+    display.loc[board["open_pause_ts"].notna().to_numpy(), "Nuværende stint"] += " ⏸"
+    st.dataframe(display, use_container_width=True, hide_index=True)
@@ -0,0 +1,73 @@
+# ui/timeline.py
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from core.repo import list_car_classes
+from core.timeline import race_window, stint_timeline
+
+CHART_WIDTH_PX = 760   # siden er max 780 px bred (ui.styles)
+LANE_PX = 14
+
+
+def timeline_section(key: str):
+    """
+    Gantt-tidslinje over alle teams' stints. Vinduet vælges med en skyder (data hentes og
+    bins på serveren for netop det vindue); inden for vinduet kan der panoreres/zoomes
+    med mus/touch uden nye kald.
+    """
+    race_start, race_end = race_window()
+    hours = max((race_end - race_start) / 3600, 0.25)
+
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        lo, hi = st.slider(
+            "Vindue (timer fra start)", 0.0, float(round(hours + 0.25, 2)), (0.0, float(round(hours, 2))),
+            step=0.25, key=f"{key}_window",
+        )
+    with c2:
+        classes = list_car_classes()
+        car_class = st.selectbox("Klasse", ["(Alle)"] + classes, key=f"{key}_class")
+    car_class = None if car_class == "(Alle)" else car_class
+    if hi <= lo:
+        st.info("Vælg et vindue med en længde.")
+        return
+
+    df = stint_timeline(race_start + lo * 3600, race_start + hi * 3600, CHART_WIDTH_PX, car_class)
+    if df.empty:
+        st.info("Ingen stints i vinduet.")
+        return
+
+    df["team"] = [
+        f"#{no} {name}" if not pd.isna(no) else name for no, name in zip(df["team_no"], df["team_name"])
+    ]
+    lanes = df.drop_duplicates("lane").sort_values("lane")
+    colours = df.drop_duplicates("car_class")
+    chart = (
+        alt.Chart(df)
+        .mark_bar(cornerRadius=2)
+        .encode(
+            x=alt.X("start:T", title="UTC", scale=alt.Scale(domain=[
+                pd.to_datetime(race_start + lo * 3600, unit="s").isoformat(),
+                pd.to_datetime(race_start + hi * 3600, unit="s").isoformat(),
+            ])),
+            x2="end:T",
+            y=alt.Y("team:N", sort=lanes["team"].tolist(), title=None),
+            color=alt.Color(
+                "car_class:N", title="Klasse",
+                scale=alt.Scale(domain=colours["car_class"].tolist(), range=colours["class_colour"].fillna("#888888").tolist()),
+            ),
+            opacity=alt.condition("datum.stints > 1", alt.value(0.45), alt.value(0.95)),
+            tooltip=[
+                alt.Tooltip("team:N", title="Team"),
+                alt.Tooltip("driver:N", title="Kører"),
+                alt.Tooltip("start:T", title="Start", format="%H:%M"),
+                alt.Tooltip("end:T", title="Slut", format="%H:%M"),
+                alt.Tooltip("stints:Q", title="Stints"),
+            ],
+        )
+        .properties(height=max(120, LANE_PX * len(lanes)))
+        .interactive(bind_y=False)
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(f"{int(df['stints'].sum())} stints i {len(df)} barer · lyse barer er flere korte stints samlet")
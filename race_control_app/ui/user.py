@@ -1,42 +1,44 @@
-# ui/user.py — FULD VERSION (uden første password)
-import streamlit as st
-import pandas as pd
-from core.repo import (
-    list_teams, get_team_id_by_name, get_team_pin,
-    team_drivers, current_stint, stint_history, start_stint
-)
-
 # ui/user.py
 import streamlit as st
 import pandas as pd
 from core.repo import (
-    list_teams, get_team_id_by_name, get_team_pin,
+    search, get_team_pin,
     team_drivers, current_stint, stint_history, start_stint
 )
+from core.planner import next_driver, team_plan
+
+# Maks. antal søgeresultater i team-vælgeren
+PICK_LIMIT = 25
+
+def _team_label(r) -> str:
+    no = "" if pd.isna(r.team_no) else f"#{int(r.team_no)} "
+    via = f"  · {r.matched_drivers}" if isinstance(r.matched_drivers, str) and r.matched_drivers else ""
+    return f"{no}{r.team_name}{via}"
+
 
 def user_team_pick():
-    """Vælg hold fra dropdown + indtast team-PIN."""
+    """Søg/vælg hold (navn, nummer eller kører) + indtast team-PIN."""
     st.header("Vælg dit team")
 
-    teams_df = list_teams(None)
+    query = st.text_input("Søg hold, bilnummer eller kører", key="user_pick_query")
+    teams_df = search(query, limit=PICK_LIMIT)
     if teams_df.empty:
-        st.info("Ingen teams i databasen endnu.")
+        st.info("Ingen teams matcher søgningen." if query else "Ingen teams i databasen endnu.")
         if st.button("◀ Tilbage"):
             st.session_state.view = "LANDING"; st.rerun()
         return
 
-    team_names = teams_df["name"].tolist()
-    team_name = st.selectbox("Team", team_names, key="user_pick_team")
+    labels = {int(r.team_id): _team_label(r) for r in teams_df.itertuples()}
+    team_id_sel = st.selectbox("Team", list(labels), format_func=labels.get, key="user_pick_team")
+    team_name = teams_df.loc[teams_df["team_id"] == team_id_sel, "team_name"].iloc[0]
 
     pin = st.text_input("Team password (PIN)", type="password", key="user_team_pin")
 
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Åbn team", key="user_open_team"):
-            team_id = get_team_id_by_name(team_name)
-            if team_id is None:
-                st.error("Ugyldigt team.")
-            elif pin == get_team_pin(team_id):
+            team_id = int(team_id_sel)
+            if pin == get_team_pin(team_id):
                 st.session_state.update(
                     user_team_id=team_id,
                     user_team_name=team_name,
@@ -69,6 +71,14 @@ def user_team_view():
     else:
         st.warning("Ingen aktiv kører.")
 
+    # Rotationsplan (lægges om ud fra den faktiske historik)
+    planned = next_driver(team_id)
+    if planned:
+        st.info(f"Planlagt næste kører: **{planned['driver']}** – ca. {planned['eta']} UTC "
+                f"(om {planned['eta_min']} min)")
+        with st.expander("🗓️ Rotationsplan for resten af løbet", expanded=False):
+            st.dataframe(team_plan(team_id).drop(columns="driver_id"), use_container_width=True, hide_index=True)
+
     # Aktive kørere → vælg næste
     drivers = team_drivers(team_id)
     active_drivers = drivers[drivers["is_active"] == 1]
@@ -77,9 +87,13 @@ def user_team_view():
     else:
         # Map kun navn -> id, så dropdown viser rent navn
         driver_map = {r.name: int(r.driver_id) for r in active_drivers.itertuples()}
+        options = list(driver_map.keys())
+        # Forvælg den planlagte kører
+        default = next((i for i, n in enumerate(options) if planned and driver_map[n] == planned["driver_id"]), 0)
         selection = st.selectbox(
             "Vælg kører til næste stint",
-            options=list(driver_map.keys()),
+            options=options,
+            index=default,
             key="user_next_driver"
         )
         chosen_driver_id = driver_map[selection]
@@ -102,7 +116,7 @@ def user_team_view():
 
     # Log ud
     if st.button("🔒 Log ud", key="user_logout"):
-        for k in ["user_team_id", "user_team_name", "user_team_pin", "user_next_driver", "user_pick_team"]:
+        for k in ["user_team_id", "user_team_name", "user_team_pin", "user_next_driver", "user_pick_team", "user_pick_query"]:
             st.session_state.pop(k, None)
         st.session_state.view = "LANDING"
         st.rerun()